@@ -0,0 +1,84 @@
+"""
+Benchmark for hrv_features on a synthetic night.
+
+Tiles the ECG of Hardware/working.csv to the requested length, checks that
+block-parallel detection finds the same beats as one RPeakDetector pass over
+the whole night (block boundaries must not add, drop or move beats), that the
+epoch count matches sleepecg's floor(last beat / 30), and times feature
+extraction with 1 and N workers next to a per-epoch loop as in the notebooks.
+
+    python bench_hrv_features.py [hours] [workers]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import welch
+
+from hrv_features import detect_beats, epoch_features, read_ecg, EPOCH_S
+from rpeak_detector import RPeakDetector
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Hardware", "working.csv")
+TOLERANCE = 2  # samples
+
+
+def loop_epoch(ecg, fs, k):
+    """One epoch the notebook way: detect in the epoch's samples, then RR statistics and Welch LF/HF."""
+    segment = ecg[k * EPOCH_S * fs:(k + 1) * EPOCH_S * fs]
+    r = RPeakDetector(fs=fs).process(segment)[:, 0]
+    rr = np.diff(r) / fs
+    if len(rr) < 3:
+        return None
+    grid = np.arange(0, EPOCH_S, 0.25)
+    series = np.interp(grid, r[1:] / fs, rr)
+    f, psd = welch(series - series.mean(), fs=4.0, nperseg=len(series))
+    return np.std(rr), np.sqrt(np.mean(np.diff(rr) ** 2)), psd[(f >= 0.04) & (f < 0.15)].sum()
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    clip, fs = read_ecg(FILENAME)
+    fs = int(round(fs))
+    ecg = np.resize(clip, int(hours * 3600 * fs))
+    print(f"[data] {hours:g} h at {fs} Hz ({len(ecg)} samples), {os.cpu_count()} CPU(s)")
+
+    # --- Agreement with a single pass ---
+    t0 = time.perf_counter()
+    whole = RPeakDetector(fs=fs).process(ecg)[:, 0].astype(np.int64)
+    single_elapsed = time.perf_counter() - t0
+    blocked = detect_beats(ecg, fs, workers=1)
+    pos = np.clip(np.searchsorted(blocked, whole), 1, len(blocked) - 1)
+    nearest = np.minimum(np.abs(blocked[pos] - whole), np.abs(blocked[pos - 1] - whole))
+    matched = int((nearest <= TOLERANCE).sum())
+    print(f"[check] single pass {len(whole)} beats, blocked {len(blocked)} beats, "
+          f"{matched} within {TOLERANCE} samples ({matched / len(whole):.4%})")
+
+    features = epoch_features(blocked / fs)
+    expected = int((blocked[-1] / fs) // EPOCH_S)
+    assert len(features["epoch"]) == expected, "epoch count differs from SleepRecord"
+    print(f"[check] {len(features['epoch'])} epochs == floor(last beat / {EPOCH_S} s)")
+
+    # --- Timing ---
+    for n in sorted({1, workers}):
+        t0 = time.perf_counter()
+        beats = detect_beats(ecg, fs, workers=n)
+        epoch_features(beats / fs)
+        elapsed = time.perf_counter() - t0
+        print(f"[bench] hrv_features, {n} worker(s): {elapsed:6.2f}s for the night "
+              f"({len(ecg) / fs / elapsed:7.0f}x real time)")
+    print(f"[bench] single RPeakDetector pass: {single_elapsed:6.2f}s")
+
+    picks = np.linspace(0, len(features["epoch"]) - 1, 40).astype(int)
+    t0 = time.perf_counter()
+    for k in picks:
+        loop_epoch(ecg, fs, k)
+    per_epoch = (time.perf_counter() - t0) / len(picks)
+    print(f"[bench] per-epoch loop: {per_epoch * 1e3:.1f} ms per epoch, "
+          f"~{per_epoch * len(features['epoch']):.1f}s for the night")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Checks RPeakDetector against the offline find_peaks pipeline of
+hrv_interval_inaator.py on Hardware/working.csv, then measures detection
+latency and streaming throughput.
+
+    python bench_rpeak.py [csv_file]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from rpeak_detector import RPeakDetector, SAMPLING_RATE, LEARNING_S
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Hardware", "working.csv")
+CHANNEL = 0
+PEAK_HEIGHT_FACTOR = 2.5
+TOLERANCE = 3  # samples (24 ms at 125 Hz)
+
+
+def offline_peaks(ecg):
+    """Same detection as hrv_interval_inaator.py."""
+    ecg = ecg - np.mean(ecg)
+    threshold = np.std(ecg) * PEAK_HEIGHT_FACTOR
+    peaks, _ = find_peaks(ecg, distance=int(0.3 * SAMPLING_RATE), height=threshold)
+    return peaks
+
+
+def stream(ecg, chunk):
+    """Returns (r_index, reported_at_sample) for every beat."""
+    detector = RPeakDetector()
+    found = []
+    for start in range(0, len(ecg), chunk):
+        beats = detector.process(ecg[start:start + chunk])
+        for r in beats[:, 0]:
+            found.append((int(r), detector.n - 1))
+    return np.array(found).reshape(-1, 2)
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else FILENAME
+    data = np.genfromtxt(filename, delimiter=',', names=True)
+    ecg = data[f'CH{CHANNEL}']
+
+    # --- Agreement with the offline detector (after the learning period) ---
+    reference = offline_peaks(ecg)
+    reference = reference[reference >= LEARNING_S * SAMPLING_RATE]
+    found = stream(ecg, 1)
+    r = found[:, 0]
+    matched = np.abs(reference[:, None] - r[None, :]).min(axis=1) <= TOLERANCE
+    true_pos = np.abs(r[:, None] - reference[None, :]).min(axis=1) <= TOLERANCE
+    print(f"[check] offline {len(reference)} peaks, streaming {len(r)} beats: "
+          f"sensitivity {matched.mean():.3f}, PPV {true_pos.mean():.3f} (±{TOLERANCE} samples)")
+    for chunk in (8, SAMPLING_RATE, len(ecg)):
+        same = np.array_equal(stream(ecg, chunk)[:, 0], r)
+        print(f"[check] chunk size {chunk}: {'identical beats' if same else 'DIFFERENT beats'}")
+
+    # --- Latency: R sample to the sample at which the beat is reported ---
+    latency = (found[:, 1] - found[:, 0]) / SAMPLING_RATE * 1000
+    print(f"[latency] median {np.median(latency):.0f} ms, p99 {np.percentile(latency, 99):.0f} ms, "
+          f"max {latency.max():.0f} ms (sample-by-sample feed)")
+
+    # --- Throughput on a long synthetic night made from the recording ---
+    night = np.tile(ecg, 8)
+    for chunk in (1, 16, SAMPLING_RATE):
+        detector = RPeakDetector()
+        t0 = time.perf_counter()
+        for start in range(0, len(night), chunk):
+            detector.process(night[start:start + chunk])
+        elapsed = time.perf_counter() - t0
+        print(f"[bench] chunk {chunk:4d}: {len(night) / elapsed / 1e3:9.1f} k samples/s "
+              f"({len(night) / elapsed / SAMPLING_RATE:.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Sliding-window HRV engine.
+
+Keeps the notebook metrics (SDNN, RMSSD, LF/HF over RR resampled at 4 Hz)
+up to date as beats arrive, instead of re-running welch over the whole series:
+
+  * time domain -- running sums over deques of RR intervals and successive
+    differences, so a new beat costs O(1)
+  * frequency domain -- RR is linearly resampled at RESAMPLE_HZ into a ring
+    buffer and a sliding DFT updates only the bins covering LF and HF. The
+    periodic Hann window is applied in the frequency domain
+    (0.5 X[k] - 0.25 X[k-1] - 0.25 X[k+1]), which equals windowing in time.
+
+hrv_windows() computes the same values for many windows of a finished night
+at once (cumulative sums for the time domain, one batched rfft for the spectra).
+"""
+
+import math
+from collections import deque, namedtuple
+
+import numpy as np
+
+WINDOW_S = 120.0        # seconds of beats per HRV vector
+RESAMPLE_HZ = 4.0       # fs_hrv in the notebooks
+LF_BAND = (0.04, 0.15)  # Hz
+HF_BAND = (0.15, 0.4)   # Hz
+RESYNC_EVERY = 1024     # updates between exact recomputations of the running sums
+
+# time: beat time (s); hr: instantaneous HR of the last beat (BPM); mean_rr, sdnn, rmssd in s;
+# lf, hf in s^2; lf/hf values are NaN until a full window of resampled RR is available
+HRVSample = namedtuple('HRVSample', ['time', 'hr', 'mean_rr', 'sdnn', 'rmssd', 'lf', 'hf', 'lf_hf'])
+
+
+def _spectral_bins(window_len, fs):
+    """
+    DFT bins covering LF and HF plus one guard bin each side for the Hann kernel,
+    and the LF/HF slices into the inner (guard-free) bins.
+    """
+    freqs = np.arange(window_len // 2 + 1) * fs / window_len
+    band = np.flatnonzero((freqs >= LF_BAND[0]) & (freqs < HF_BAND[1]))
+    bins = np.arange(band[0] - 1, band[-1] + 2)
+    f = freqs[bins[1:-1]]
+    split = int(np.searchsorted(f, HF_BAND[0]))
+    return bins, slice(0, split), slice(split, len(f))
+
+
+def _band_scale(window_len, fs):
+    """|X|^2 of Hann-windowed bins -> one-sided PSD, times the bin width (band power per bin)."""
+    return 2.0 / (fs * 0.375 * window_len) * fs / window_len  # sum(hann**2) == 0.375 * window_len
+
+
+def _band_powers(hann_bins, lf, hf, window_len, fs):
+    power = hann_bins.real ** 2 + hann_bins.imag ** 2
+    lf_power = power[..., lf].sum(axis=-1) * _band_scale(window_len, fs)
+    hf_power = power[..., hf].sum(axis=-1) * _band_scale(window_len, fs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = lf_power / hf_power
+    return lf_power, hf_power, np.where(hf_power > 0, ratio, np.inf)
+
+
+class HRVEngine:
+    def __init__(self, window_s=WINDOW_S, fs=RESAMPLE_HZ):
+        self.window_s = window_s
+        self.fs = fs
+
+        # --- Time domain ---
+        self.beats = deque()   # (time, rr) inside the window
+        self.diffs = deque()   # (time, squared successive difference)
+        self.sum_rr = 0.0
+        self.sum_rr2 = 0.0
+        self.sum_d2 = 0.0
+        self.last_time = None
+        self.last_rr = None
+        self.updates = 0
+
+        # --- Frequency domain ---
+        self.window_len = int(round(window_s * fs))
+        self.bins, self.lf_band, self.hf_band = _spectral_bins(self.window_len, fs)
+        self.twiddle = np.exp(2j * np.pi * self.bins / self.window_len)
+        self.twiddle_powers = {}  # m -> twiddle ** [m, m-1, ..., 1], per number of new points
+        self.dft = np.zeros(len(self.bins), dtype=complex)
+        self.ring = np.zeros(self.window_len)
+        self.ring_index = 0
+        self.resampled = 0     # resampled points pushed so far
+        self.grid_start = None  # time of resampled point 0
+
+    def add_beat(self, t):
+        """Feed one R-peak time (s). Returns an HRVSample, or None for the first beat."""
+        if self.last_time is None:
+            self.last_time = t
+            return None
+        rr = t - self.last_time
+        if rr <= 0:
+            return None
+        prev_time, prev_rr = self.last_time, self.last_rr
+        self.last_time = t
+
+        # --- Time domain: push the new interval, evict the ones older than the window ---
+        self.beats.append((t, rr))
+        self.sum_rr += rr
+        self.sum_rr2 += rr * rr
+        if prev_rr is not None:
+            d2 = (rr - prev_rr) ** 2
+            self.diffs.append((t, d2))
+            self.sum_d2 += d2
+        self.last_rr = rr
+        cutoff = t - self.window_s
+        while self.beats and self.beats[0][0] <= cutoff:
+            _, old = self.beats.popleft()
+            self.sum_rr -= old
+            self.sum_rr2 -= old * old
+        # A difference needs both intervals in the window, i.e. its earlier beat too
+        while self.diffs and (len(self.beats) < 2 or self.diffs[0][0] <= self.beats[0][0]):
+            _, old = self.diffs.popleft()
+            self.sum_d2 -= old
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self._resync()
+
+        # --- Frequency domain: linearly resample RR between the last two beats ---
+        if self.grid_start is None:
+            self.grid_start = t
+            self._push(np.array([rr]))
+        else:
+            first = self.resampled
+            last = int(np.floor((t - self.grid_start) * self.fs + 1e-9))
+            if last >= first:
+                grid = self.grid_start + np.arange(first, last + 1) / self.fs
+                self._push(prev_rr + (grid - prev_time) * ((rr - prev_rr) / (t - prev_time)))
+
+        return self._sample(t, rr)
+
+    def add_beats(self, times):
+        """Feed many beat times; returns the list of HRVSamples produced."""
+        samples = (self.add_beat(t) for t in np.asarray(times, dtype=np.float64).tolist())
+        return [s for s in samples if s is not None]
+
+    def _push(self, values):
+        m = len(values)
+        slots = (self.ring_index + np.arange(m)) % self.window_len
+        delta = values - self.ring[slots]
+        self.ring[slots] = values
+        self.ring_index = (self.ring_index + m) % self.window_len
+        # m sliding-DFT steps at once: X <- X w^m + sum_j delta_j w^(m - j)
+        powers = self.twiddle_powers.get(m)
+        if powers is None:
+            powers = self.twiddle_powers[m] = self.twiddle ** np.arange(m, 0, -1)[:, None]
+        self.dft = self.dft * powers[0] + delta @ powers
+        self.resampled += len(values)
+        # Re-derive the bins exactly once per window length to stop round-off drift
+        if self.resampled // self.window_len != (self.resampled - len(values)) // self.window_len:
+            ordered = np.roll(self.ring, -self.ring_index)
+            self.dft = np.fft.fft(ordered)[self.bins]
+
+    def _resync(self):
+        rr = np.array([b[1] for b in self.beats])
+        self.sum_rr = float(rr.sum())
+        self.sum_rr2 = float((rr * rr).sum())
+        self.sum_d2 = float(sum(d[1] for d in self.diffs))
+
+    def _sample(self, t, rr):
+        n = len(self.beats)
+        mean_rr = self.sum_rr / n
+        sdnn = math.sqrt(max(0.0, self.sum_rr2 / n - mean_rr * mean_rr))
+        rmssd = math.sqrt(max(0.0, self.sum_d2 / len(self.diffs))) if self.diffs else np.nan
+        if self.resampled >= self.window_len:
+            hann = 0.5 * self.dft[1:-1] - 0.25 * (self.dft[:-2] + self.dft[2:])
+            power = hann.real ** 2 + hann.imag ** 2
+            scale = _band_scale(self.window_len, self.fs)
+            lf = float(power[self.lf_band].sum()) * scale
+            hf = float(power[self.hf_band].sum()) * scale
+            ratio = lf / hf if hf > 0 else np.inf
+        else:
+            lf = hf = ratio = np.nan
+        return HRVSample(t, 60.0 / rr, mean_rr, sdnn, rmssd, lf, hf, ratio)
+
+
+def hrv_windows(beat_times, window_s=WINDOW_S, fs=RESAMPLE_HZ, ends=None):
+    """
+    Vectorized HRV over many windows of a finished recording.
+    `ends` are window end times (default: every beat from the second on, which
+    matches HRVEngine.add_beat). Returns a dict of arrays keyed like HRVSample.
+    """
+    t = np.asarray(beat_times, dtype=np.float64)
+    rr_t = t[1:]
+    rr = np.diff(t)
+    ends = rr_t if ends is None else np.asarray(ends, dtype=np.float64)
+
+    # --- Time domain from cumulative sums over the window (end - window_s, end] ---
+    hi = np.searchsorted(rr_t, ends, side='right')
+    lo = np.searchsorted(rr_t, ends - window_s, side='right')
+    n = hi - lo
+    c1 = np.concatenate([[0.0], np.cumsum(rr)])
+    c2 = np.concatenate([[0.0], np.cumsum(rr * rr)])
+    d2 = np.diff(rr) ** 2                        # d2[j] pairs rr[j] and rr[j + 1]
+    cd = np.concatenate([[0.0], np.cumsum(d2)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_rr = (c1[hi] - c1[lo]) / n
+        sdnn = np.sqrt(np.maximum(0.0, (c2[hi] - c2[lo]) / n - mean_rr ** 2))
+        nd = np.maximum(0, n - 1)
+        rmssd = np.sqrt((cd[np.maximum(hi - 1, lo)] - cd[lo]) / nd)
+    rmssd[nd == 0] = np.nan
+    hr = np.full(len(ends), np.nan)
+    has_beat = hi > 0
+    hr[has_beat] = 60.0 / rr[hi[has_beat] - 1]
+
+    # --- Frequency domain: resample once, then one rfft over every full window ---
+    window_len = int(round(window_s * fs))
+    lf = np.full(len(ends), np.nan)
+    hf = np.full(len(ends), np.nan)
+    ratio = np.full(len(ends), np.nan)
+    if len(rr_t):
+        grid = rr_t[0] + np.arange(int(np.floor((rr_t[-1] - rr_t[0]) * fs + 1e-9)) + 1) / fs
+        series = np.interp(grid, rr_t, rr)
+        last = np.floor((ends - rr_t[0]) * fs + 1e-9).astype(np.int64)  # last grid point per window
+        full = (last >= window_len - 1) & (last < len(series))
+        if np.any(full):
+            frames = np.lib.stride_tricks.sliding_window_view(series, window_len)[last[full] - window_len + 1]
+            hann = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(window_len) / window_len)
+            bins, lf_band, hf_band = _spectral_bins(window_len, fs)
+            spectra = np.fft.rfft(frames * hann, axis=1)[:, bins[1:-1]]
+            lf[full], hf[full], ratio[full] = _band_powers(spectra, lf_band, hf_band, window_len, fs)
+
+    return {'time': ends, 'hr': hr, 'mean_rr': mean_rr, 'sdnn': sdnn, 'rmssd': rmssd,
+            'lf': lf, 'hf': hf, 'lf_hf': ratio}
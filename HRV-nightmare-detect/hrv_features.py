@@ -0,0 +1,174 @@
+"""
+Offline HRV features of a whole night, one row per 30 s sleep-staging epoch.
+
+    python hrv_features.py RECORDING [-o features.npz] [-j WORKERS] [--block-minutes M]
+
+RECORDING is a board CSV (CH0) or a binary .session directory. The ECG is cut
+into BLOCK_S blocks, each padded with PAD_BEFORE_S / PAD_AFTER_S of the
+neighbouring signal, and the blocks are run through RPeakDetector in a
+process pool. A beat belongs to the block whose core [start, end) holds its R
+sample, so the padding only lets the detector's filters and thresholds settle
+and see beats across the edge; RR intervals are taken after the beats of all
+blocks are merged, so the interval spanning a block boundary is kept.
+
+Epochs follow sleepecg.SleepRecord(sleep_stage_duration=30): epoch k starts
+at k * 30 s from the first sample and there are floor(last beat / 30) of them.
+Per epoch:
+    epoch, start                     -- index and start time (s)
+    n_beats, hr                      -- beats with R in the epoch, HR from mean_rr (BPM)
+    mean_rr, sdnn, rmssd             -- over the RR intervals ending in the epoch (s)
+    lf, hf, lf_hf                    -- hrv_engine spectra over SPECTRAL_WINDOW_S centred on the epoch
+The table is saved as a columnar .npz (one array per column, plus the beat
+times and the sample rate); load_features() reads it back.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from hrv_engine import hrv_windows, WINDOW_S
+from rpeak_detector import RPeakDetector, REFRACTORY_S, SAMPLING_RATE
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+from session_format import SessionReader  # noqa: E402
+
+# --- Configuration ---
+EPOCH_S = 30              # sleepecg.SleepRecord(sleep_stage_duration=30)
+SPECTRAL_WINDOW_S = WINDOW_S  # LF/HF need more than one epoch of RR
+BLOCK_S = 30 * 60         # core length of one worker task; a multiple of EPOCH_S
+PAD_BEFORE_S = 20.0       # detector warm-up (2 s learning, then thresholds adapt)
+PAD_AFTER_S = 2.0         # beats near the end wait CONFIRM_S for confirmation
+COLUMNS = ("epoch", "start", "n_beats", "hr", "mean_rr", "sdnn", "rmssd", "lf", "hf", "lf_hf")
+
+
+# --- Input ---
+def read_ecg(path, channel=0):
+    """(ecg, fs) of a recording: session directory (memory-mapped) or board CSV."""
+    path = path.rstrip(os.sep)
+    if os.path.isdir(path):
+        reader = SessionReader(path)
+        return reader.channels[:, channel], reader.sample_rate
+    data = pd.read_csv(path, usecols=["ElapsedTime", f"CH{channel}"])
+    elapsed = data["ElapsedTime"].to_numpy(np.float64)
+    # ElapsedTime is stamped per received batch; the spread over a long file still gives the rate
+    fs = SAMPLING_RATE
+    if len(elapsed) > 1 and elapsed[-1] - elapsed[0] > 10.0:
+        fs = round((len(elapsed) - 1) / (elapsed[-1] - elapsed[0]))
+    return data[f"CH{channel}"].to_numpy(), fs
+
+
+def blocks(n, fs, block_s=BLOCK_S):
+    """(pad start, core start, core end, pad end) sample ranges covering n samples."""
+    size = int(block_s * fs)
+    before, after = int(PAD_BEFORE_S * fs), int(PAD_AFTER_S * fs)
+    return [(max(0, s - before), s, min(n, s + size), min(n, s + size + after)) for s in range(0, n, size)]
+
+
+# --- Worker ---
+def block_beats(segment, offset, core_start, core_end, fs):
+    """R sample indices (whole-recording) of the beats in [core_start, core_end), from a padded segment."""
+    beats = RPeakDetector(fs=fs).process(segment)
+    r = beats[:, 0].astype(np.int64) + offset
+    return r[(r >= core_start) & (r < core_end)]
+
+
+def detect_beats(ecg, fs, workers=None, block_s=BLOCK_S):
+    """R sample indices of a whole recording, detected block-parallel."""
+    ranges = blocks(len(ecg), fs, block_s)
+    workers = workers or os.cpu_count()
+    if workers <= 1 or len(ranges) == 1:
+        parts = [block_beats(ecg[lo:hi], lo, s, e, fs) for lo, s, e, hi in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            parts = list(pool.map(block_beats, *zip(*[(np.asarray(ecg[lo:hi]), lo, s, e, fs)
+                                                       for lo, s, e, hi in ranges])))
+    # Both neighbours may place the same edge beat a sample apart, on either side of the boundary
+    refractory = int(round(REFRACTORY_S * fs))
+    merged = []
+    for part in parts:
+        if merged and len(merged[-1]) and len(part) and part[0] - merged[-1][-1] < refractory:
+            part = part[1:]
+        if len(part):
+            merged.append(part)
+    return np.concatenate(merged) if merged else np.empty(0, np.int64)
+
+
+# --- Features ---
+def epoch_features(beat_times, epoch_s=EPOCH_S, spectral_window_s=SPECTRAL_WINDOW_S):
+    """Dict of per-epoch columns (see module docstring) for beat times in seconds."""
+    t = np.asarray(beat_times, dtype=np.float64)
+    n_epochs = int(t[-1] // epoch_s) if len(t) else 0
+    start = np.arange(n_epochs) * float(epoch_s)
+    bounds = np.searchsorted(t, np.append(start, n_epochs * float(epoch_s)))
+    n_beats = np.diff(bounds)
+
+    # Time domain over the intervals ending inside the epoch; hrv_windows counts (end - window, end]
+    ends = start + epoch_s - 1e-9
+    time_domain = hrv_windows(t, window_s=epoch_s, ends=ends)
+    with np.errstate(divide="ignore"):
+        hr = 60.0 / time_domain["mean_rr"]
+
+    spectral = hrv_windows(t, window_s=spectral_window_s, ends=start + (epoch_s + spectral_window_s) / 2.0)
+    return {
+        "epoch": np.arange(n_epochs, dtype=np.int64),
+        "start": start,
+        "n_beats": n_beats.astype(np.int64),
+        "hr": hr,
+        "mean_rr": time_domain["mean_rr"],
+        "sdnn": time_domain["sdnn"],
+        "rmssd": time_domain["rmssd"],
+        "lf": spectral["lf"],
+        "hf": spectral["hf"],
+        "lf_hf": spectral["lf_hf"],
+    }
+
+
+def extract(path, workers=None, block_s=BLOCK_S, channel=0):
+    """(features dict, beat times (s), fs) of one recording."""
+    ecg, fs = read_ecg(path, channel)
+    fs = int(round(fs))
+    beat_times = detect_beats(ecg, fs, workers, block_s) / fs
+    return epoch_features(beat_times), beat_times, fs
+
+
+# --- Output ---
+def save_features(out_path, features, beat_times, fs):
+    arrays = dict(features, beat_times=np.asarray(beat_times, np.float64), fs=np.int64(fs),
+                  epoch_s=np.int64(EPOCH_S))
+    # Write then rename, so an interrupted run never leaves a truncated file
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, out_path)
+
+
+def load_features(path):
+    """pandas DataFrame of the per-epoch columns of a features .npz."""
+    with np.load(path, allow_pickle=False) as data:
+        return pd.DataFrame({name: data[name] for name in COLUMNS})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("-o", "--output", default=None, help="default: <recording>_hrv.npz")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--block-minutes", type=float, default=BLOCK_S / 60)
+    parser.add_argument("--channel", type=int, default=0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    block_s = max(EPOCH_S, int(args.block_minutes * 60) // EPOCH_S * EPOCH_S)
+    features, beat_times, fs = extract(args.recording, args.workers, block_s, args.channel)
+    out = args.output or os.path.splitext(args.recording.rstrip(os.sep))[0] + "_hrv.npz"
+    save_features(out, features, beat_times, fs)
+    print(f"{len(beat_times)} beats, {len(features['epoch'])} epochs in {time.perf_counter() - t0:.1f}s -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import find_peaks
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+from filter_bank import filter_signal  # noqa: E402
 
 # --- Configuration ---
 FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),"working.csv")  # your uploaded file
@@ -15,8 +19,8 @@ data = np.genfromtxt(FILENAME, delimiter=',', names=True)
 times = data['ElapsedTime']
 ecg = data[f'CH{CHANNEL}']
 
-# --- Preprocess ---
-ecg = ecg - np.mean(ecg)
+# --- Preprocess: baseline removal, bandpass and notch, as live and in the EDF export ---
+ecg = filter_signal(ecg, SAMPLING_RATE)
 threshold = np.std(ecg) * PEAK_HEIGHT_FACTOR
 
 # --- R-peak detection ---
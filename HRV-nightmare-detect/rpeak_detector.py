@@ -0,0 +1,152 @@
+"""
+Streaming R-peak detector (Pan-Tompkins style).
+
+Takes ECG in chunks of any size, e.g. one channel of the batches SerialReader's
+pipeline produces, and carries all filter and threshold state between chunks:
+
+    bandpass 5-15 Hz -> derivative -> square -> 150 ms moving integration
+    -> local maxima -> adaptive signal/noise thresholds -> R location search-back
+
+Filtering is vectorized per chunk and the threshold logic only visits local
+maxima of the integrated signal, so the work per sample is constant. A beat is
+reported once no larger candidate can follow within CONFIRM_S, which bounds
+the detection latency.
+"""
+
+import numpy as np
+from scipy.signal import butter, lfilter, sosfilt, sosfilt_zi
+
+SAMPLING_RATE = 125  # Hz
+BAND = (5.0, 15.0)   # Hz, QRS energy band
+INTEGRATION_S = 0.150
+REFRACTORY_S = 0.3   # same minimum spacing as the offline find_peaks(distance=...)
+CONFIRM_S = 0.2      # wait this long for a larger candidate before reporting
+LEARNING_S = 2.0     # threshold initialisation period
+SEARCH_S = 0.25      # how far back from the integrator peak to look for the R sample
+
+
+class RPeakDetector:
+    def __init__(self, fs=SAMPLING_RATE, channel=0, on_beat=None):
+        self.fs = fs
+        self.channel = channel
+        self.on_beat = on_beat  # called with (r_index, rr_s, hr_bpm) for every beat
+
+        # --- Filter chain state ---
+        self.sos = butter(2, BAND, btype='bandpass', fs=fs, output='sos')
+        self.sos_zi = None
+        self.deriv_b = np.array([2.0, 1.0, 0.0, -1.0, -2.0]) * fs / 8.0
+        self.deriv_zi = np.zeros(len(self.deriv_b) - 1)
+        self.window = max(1, int(round(INTEGRATION_S * fs)))
+        self.mwi_b = np.ones(self.window) / self.window
+        self.mwi_zi = np.zeros(self.window - 1)
+
+        # --- Raw history for locating the R sample ---
+        self.search = int(round(SEARCH_S * fs))
+        self.history_len = self.search + 2
+        self.history = np.zeros(self.history_len)
+
+        # --- Peak logic state ---
+        self.n = 0                  # samples consumed so far
+        self.prev = np.zeros(2)     # last two integrator samples, for local-max detection
+        self.refractory = int(round(REFRACTORY_S * fs))
+        self.confirm = int(round(CONFIRM_S * fs))
+        self.learning = int(round(LEARNING_S * fs))
+        self.learn_max = 0.0
+        self.learn_sum = 0.0
+        self.spki = None
+        self.npki = None
+        self.pending = None          # (integrator index, value, r index) awaiting confirmation
+        self.last_peak = None        # integrator index of the last beat
+        self.last_r = None
+
+    @property
+    def threshold(self):
+        return self.npki + 0.25 * (self.spki - self.npki)
+
+    def process(self, samples):
+        """
+        Feed one chunk. Returns an array of confirmed beats, one row per beat:
+        (r_index, rr_s, hr_bpm); rr_s and hr_bpm are NaN for the first beat.
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        if not len(x):
+            return np.empty((0, 3))
+        start = self.n
+
+        if self.sos_zi is None:
+            self.sos_zi = sosfilt_zi(self.sos) * x[0]
+        band, self.sos_zi = sosfilt(self.sos, x, zi=self.sos_zi)
+        deriv, self.deriv_zi = lfilter(self.deriv_b, 1.0, band, zi=self.deriv_zi)
+        mwi, self.mwi_zi = lfilter(self.mwi_b, 1.0, deriv * deriv, zi=self.mwi_zi)
+
+        # Raw samples, with the history tail in front, for the R search-back
+        raw = np.concatenate([self.history, x])
+        raw_start = start - self.history_len
+
+        if self.spki is None:
+            self._learn(mwi, start)
+
+        # Local maxima of the integrator, including the one straddling the chunk boundary
+        ext = np.concatenate([self.prev, mwi])
+        peaks = np.flatnonzero((ext[1:-1] > ext[:-2]) & (ext[1:-1] >= ext[2:])) + start - 1
+        values = ext[peaks - start + 1]
+
+        beats = []
+        for idx, value in zip(peaks.tolist(), values.tolist()):
+            self._confirm_pending(idx, beats)
+            if self.spki is None or idx < self.learning:
+                continue
+            if value < self.threshold:
+                self.npki = 0.125 * value + 0.875 * self.npki
+                continue
+            if self.pending is not None and idx - self.pending[0] < self.refractory:
+                if value > self.pending[1]:
+                    self.pending = (idx, value, self._locate_r(raw, raw_start, idx))
+                continue
+            if self.last_peak is not None and idx - self.last_peak < self.refractory:
+                self.npki = 0.125 * value + 0.875 * self.npki
+                continue
+            self.pending = (idx, value, self._locate_r(raw, raw_start, idx))
+
+        self.n += len(x)
+        self._confirm_pending(self.n - 1, beats)
+        self.prev = ext[-2:]
+        self.history = raw[-self.history_len:]
+        return np.array(beats, dtype=np.float64).reshape(-1, 3)
+
+    def consume(self, batch):
+        """Pipeline consumer callback (subscribe with policy='block': beats need every sample)."""
+        return self.process(batch.values[:, self.channel])
+
+    def _learn(self, mwi, start):
+        part = mwi[:max(0, self.learning - start)]
+        if len(part):
+            self.learn_max = max(self.learn_max, float(part.max()))
+            self.learn_sum += float(part.sum())
+        if start + len(mwi) >= self.learning:
+            self.spki = self.learn_max / 3.0
+            self.npki = self.learn_sum / self.learning / 2.0
+
+    def _locate_r(self, raw, raw_start, idx):
+        # The integrator peak trails the R wave by roughly the window plus filter delay
+        lo = max(idx - self.search, raw_start)
+        segment = raw[lo - raw_start:idx - raw_start + 1]
+        return lo + int(np.argmax(segment))
+
+    def _confirm_pending(self, now, beats):
+        if self.pending is None or now - self.pending[0] < self.confirm:
+            return
+        idx, value, r = self.pending
+        self.pending = None
+        self.last_peak = idx
+        self.spki = 0.125 * value + 0.875 * self.spki
+        if self.last_r is not None and r - self.last_r > 0:
+            rr = (r - self.last_r) / self.fs
+            hr = 60.0 / rr
+        else:
+            rr = hr = np.nan
+        if self.last_r is None or r > self.last_r:
+            self.last_r = r
+            beats.append((r, rr, hr))
+            if self.on_beat:
+                self.on_beat(r, rr, hr)
@@ -0,0 +1,258 @@
+"""
+Qt-free acquisition: any number of boards in one process.
+
+    manager = AcquisitionManager(analysis_workers=2)
+    manager.add("/dev/ttyUSB0")
+    manager.add("replay:biosignals-abcdef.session?speed=1", name="bed-2")
+    ...
+    manager.stop_all()
+
+Each Device has its own transport, AcquisitionPipeline (reader and decoder
+threads), session id and logger. Live detection for every device runs on one
+bounded thread pool owned by the manager (pipeline.Consumer with an
+executor), so adding a bed adds two mostly idle threads, not a busy one, and
+readers pause READ_INTERVAL between reads so every stage sees a handful of
+samples per batch instead of one or two.
+Messages go to an `on_message(text)` callback, prefixed with the device name.
+"""
+
+import csv
+import os
+import random
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from packet_decoder import SAMPLE_RATE
+from pipeline import AcquisitionPipeline, DROP, BLOCK
+from replay import open_transport
+from session_format import SessionWriter, CSV_HEADER
+
+# --- Configuration ---
+BAUD_RATE = 115200
+LOG_FORMAT = "binary"  # "binary" (columnar session directory, see session_format.py), "csv" or None
+LOG_QUEUE_LEN = 1024   # batches; a full queue holds up decoding, never serial reads
+CSV_CHUNK_S = 30.0     # the chunked CSV log starts a new file this often
+LIVE_DETECTION = True  # REM-gated nightmare detection, vibrates via the board (detection_service.py)
+LIVE_STAGING = True    # sleep stages from the beat stream gate detection (live_staging.py, needs sleepecg)
+ANALYSIS_WORKERS = 2   # threads shared by every device's detection
+READ_INTERVAL = 0.04   # s the reader waits after each read, so batches hold ~5-10 samples
+LOG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOG_WRITE = metrics.timer("log_write")
+
+
+def new_session_id():
+    return ''.join(random.choices(string.ascii_lowercase, k=6))  # e.g. "asdfjk"
+
+
+class Device:
+    """One board: transport, pipeline, logger and (optionally) live detection."""
+
+    def __init__(self, port, baud=BAUD_RATE, name=None, log_format=LOG_FORMAT, log_dir=LOG_DIR,
+                 detection=LIVE_DETECTION, staging=LIVE_STAGING, fs=SAMPLE_RATE, read_interval=READ_INTERVAL,
+                 executor=None, on_message=print, session_id=None):
+        self.port = port
+        self.baud = baud
+        self.name = name or port
+        self.log_format = log_format
+        self.log_dir = log_dir
+        self.fs = fs
+        self.read_interval = read_interval
+        self.use_detection = detection
+        self.use_staging = staging
+        self.executor = executor
+        self._on_message = on_message
+        self.session_id = session_id or new_session_id()
+        self.transport = None
+        self.pipeline = None
+        self.detection = None
+        self.session_writer = None
+        self.csv_file = None
+        self.csv_writer = None
+        self.full_csv_file = None
+        self.full_csv_writer = None
+        self.csv_start_time = None
+        self.start_time = None
+
+    def on_message(self, text):
+        self._on_message(f"[{self.name}] {text}")
+
+    @property
+    def running(self):
+        return bool(self.pipeline and self.pipeline.running)
+
+    def start(self):
+        """Open the port and start reading; raises serial.SerialException/ValueError if it can't open."""
+        self.transport = open_transport(self.port, self.baud, timeout=1)
+        self.pipeline = AcquisitionPipeline(self.transport, on_message=self.on_message, fs=self.fs,
+                                            read_interval=self.read_interval)
+        self.start_time = time.time()
+        try:
+            if self.log_format == "csv":
+                self.open_new_csv()
+            elif self.log_format == "binary":
+                self.open_session()
+        except Exception:
+            # Bad log_dir, disk full: callers only drop the Device, so the port must not stay open
+            if self.csv_file:
+                self.csv_file.close()
+            self.transport.close()
+            self.pipeline = None
+            raise
+        if self.log_format:
+            self.pipeline.subscribe("logger", self.log_batch, maxsize=LOG_QUEUE_LEN, policy=BLOCK)
+        if self.use_detection:
+            # Beat detection needs every sample, so it blocks the decoder rather than dropping
+            self.pipeline.subscribe("detection", self.detect, maxsize=LOG_QUEUE_LEN, policy=BLOCK,
+                                    executor=self.executor)
+        self.pipeline.start()
+        return self
+
+    def detect(self, batch):
+        """Detection consumer; built on the first batch, so importing SciPy stays off the startup path."""
+        if self.detection is None:
+            from detection_service import DetectionService
+
+            stager = None
+            if self.use_staging:
+                from live_staging import LiveStager
+
+                stager = LiveStager(on_message=self.on_message)
+            self.detection = DetectionService(self.transport, fs=self.fs, stager=stager,
+                                              on_message=self.on_message)
+        self.detection.consume(batch)
+
+    def subscribe(self, name, callback=None, maxsize=64, policy=DROP):
+        """Extra consumer, e.g. a plot polled with drain(); see pipeline.Consumer."""
+        return self.pipeline.subscribe(name, callback, maxsize, policy)
+
+    def write(self, data):
+        if self.transport:
+            self.transport.write(data)
+
+    def stop(self):
+        """Stop reading, drain every consumer and close logs and port."""
+        if not self.pipeline:
+            return
+        self.pipeline.stop()
+        self.pipeline.join()
+        self.on_message(self.pipeline.format_stats())
+        self.on_message(self.pipeline.format_stream())
+        if self.detection:
+            self.on_message(self.detection.format_latency())
+            if self.detection.stager:
+                self.detection.stager.close()
+                self.on_message(self.detection.stager.format_stats())
+        if self.csv_file:
+            self.csv_file.close()
+        if self.full_csv_file:
+            self.full_csv_file.close()
+        if self.session_writer:
+            self.session_writer.close()
+        if getattr(self.transport, "is_open", False):
+            self.transport.close()
+
+    # --- Logging ---
+    def open_new_csv(self):
+        """Open new chunk CSV and keep full CSV open throughout the session."""
+        if self.csv_file:
+            self.csv_file.close()
+
+        # --- Chunked 30s file ---
+        csv_name = f"biosignals-{self.session_id}.csv"
+        self.csv_file = open(os.path.join(self.log_dir, csv_name), 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(CSV_HEADER)
+        self.csv_start_time = time.time()
+
+        # --- Full session file (created once) ---
+        if not self.full_csv_file:
+            full_name = f"biosignals-{self.session_id}-full.csv"
+            self.full_csv_file = open(os.path.join(self.log_dir, full_name), 'w', newline='')
+            self.full_csv_writer = csv.writer(self.full_csv_file)
+            self.full_csv_writer.writerow(CSV_HEADER)
+            self.on_message(f"[Logging] Started full session file: {full_name}")
+
+        self.on_message(f"[Logging] Started new chunk file: {csv_name}")
+
+    def open_session(self):
+        """Open the binary session directory; writes happen on its own thread."""
+        session_name = f"biosignals-{self.session_id}.session"
+        self.session_writer = SessionWriter(os.path.join(self.log_dir, session_name), self.session_id,
+                                            sample_rate=self.fs)
+        self.on_message(f"[Logging] Started binary session: {session_name}")
+
+    def log_batch(self, batch):
+        """Logger consumer, runs on its own pipeline thread."""
+        if self.log_format == "csv" and (time.time() - self.csv_start_time) >= CSV_CHUNK_S:
+            self.open_new_csv()
+
+        with LOG_WRITE.time():
+            # One timestamp per sample from the sample clock, not the batch arrival time (stream_monitor.py)
+            elapsed = batch.times - self.start_time
+            if self.session_writer:
+                self.session_writer.append(batch.counters, batch.values, elapsed)
+            if self.csv_writer:
+                rows = [[f"{t:.3f}", c] + v
+                        for t, c, v in zip(elapsed.tolist(), batch.counters.tolist(), batch.values.tolist())]
+                self.csv_writer.writerows(rows)           # chunk file
+                if self.full_csv_writer:
+                    self.full_csv_writer.writerows(rows)  # full file
+
+    def stats(self):
+        stats = self.pipeline.stats() if self.pipeline else {}
+        stats.update(name=self.name, port=self.port, session_id=self.session_id, running=self.running)
+        return stats
+
+
+class AcquisitionManager:
+    """Runs many Devices; `device_options` are defaults for every add()."""
+
+    def __init__(self, analysis_workers=ANALYSIS_WORKERS, on_message=print, **device_options):
+        self.on_message = on_message
+        self.device_options = device_options
+        self.executor = ThreadPoolExecutor(max_workers=analysis_workers, thread_name_prefix="analysis")
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def add(self, port, **options):
+        """Start acquiring from `port` (device name, pyserial URL or replay: URL)."""
+        options = {**self.device_options, **options}
+        device = Device(port, executor=self.executor, on_message=self.on_message, **options)
+        with self.lock:
+            if device.name in self.devices:
+                raise ValueError(f"Device already running: {device.name}")
+            self.devices[device.name] = device
+        try:
+            device.start()
+        except Exception:
+            with self.lock:
+                del self.devices[device.name]
+            raise
+        return device
+
+    def remove(self, name):
+        with self.lock:
+            device = self.devices.pop(name)
+        device.stop()
+
+    def stop_all(self):
+        with self.lock:
+            devices, self.devices = list(self.devices.values()), {}
+        for device in devices:
+            device.pipeline.stop()  # all readers stop together, then each drains
+        for device in devices:
+            device.stop()
+        self.executor.shutdown(wait=True)
+
+    def stats(self):
+        with self.lock:
+            return [device.stats() for device in self.devices.values()]
+
+    def format_stats(self):
+        with self.lock:
+            devices = list(self.devices.values())
+        return "\n".join(f"[{d.name}] {d.pipeline.format_stream()}" for d in devices if d.pipeline)
@@ -0,0 +1,109 @@
+"""
+Headless acquisition daemon: no Qt, no display.
+
+    python acquisitiond.py /dev/ttyUSB0 /dev/ttyUSB1 [--log-format binary|csv|none] [--log-dir DIR]
+                           [--no-detection] [--no-staging] [--workers N] [--stats-interval S] [--duration S]
+                           [--metrics-port PORT] [--live-port PORT]
+
+Runs one acquisition.Device per port (device names, pyserial URLs or
+replay:<recording>?speed=N) until SIGINT/SIGTERM or --duration, printing
+device messages, a stream health line per device and a metrics summary
+(metrics.py) every --stats-interval seconds; --metrics-port also serves them
+as Prometheus text on GET /metrics, and --live-port streams every device's
+decimated ECG, HR, stage and detections as server-sent events on GET
+/live/<device> (live_stream.py). Stopping drains every queue and closes the
+sessions cleanly.
+"""
+
+import argparse
+import signal
+import sys
+import threading
+import time
+
+from acquisition import (AcquisitionManager, ANALYSIS_WORKERS, LOG_DIR, LOG_FORMAT, LIVE_DETECTION, LIVE_STAGING,
+                         READ_INTERVAL)
+import metrics
+from packet_decoder import SAMPLE_RATE
+
+STATS_INTERVAL = 60.0
+
+
+def log(text):
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {text}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless biosignal acquisition")
+    parser.add_argument("ports", nargs="+")
+    parser.add_argument("--log-format", default=LOG_FORMAT or "none", choices=["binary", "csv", "none"])
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--no-detection", dest="detection", action="store_false", default=LIVE_DETECTION)
+    parser.add_argument("--no-staging", dest="staging", action="store_false", default=LIVE_STAGING,
+                        help="no live sleep staging (detection then never sees REM)")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS, help="analysis threads shared by all devices")
+    parser.add_argument("--fs", type=int, default=SAMPLE_RATE)
+    parser.add_argument("--read-interval", type=float, default=READ_INTERVAL)
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL)
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port")
+    parser.add_argument("--live-port", type=int, default=None, help="serve live server-sent events on this port")
+    args = parser.parse_args(argv)
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    manager = AcquisitionManager(analysis_workers=args.workers, on_message=log,
+                                 log_format=None if args.log_format == "none" else args.log_format,
+                                 log_dir=args.log_dir, detection=args.detection, staging=args.staging, fs=args.fs,
+                                 read_interval=args.read_interval)
+    live = None
+    if args.live_port:
+        # Only here: live_stream pulls in filter_bank and so SciPy, which the plain daemon never loads
+        from live_stream import LiveStreamServer
+        live = LiveStreamServer(args.live_port).start()
+    for port in args.ports:
+        try:
+            device = manager.add(port)
+        except Exception as e:  # one bad port must not take the other beds down
+            log(f"[{port}] Could not open: {e}")
+            continue
+        if live:
+            live.attach(device)
+    if not manager.devices:
+        manager.stop_all()
+        if live:
+            live.stop()
+        return 1
+    server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    log(f"[acquisitiond] Running {len(manager.devices)} device(s)"
+        + (f", metrics on :{args.metrics_port}/metrics" if server else "")
+        + (f", live on :{live.port}/live" if live else ""))
+
+    deadline = time.monotonic() + args.duration if args.duration else None
+    next_stats = time.monotonic() + args.stats_interval
+    while not stop.is_set():
+        now = time.monotonic()
+        if deadline and now >= deadline:
+            break
+        if now >= next_stats:
+            for line in manager.format_stats().splitlines():
+                log(line)
+            if live:
+                log(f"[Live] {live.format_stats()}")
+            log(metrics.format_summary())
+            next_stats = now + args.stats_interval
+        stop.wait(min(1.0, args.stats_interval))
+    log("[acquisitiond] Stopping")
+    manager.stop_all()
+    if live:
+        live.stop()
+    log(metrics.format_summary())
+    if server:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+How many concurrent devices one core sustains with AcquisitionManager.
+
+A simulator process opens one pty per device and replays working.csv into
+each at FS Hz in real time (PtyReplay); this process runs an
+AcquisitionManager with every device logging a binary session and running
+live detection on the shared analysis pool, opening the ptys with pyserial
+like real ports. For each device count it reports this process's CPU per
+device and whether it kept up: every device must have received (nearly) all
+packets the simulator sent, with no growing backlog.
+
+The simulator's own CPU is reported separately; on a one-core machine it
+competes with the acquisition process for the same core.
+
+    python bench_acquisition.py [--devices 1 2 4 8 ...] [--seconds S] [--fs HZ] [--workers W]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from acquisition import AcquisitionManager
+from packet_decoder import NUM_CHANNELS
+from replay import PtyReplay, load_source
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "working.csv")
+KEEP_UP = 0.98  # fraction of the sent packets a device must have decoded
+
+
+def simulator(conn, num_devices, fs):
+    counters, values, _ = load_source(FILENAME)
+    replays = [PtyReplay((counters, values, fs), speed=1.0, loop=True) for _ in range(num_devices)]
+    conn.send([r.port for r in replays])
+    t0, c0 = time.time(), time.process_time()
+    conn.recv()  # stop
+    cpu = (time.process_time() - c0) / (time.time() - t0)
+    conn.send(cpu)
+    for r in replays:
+        r.close()
+
+
+def run(num_devices, seconds, fs, workers, log_dir):
+    parent, child = mp.Pipe()
+    sim = mp.Process(target=simulator, args=(child, num_devices, fs), daemon=True)
+    sim.start()
+    ports = parent.recv()
+
+    manager = AcquisitionManager(analysis_workers=workers, on_message=lambda text: None,
+                                 log_format="binary", log_dir=log_dir, fs=fs, detection=True)
+    for i, port in enumerate(ports):
+        manager.add(port, name=f"bed-{i}")
+    time.sleep(2.0)  # settle: what queued in the ptys before they were opened is drained
+
+    devices = list(manager.devices.values())
+    start_packets = [d.pipeline.packets for d in devices]
+    t0, c0 = time.time(), time.process_time()
+    time.sleep(seconds)
+    wall = time.time() - t0
+    cpu = (time.process_time() - c0) / wall
+    got = np.array([d.pipeline.packets - p for d, p in zip(devices, start_packets)])
+    backlog = max(d.pipeline.backlog_bytes() for d in devices)
+    queued = max(c.queue.qsize() for d in devices for c in d.pipeline.consumers)
+
+    parent.send("stop")
+    sim_cpu = parent.recv()
+    manager.stop_all()
+    sim.join()
+
+    expected = wall * fs
+    kept_up = got.min() >= KEEP_UP * expected and queued < 64
+    print(f"{num_devices:4d} devices @ {fs} Hz: CPU {100 * cpu:5.1f}% of a core "
+          f"({100 * cpu / num_devices:5.2f}% per device) | packets/device min {got.min() / expected:6.1%} "
+          f"mean {got.mean() / expected:6.1%} of sent | backlog {backlog} B, queued {queued} | "
+          f"simulator {100 * sim_cpu:5.1f}% | {'ok' if kept_up else 'FALLING BEHIND'}")
+    return kept_up
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent device benchmark")
+    parser.add_argument("--devices", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32, 40, 48, 64])
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp()
+    try:
+        sustained = 0
+        for n in args.devices:
+            if not run(n, args.seconds, args.fs, args.workers, log_dir):
+                break
+            sustained = n
+        print(f"sustained: {sustained} devices at {args.fs} Hz ({NUM_CHANNELS} channels, "
+              f"binary logging + live detection, {os.cpu_count()} CPU(s) shared with the simulator)")
+    finally:
+        shutil.rmtree(log_dir)
+
+
+if __name__ == "__main__":
+    main()
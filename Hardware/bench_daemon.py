@@ -0,0 +1,100 @@
+"""
+Startup time and resident memory of the headless daemon.
+
+Starts acquisitiond.py as a child process on a replayed port (a binary
+session written here, so loading the source costs nothing) with and without
+live detection, and reports the time until it is acquiring ("Running ..."
+line), the import time alone and the peak RSS (VmHWM, Linux). Detection is
+built on the first batch, so SciPy's import shows up in RSS but not in the
+time to acquiring. For comparison it measures importing the Qt terminal,
+when PyQt6 and pyqtgraph are installed.
+
+    python bench_daemon.py [--runs N] [--seconds S]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from packet_decoder import NUM_CHANNELS
+from session_format import SessionWriter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_session(path, seconds=600, fs=125):
+    n = int(seconds * fs)
+    rng = np.random.default_rng(0)
+    writer = SessionWriter(path, "bench", sample_rate=fs)
+    writer.append(np.arange(n) % 256, 32768 + rng.integers(-500, 500, (n, NUM_CHANNELS)), np.arange(n) / fs)
+    writer.close()
+
+
+def child_run(code):
+    """(seconds until the 'Running' line or exit, exit code, peak RSS in MB) of `code` in a fresh interpreter."""
+    # VmHWM is per address space, so unlike RUSAGE_CHILDREN it excludes the fork of this process
+    probe = ("import atexit, sys; atexit.register(lambda: print('VmHWM', "
+             "[l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0], flush=True)); ")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", probe + code], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, cwd=HERE)
+    ready = None
+    rss = float("nan")
+    for line in proc.stdout:
+        if ready is None and "Running" in line:
+            ready = time.perf_counter() - t0
+        if line.startswith("VmHWM"):
+            rss = int(line.split()[1]) / 1024
+    proc.wait()
+    if ready is None:
+        ready = time.perf_counter() - t0
+    return ready, proc.returncode, rss
+
+
+def median_run(cmd, runs):
+    results = [child_run(cmd) for _ in range(runs)]
+    return np.median([r[0] for r in results]), results[-1][1], max(r[2] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless daemon startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=2.0, help="how long each daemon acquires")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        session = os.path.join(workdir, "bench.session")
+        make_session(session)
+        port = f"replay:{session}?speed=1"
+        argv = ['acquisitiond.py', port, '--log-dir', workdir, '--duration', str(args.seconds)]
+        daemon = f"import runpy; sys.argv = {argv!r}; "
+        run_daemon = "runpy.run_path('acquisitiond.py', run_name='__main__')"
+        cases = [
+            ("python -c pass", "pass"),
+            ("import acquisition", "import acquisition, acquisitiond"),
+            ("daemon, no detection", daemon + "sys.argv.append('--no-detection'); " + run_daemon),
+            ("daemon + detection", daemon + run_daemon),
+        ]
+        for label, cmd in cases:
+            ready, code, rss = median_run(cmd, args.runs)
+            print(f"{label:22s} ready in {ready * 1e3:7.1f} ms (median of {args.runs}), peak RSS {rss:6.1f} MB, "
+                  f"exit {code}")
+
+        ready, code, rss = child_run("import main_serial_terminal")
+        if code == 0:
+            print(f"{'import Qt terminal':22s} {ready * 1e3:7.1f} ms, peak RSS {rss:6.1f} MB")
+        else:
+            print(f"{'import Qt terminal':22s} not measured (PyQt6/pyqtgraph not installed)")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
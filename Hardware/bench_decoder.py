@@ -0,0 +1,106 @@
+"""
+Benchmark for PacketDecoder on a synthetic stream.
+
+Builds a few million packets with corrupted frames, stray bytes and command
+replies mixed in, checks the bulk decoder against the old byte-by-byte loop on
+a slice of it, then times the full stream fed in serial-sized reads.
+
+    python bench_decoder.py [num_packets] [read_size]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from packet_decoder import (PacketDecoder, NUM_CHANNELS, PACKET_LEN, SYNC1, SYNC2, END_BYTE,
+                            encode_packets, encode_command)
+
+
+def make_stream(num_packets, seed=0):
+    rng = np.random.default_rng(seed)
+    counters = np.arange(num_packets) % 256
+    values = rng.integers(0, 1 << 16, size=(num_packets, NUM_CHANNELS), dtype=np.uint16)
+    frames = np.frombuffer(encode_packets(counters, values), np.uint8).reshape(num_packets, PACKET_LEN).copy()
+
+    # ~0.1% of packets lose their end byte, another ~0.1% get a header inside the payload
+    bad_end = rng.random(num_packets) < 0.001
+    frames[bad_end, -1] = 0xFF
+    fake_header = rng.random(num_packets) < 0.001
+    frames[fake_header, 5] = SYNC1
+    frames[fake_header, 6] = SYNC2
+
+    chunks = []
+    command = encode_command("OK")
+    for i, block in enumerate(np.array_split(frames, max(1, num_packets // 1000))):
+        chunks.append(block.tobytes())
+        if i % 3 == 0:
+            chunks.append(command)
+        if i % 5 == 0:
+            chunks.append(bytes(rng.integers(0, 256, size=7, dtype=np.uint8)))
+    return b"".join(chunks)
+
+
+def legacy_decode(stream):
+    """Byte-by-byte reference: the old SerialReader.run loop, resyncing one byte on a bad end byte."""
+    buffer = bytearray(stream)
+    counters, values, commands = [], [], []
+    while len(buffer) >= PACKET_LEN:
+        if buffer[0] == SYNC1 and buffer[1] == SYNC2:
+            packet = buffer[:PACKET_LEN]
+            if packet[-1] == END_BYTE:
+                buffer = buffer[PACKET_LEN:]
+                counters.append(packet[2])
+                values.append([(packet[3 + 2 * i] << 8) | packet[4 + 2 * i] for i in range(NUM_CHANNELS)])
+            else:
+                buffer.pop(0)
+        elif buffer[0] == 0x2 and buffer[1] == 0x0 and buffer[2] == 0x0:
+            packet = buffer[:PACKET_LEN]
+            buffer = buffer[PACKET_LEN:]
+            if packet[-1] == 0x2:
+                commands.append(''.join(chr(i) for i in packet[3:PACKET_LEN - 1] if i != 0))
+        else:
+            buffer.pop(0)
+    return counters, values, commands
+
+
+def decode_all(stream, read_size):
+    decoder = PacketDecoder()
+    counters, values, commands = [], [], []
+    for start in range(0, len(stream), read_size):
+        c, v, cmd = decoder.feed(stream[start:start + read_size])
+        counters.append(c)
+        values.append(v)
+        commands.extend(cmd)
+    return np.concatenate(counters), np.concatenate(values), commands
+
+
+def main():
+    num_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000
+    read_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+
+    # --- Correctness against the legacy loop ---
+    sample = make_stream(20_000, seed=1)
+    ref_counters, ref_values, ref_commands = legacy_decode(sample)
+    counters, values, commands = decode_all(sample, 333)
+    assert counters.tolist() == ref_counters, "counter mismatch"
+    assert values.tolist() == ref_values, "value mismatch"
+    assert commands == ref_commands, "command mismatch"
+    print(f"[check] {len(ref_counters)} packets, {len(ref_commands)} commands match the legacy decoder")
+
+    # --- Throughput ---
+    stream = make_stream(num_packets)
+    t0 = time.perf_counter()
+    counters, values, commands = decode_all(stream, read_size)
+    elapsed = time.perf_counter() - t0
+    print(f"[bench] {len(stream) / 1e6:.1f} MB, {len(counters)} packets, {len(commands)} commands "
+          f"in {elapsed:.2f}s -> {len(counters) / elapsed / 1e6:.2f} M packets/s (reads of {read_size} B)")
+
+    t0 = time.perf_counter()
+    legacy_decode(stream[:20_000 * PACKET_LEN])
+    legacy_elapsed = time.perf_counter() - t0
+    print(f"[bench] legacy loop: {20_000 / legacy_elapsed / 1e3:.1f} k packets/s on a 20k-packet backlog")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+End-to-end latency of the live detection path at full sample rate.
+
+Streams working.csv as real 16-byte packets through an in-memory serial
+loopback at 125 Hz (or faster), through AcquisitionPipeline into
+DetectionService, and prints the per-stage latency histograms. The rule is
+forced to fire (no REM gate, no thresholds, short cooldown) so the command
+path is measured too; the VIBRATE bytes loop back and are skipped by the decoder.
+LF/HF needs a full HRV window (120 s) before the first decision can fire.
+
+    python bench_detection.py [seconds] [speed]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import serial
+
+import detection_service
+from detection_service import DetectionService
+from packet_decoder import encode_packets, NUM_CHANNELS, SAMPLE_RATE
+from pipeline import AcquisitionPipeline, BLOCK
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "working.csv")
+WRITE_INTERVAL = 0.008  # s between writes, roughly how the USB-serial bridge delivers
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 180.0
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    data = np.genfromtxt(FILENAME, delimiter=',', names=True)
+    values = np.column_stack([data[f'CH{i}'] for i in range(NUM_CHANNELS)]).astype(np.uint16)
+    n = min(len(values), int(seconds * SAMPLE_RATE))
+    stream = encode_packets(np.arange(n) % 256, values[:n])
+
+    detection_service.WARMUP_S = 5.0
+    detection_service.COOLDOWN_S = 10.0
+    detection_service.HR_SPIKE_RATIO = 0.0
+    detection_service.LF_HF_THRESHOLD = -1.0
+
+    port = serial.serial_for_url('loop://', timeout=0.1)
+    pipeline = AcquisitionPipeline(port, on_message=lambda text: None)
+    service = DetectionService(port, require_rem=False, on_message=lambda text: None)
+    pipeline.subscribe('detection', service.consume, maxsize=1024, policy=BLOCK)
+    pipeline.start()
+
+    rate = SAMPLE_RATE * speed
+    t0 = time.time()
+    sent = 0
+    while sent < n:
+        due = min(n, int((time.time() - t0) * rate))
+        if due > sent:
+            port.write(stream[sent * 16:due * 16])
+            sent = due
+        time.sleep(WRITE_INTERVAL)
+    time.sleep(1.0)
+    pipeline.stop()
+    pipeline.join()
+
+    print(f"[stream] {n} packets at {rate:.0f} Hz, {service.detector.n} samples detected on, "
+          f"{len(service.triggers)} vibrations sent")
+    print(service.format_latency())
+    print(pipeline.format_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark for filter_bank.FilterBank.
+
+Checks that filtering a night in one call, in 30 s chunks and in random
+live-sized batches gives bit-identical output, then times all 6 channels at
+several block sizes and reports samples/s per channel.
+
+    python bench_filter_bank.py [hours]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from filter_bank import FilterBank
+from packet_decoder import NUM_CHANNELS, SAMPLE_RATE
+from replay import load_source
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "working.csv")
+
+
+def run_blocks(bank, x, sizes):
+    out = []
+    start = 0
+    for size in sizes:
+        out.append(bank.process(x[start:start + size]))
+        start += size
+        if start >= len(x):
+            break
+    return np.concatenate(out)
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    _, values, _ = load_source(FILENAME)
+    n = int(hours * 3600 * SAMPLE_RATE)
+    x = np.resize(values, (n, NUM_CHANNELS))
+
+    whole = FilterBank().process(x)
+    chunked = run_blocks(FilterBank(), x, [30 * SAMPLE_RATE] * (n // (30 * SAMPLE_RATE) + 1))
+    rng = np.random.default_rng(0)
+    live = run_blocks(FilterBank(), x[:SAMPLE_RATE * 600], rng.integers(1, 40, SAMPLE_RATE * 600))
+    assert np.array_equal(whole, chunked), "30 s chunks differ from one pass"
+    assert np.array_equal(whole[:len(live)], live), "live batches differ from one pass"
+    print(f"[check] {hours:g} h x {NUM_CHANNELS} ch: one pass == 30 s chunks == random 1-39 sample batches "
+          f"(bit-identical)")
+
+    for label, size in (("live batch (5)", 5), ("1 s", SAMPLE_RATE), ("30 s", 30 * SAMPLE_RATE), ("whole", n)):
+        total = min(n, max(size * 2000, 30 * 60 * SAMPLE_RATE)) if size < n else n
+        bank = FilterBank()
+        t0 = time.perf_counter()
+        run_blocks(bank, x[:total], [size] * (total // size + 1))
+        elapsed = time.perf_counter() - t0
+        print(f"[bench] {label:15s} {total / elapsed / 1e6:6.2f} M samples/s/channel "
+              f"({total * NUM_CHANNELS / elapsed / 1e6:6.2f} M samples/s all channels, "
+              f"{total / SAMPLE_RATE / elapsed:8.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark for live_staging.LiveStager on a synthetic night of beats.
+
+Feeds beat times one by one (waiting for each handed-over epoch, so the
+timings are the staging work itself), then checks:
+  * cached features against sleepecg's whole-night extract_features
+  * live stages against post-hoc sleepecg.stage over the finished night
+and reports the per-epoch cost hour by hour: it grows until CONTEXT_EPOCHS
+are cached and then stays flat however long the night is.
+
+    python bench_live_staging.py [hours]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from metrics import LatencyHistogram
+from live_staging import LiveStager, get_classifier, EPOCH_S
+
+
+def synthetic_beats(hours, seed=0):
+    """RR with LF/HF modulation, a 90 min cycle in mean HR and variability, and noise."""
+    rng = np.random.default_rng(seed)
+    t, times = 0.0, [0.0]
+    while t < hours * 3600:
+        cycle = np.sin(2 * np.pi * t / 5400)
+        rr = (1.0 + 0.08 * cycle + (0.05 + 0.03 * cycle) * np.sin(2 * np.pi * 0.1 * t)
+              + 0.03 * np.sin(2 * np.pi * 0.25 * t) + rng.normal(0, 0.01 + 0.01 * (cycle > 0.5)))
+        t += rr
+        times.append(t)
+    return np.array(times)
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    import sleepecg
+
+    t0 = time.perf_counter()
+    clf = get_classifier()
+    print(f"[load] classifier in {time.perf_counter() - t0:.1f}s")
+    beats = synthetic_beats(hours)
+    print(f"[data] {len(beats)} beats, {hours:g} h")
+
+    stager = LiveStager(clf, on_message=print)
+    hours_hist = [stager.latency]
+    handed = stager.next_epoch
+    t0 = time.perf_counter()
+    for t in beats.tolist():
+        stager.add_beat(t)
+        if stager.next_epoch != handed:
+            handed = stager.next_epoch
+            stager._executor.submit(lambda: None).result()
+            if t >= 3600 * len(hours_hist):
+                stager.latency = LatencyHistogram()
+                hours_hist.append(stager.latency)
+    stager._executor.submit(lambda: None).result()
+    total = time.perf_counter() - t0
+    for hour, hist in enumerate(h for h in hours_hist if h.count):
+        s = hist.summary()
+        print(f"[bench] hour {hour + 1}: {s['count']:3d} runs, per epoch p50 {s['p50'] * 1e3:6.1f} ms, "
+              f"p99 {s['p99'] * 1e3:6.1f} ms, max {s['max'] * 1e3:6.1f} ms")
+    print(f"[bench] whole night live: {total:.1f}s")
+
+    # --- Features: incremental windows vs whole night ---
+    record = sleepecg.SleepRecord(sleep_stage_duration=EPOCH_S, heartbeat_times=beats)
+    full, _, ids = sleepecg.extract_features([record], sleep_stage_duration=EPOCH_S,
+                                             **clf.feature_extraction_params)
+    full = full[0]
+    # sleepecg divides these by the longest window of the record, which only the whole night knows
+    ragged = np.isin(ids, ["pNN50", "pNN20"])
+    picks = np.linspace(0, len(full) - 10, 60).astype(int)
+    err = ragged_err = 0.0
+    for k in picks:
+        # What add_beat hands over: from the window start (minus margin) up to the first beat past its end
+        lo = np.searchsorted(beats, k * EPOCH_S - stager.lookback - 10.0)
+        hi = np.searchsorted(beats, k * EPOCH_S + stager.lookforward)
+        window = beats[lo:hi + 1]
+        row = stager.epoch_features(k, k + 1, window)[0]
+        assert np.array_equal(np.isfinite(row), np.isfinite(full[k])), f"epoch {k}: NaN pattern differs"
+        both = np.isfinite(row) & np.isfinite(full[k])
+        rel = np.abs(row - full[k]) / np.maximum(np.abs(full[k]), 1e-9)
+        err = max(err, np.max(rel[both & ~ragged]))
+        ragged_err = max(ragged_err, np.max(rel[both & ragged], initial=0.0))
+    print(f"[check] features of {len(picks)} epochs vs whole-night extraction: max rel. error {err:.1e} "
+          f"({ragged.sum()} of {len(ids)} features normalized per record differ by up to {ragged_err:.0%})")
+
+    # --- Stages: live vs post-hoc ---
+    t0 = time.perf_counter()
+    post = sleepecg.stage(clf, record, return_mode="prob")
+    post_elapsed = time.perf_counter() - t0
+    epochs, live = stager.stage_probabilities()
+    agree = np.mean(live.argmax(1) == post[epochs].argmax(1))
+    print(f"[check] {len(epochs)} live epochs, {agree:.1%} agree with post-hoc staging "
+          f"(post-hoc whole night: {post_elapsed:.1f}s, once, after the night)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Cost of the metrics layer: per timed block and per counter increment with
+metrics enabled and disabled, next to one decode of a typical live batch
+(READ_INTERVAL worth of packets), and a sample of the exported text.
+
+    python bench_metrics.py [iterations]
+"""
+
+import sys
+import time
+
+import metrics
+from packet_decoder import PacketDecoder, PACKET_LEN, encode_packets
+from pipeline import DECODE
+from replay import load_source
+
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    bench_timer = metrics.timer("bench")
+    bench_counter = metrics.counter("bench")
+
+    def timed_block():
+        with bench_timer.time():
+            pass
+
+    def empty_block():
+        pass
+
+    base = per_call(empty_block, n)
+    for enabled in (True, False):
+        metrics.enable(enabled)
+        t = per_call(timed_block, n) - base
+        c = per_call(lambda: bench_counter.inc(5), n) - base
+        print(f"[bench] metrics {'enabled ' if enabled else 'disabled'}: timed block {t * 1e9:6.0f} ns, "
+              f"counter.inc {c * 1e9:6.0f} ns")
+    metrics.enable(True)
+
+    counters, values, _ = load_source("working.csv")
+    stream = encode_packets(counters[:5], values[:5])
+    decoder = PacketDecoder()
+    d = per_call(lambda: decoder.feed(stream), n // 10)
+    print(f"[bench] decoding one 5-packet batch ({5 * PACKET_LEN} B): {d * 1e9:6.0f} ns")
+
+    for _ in range(1000):
+        with DECODE.time():
+            decoder.feed(stream)
+    print(metrics.format_summary())
+    print("\n".join(line for line in metrics.render_prometheus().splitlines() if "decode" in line))
+
+
+if __name__ == "__main__":
+    main()
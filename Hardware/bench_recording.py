@@ -0,0 +1,110 @@
+"""
+Benchmark for recording.Recording on a synthetic session.
+
+Writes an N-hour session (125 Hz, 6 channels, elapsed stamped per 40-sample
+batch like the live logger), then times opening it, the overview build and a
+cached reopen, random 30 s windows, epoch jumps and overview queries at
+several zoom levels, checking every answer against plain numpy on the full
+arrays. Window and overview times should not grow with the night's length.
+
+    python bench_recording.py [hours ...]
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from packet_decoder import NUM_CHANNELS, SAMPLE_RATE
+from session_format import COLUMNS, META_FILE
+from recording import Recording, EPOCH_S
+
+BATCH = 40
+QUERIES = 200
+
+
+def make_session(path, hours, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * SAMPLE_RATE) // BATCH * BATCH
+    os.makedirs(path)
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump({'session_id': 'bench', 'num_channels': NUM_CHANNELS,
+                   'sample_rate': SAMPLE_RATE, 'start_time': 0.0}, f)
+    received = np.arange(n // BATCH) * BATCH / SAMPLE_RATE + rng.uniform(0, 0.02, n // BATCH)
+    elapsed = np.maximum.accumulate(np.repeat(received, BATCH))
+    channels = (32768 + rng.normal(0, 2000, (n, NUM_CHANNELS))).astype('<u2')
+    (np.arange(n) % 256).astype(np.uint8).tofile(os.path.join(path, COLUMNS['counter'][0]))
+    elapsed.astype('<f8').tofile(os.path.join(path, COLUMNS['elapsed'][0]))
+    channels.tofile(os.path.join(path, COLUMNS['channels'][0]))
+    return elapsed, channels
+
+
+def timed(fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - t0) / repeat
+
+
+def run(hours, workdir):
+    path = os.path.join(workdir, f'bench-{hours:g}h.session')
+    elapsed, channels = make_session(path, hours)
+    rng = np.random.default_rng(1)
+
+    rec, open_s = timed(lambda: Recording(path))
+    _, index_s = timed(lambda: rec.seconds)
+    _, build_s = timed(rec.levels)
+    cached, reopen_s = timed(lambda: Recording(path).levels())
+
+    start = elapsed[0]
+    lat = []
+    for t0 in rng.uniform(0, rec.duration - EPOCH_S, QUERIES):
+        (times, values), s = timed(lambda: rec.window(t0, t0 + EPOCH_S, channels=[0, 2]))
+        lat.append(s)
+        i0, i1 = np.searchsorted(elapsed, [start + t0, start + t0 + EPOCH_S])
+        assert values.base is not None and np.array_equal(values, channels[i0:i1, 0:3:2])
+    window_ms = np.percentile(np.array(lat) * 1e3, 99)
+
+    lat = []
+    for k in rng.integers(0, rec.num_epochs, QUERIES):
+        (_, values), s = timed(lambda: rec.epoch(k, channels=0))
+        lat.append(s)
+        i0, i1 = np.searchsorted(elapsed, [start + k * EPOCH_S, start + (k + 1) * EPOCH_S])
+        assert np.array_equal(values, channels[i0:i1, 0])
+    epoch_ms = np.percentile(np.array(lat) * 1e3, 99)
+
+    zoom = []
+    for span in (rec.duration, 3600, 300, 10):
+        lat = []
+        for t0 in rng.uniform(0, max(rec.duration - span, 0), QUERIES // 4):
+            (times, lo, hi), s = timed(lambda: rec.overview(t0, t0 + span, 2000, channels=0))
+            lat.append(s)
+            assert len(times) <= 2000 + 2
+            i0, i1 = np.searchsorted(elapsed, [start + t0, start + t0 + span])
+            assert lo.min() <= channels[i0:i1, 0].min() and hi.max() >= channels[i0:i1, 0].max()
+        zoom.append(f"{span:g}s {np.percentile(np.array(lat) * 1e3, 99):.2f}")
+
+    _, full_s = timed(lambda: np.fromfile(os.path.join(path, COLUMNS['channels'][0]), dtype='<u2'))
+    print(f"{hours:4g} h {len(rec) / 1e6:5.1f}M samples: open {open_s * 1e3:.1f} ms, index {index_s * 1e3:.1f} ms, "
+          f"overview build {build_s:.2f} s / cached {reopen_s * 1e3:.1f} ms ({len(cached)} levels) | "
+          f"p99 window {window_ms:.3f} ms, epoch {epoch_ms:.3f} ms, overview [{', '.join(zoom)}] ms | "
+          f"full load {full_s * 1e3:.0f} ms")
+    shutil.rmtree(path)
+
+
+def main():
+    hours = [float(h) for h in sys.argv[1:]] or [0.5, 2, 8]
+    workdir = tempfile.mkdtemp()
+    try:
+        for h in hours:
+            run(h, workdir)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Throughput of the full acquisition path on a replayed recording, no board needed.
+
+    replay --> AcquisitionPipeline --> logger (SessionWriter, blocking)
+                                   --> plot (drained at PLOT_FPS into RingBuffer/PeakDecimator)
+                                   --> detection (DetectionService, blocking)
+
+The source (working.csv by default) is tiled to the requested length and
+replayed at max speed or N x real time, through the in-memory transport or a
+pty opened with pyserial. Without impairments the logged session must equal
+the source exactly; with them, the decoded fraction is reported.
+
+    python bench_replay.py [--seconds S] [--speed N|max] [--pty] [--corrupt P] [--drop P] [--source FILE]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import serial
+
+from detection_service import DetectionService
+from packet_decoder import NUM_CHANNELS, PACKET_LEN
+from pipeline import AcquisitionPipeline, DROP, BLOCK
+from replay import ReplayTransport, PtyReplay, load_source
+from ring_buffer import RingBuffer, PeakDecimator
+from session_format import SessionWriter, SessionReader
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "working.csv")
+PLOT_FPS = 30
+PLOT_POINTS = 500
+
+
+def plot_loop(consumer, stop):
+    """What SerialTerminal.refresh_plot does per frame, minus the drawing."""
+    history = RingBuffer(PLOT_POINTS, NUM_CHANNELS)
+    decimator = PeakDecimator(2, NUM_CHANNELS)
+    display = RingBuffer(PLOT_POINTS, NUM_CHANNELS)
+    while not stop.is_set():
+        for batch in consumer.drain():
+            samples = batch.values.astype(np.float32) - 32768
+            history.extend(samples)
+            display.extend(decimator.process(samples))
+        time.sleep(1.0 / PLOT_FPS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay throughput benchmark")
+    parser.add_argument("--source", default=FILENAME)
+    parser.add_argument("--seconds", type=float, default=3600.0, help="recording length to replay")
+    parser.add_argument("--speed", default="max")
+    parser.add_argument("--pty", action="store_true", help="go through a pseudo-terminal and pyserial")
+    parser.add_argument("--corrupt", type=float, default=0.0)
+    parser.add_argument("--drop", type=float, default=0.0)
+    args = parser.parse_args()
+
+    counters, values, fs = load_source(args.source)
+    n = int(args.seconds * fs)
+    counters = np.resize(counters, n)
+    values = np.resize(values, (n, NUM_CHANNELS))
+    speed = None if args.speed in ("max", "0") else float(args.speed)
+    impaired = bool(args.corrupt or args.drop)
+
+    workdir = tempfile.mkdtemp()
+    replay = None
+    try:
+        if args.pty:
+            replay = PtyReplay((counters, values, fs), speed, args.corrupt, args.drop)
+            transport = serial.Serial(replay.port, timeout=0.1)
+        else:
+            transport = replay = ReplayTransport((counters, values, fs), speed, args.corrupt, args.drop,
+                                                 timeout=0.1)
+        t0 = time.perf_counter()
+        pipeline = AcquisitionPipeline(transport, on_message=lambda text: None)
+        writer = SessionWriter(os.path.join(workdir, "replay.session"), "replay", sample_rate=fs)
+        start = time.time()
+        pipeline.subscribe("logger", lambda b: writer.append(b.counters, b.values, b.times - start),
+                           maxsize=1024, policy=BLOCK)
+        plot = pipeline.subscribe("plot", maxsize=32, policy=DROP)
+        detection = DetectionService(transport, fs=fs, require_rem=False, on_message=lambda text: None)
+        pipeline.subscribe("detection", detection.consume, maxsize=1024, policy=BLOCK)
+        stop_plot = threading.Event()
+        plotter = threading.Thread(target=plot_loop, args=(plot, stop_plot), daemon=True)
+        plotter.start()
+        pipeline.start()
+
+        replay.finished.wait()
+        while transport.in_waiting or pipeline.raw.qsize():
+            time.sleep(0.01)
+        time.sleep(0.2)  # the reader's last read
+        pipeline.stop()
+        pipeline.join()
+        stop_plot.set()
+        plotter.join()
+        writer.close()
+        elapsed = time.perf_counter() - t0
+        transport.close()
+
+        session = SessionReader(os.path.join(workdir, "replay.session"))
+        mode = "pty" if args.pty else "memory"
+        print(f"[replay] {n} packets ({args.seconds / 3600:.2f} h at {fs} Hz) via {mode} at speed {args.speed}: "
+              f"{elapsed:.2f} s, {pipeline.packets / elapsed / 1e3:.1f} k packets/s, "
+              f"{args.seconds / elapsed:.0f}x real time")
+        if impaired:
+            print(f"[replay] corrupt {args.corrupt:g} drop {args.drop:g}: {pipeline.packets} of {n} packets decoded "
+                  f"({100.0 * pipeline.packets / n:.2f}%), {replay.bytes_sent} of {n * PACKET_LEN} bytes delivered")
+        else:
+            assert len(session) == n, (len(session), n)
+            assert np.array_equal(session.counter, counters) and np.array_equal(session.channels, values)
+            print(f"[check] logged session matches the source ({n} packets)")
+        print(f"[detect] {detection.detector.n} samples, {len(detection.triggers)} triggers")
+        print(detection.format_latency())
+        print(pipeline.format_stats())
+        print(pipeline.format_stream())
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
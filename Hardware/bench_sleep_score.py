@@ -0,0 +1,93 @@
+"""
+Benchmark for sleep_score.score_nights.
+
+Checks the vectorized scores against a plain per-night loop on a few hundred
+random nights, in both the padded and the concatenated layout, then scores
+N nights of up to 8 h (960 epochs, float32 like sleepecg) in one call.
+
+    python bench_sleep_score.py [num_nights]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from sleep_score import (score_nights, NREM, REM, UNDEFINED, EPOCH_S, SUB_SCORES, SCORE_WEIGHTS,
+                         TARGET_SLEEP_S, NREM_TARGET_S, NREM_MAX_S, REM_TARGET_S, REM_MAX_S,
+                         LATENCY_GOOD_S, LATENCY_BAD_S)
+
+MAX_EPOCHS = 960
+
+
+def random_nights(num_nights, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, MAX_EPOCHS + 1, num_nights)
+    probs = rng.random((num_nights, MAX_EPOCHS, 4), dtype=np.float32)
+    probs[:, :, UNDEFINED] *= 0.2  # unknown is rare
+    probs[:, :20, NREM] *= 0.3     # some sleep onset latency
+    probs[:, :20, REM] *= 0.3
+    return probs, lengths
+
+
+def reference(night):
+    """One night, one epoch at a time, the way the old script counted."""
+    count = [0, 0, 0, 0]
+    onset = None
+    for i, row in enumerate(night.tolist()):
+        stage = row.index(max(row))
+        count[stage] += 1
+        if onset is None and stage in (NREM, REM):
+            onset = i * EPOCH_S
+
+    def ramp(t, target, upper):
+        return 95 / target * t if t < target else min(100, 95 + 5 / (upper - target) * (t - target))
+
+    in_bed = len(night) - count[UNDEFINED]
+    subs = {
+        'total_sleep_score': min(100, 100 / TARGET_SLEEP_S * len(night) * EPOCH_S),
+        'efficiency_score': 100 * (count[NREM] + count[REM]) / in_bed if in_bed else 0.0,
+        'latency_score': 0.0 if onset is None else
+        min(100, max(0, 100 * (LATENCY_BAD_S - onset) / (LATENCY_BAD_S - LATENCY_GOOD_S))),
+        'nrem_score': ramp(count[NREM] * EPOCH_S, NREM_TARGET_S, NREM_MAX_S),
+        'rem_score': ramp(count[REM] * EPOCH_S, REM_TARGET_S, REM_MAX_S),
+    }
+    return sum(subs[k] * w for k, w in SCORE_WEIGHTS.items()) / sum(SCORE_WEIGHTS.values()), subs
+
+
+def check(num_nights=300):
+    probs, lengths = random_nights(num_nights, seed=1)
+    padded = score_nights(probs, lengths)
+    ragged = score_nights(np.concatenate([p[:n] for p, n in zip(probs, lengths)]), lengths)
+    for i, (p, n) in enumerate(zip(probs, lengths)):
+        score, subs = reference(p[:n])
+        for result in (padded, ragged):
+            assert np.isclose(result['score'][i], score), (i, result['score'][i], score)
+            for name in SUB_SCORES:
+                assert np.isclose(result[name][i], subs[name]), (i, name)
+    print(f"check: {num_nights} nights match the per-night loop (padded and concatenated)")
+
+
+def main():
+    num_nights = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    check()
+
+    probs, lengths = random_nights(num_nights)
+    t0 = time.perf_counter()
+    result = score_nights(probs, lengths)
+    elapsed = time.perf_counter() - t0
+    epochs = int(lengths.sum())
+    print(f"{num_nights} nights ({epochs / 1e6:.1f}M epochs, {probs.nbytes / 2 ** 30:.2f} GiB) in {elapsed:.2f} s: "
+          f"{num_nights / elapsed:,.0f} nights/s, mean score {np.nanmean(result['score']):.1f}")
+
+    t0 = time.perf_counter()
+    sample = min(num_nights, 1000)
+    for p, n in zip(probs[:sample], lengths[:sample]):
+        reference(p[:n])
+    loop = (time.perf_counter() - t0) / sample
+    print(f"per-night Python loop: {loop * 1e3:.2f} ms/night -> {loop * num_nights:.0f} s for all "
+          f"({loop * num_nights / elapsed:.0f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Accuracy check for stream_monitor on a simulated board link.
+
+The board samples at SAMPLE_RATE on a crystal that is DRIFT_PPM off, drops
+packets in random bursts and the host receives them in USB-sized batches with
+random extra delay. Compares the sample timestamps StreamMonitor rebuilds
+with the true sample times, against stamping every row with its batch's
+arrival time (what the logger did before), and checks the loss count.
+
+    python bench_stream_monitor.py [hours] [drift_ppm]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from packet_decoder import SAMPLE_RATE
+from stream_monitor import StreamMonitor
+
+BATCH_S = 0.016          # USB-serial bridge delivery interval
+DELAY_MS = (2.0, 40.0)   # base delay, mean of the exponential extra delay
+LOSS_BURSTS_PER_H = 120
+MAX_BURST = 50           # packets
+
+
+def simulate(hours, drift_ppm, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * SAMPLE_RATE)
+    true_times = 1000.0 + np.arange(n) / SAMPLE_RATE * (1 + drift_ppm * 1e-6)
+    keep = np.ones(n, dtype=bool)
+    for start in rng.integers(0, n, int(hours * LOSS_BURSTS_PER_H)):
+        keep[start:start + rng.integers(1, MAX_BURST)] = False
+    index = np.flatnonzero(keep)
+    # Rows leave in batches every BATCH_S, each batch delayed independently
+    batch_of = (true_times[index] // BATCH_S).astype(np.int64)
+    bounds = np.flatnonzero(np.diff(batch_of)) + 1
+    batches = np.split(index, bounds)
+    base, extra = DELAY_MS
+    received = [true_times[b[-1]] + (base + rng.exponential(extra)) * 1e-3 for b in batches]
+    return true_times, index, batches, received, n - len(index)
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    drift_ppm = float(sys.argv[2]) if len(sys.argv) > 2 else 80.0
+    true_times, index, batches, received, lost = simulate(hours, drift_ppm)
+
+    monitor = StreamMonitor()
+    rebuilt, stamped = [], []
+    t0 = time.perf_counter()
+    for rows, t in zip(batches, received):
+        _, times = monitor.update(rows % 256, t)
+        rebuilt.append(times)
+        stamped.append(np.full(len(rows), t))
+    elapsed = time.perf_counter() - t0
+
+    settle = index > 60 * SAMPLE_RATE  # first minute: the clock is still locking
+    for name, times in (("batch arrival", stamped), ("sample clock", rebuilt)):
+        times = np.concatenate(times)
+        error = np.abs(times - true_times[index])[settle] * 1e3
+        spacing = np.diff(times[settle])
+        print(f"{name:14s} |error| p50 {np.percentile(error, 50):6.2f} p99 {np.percentile(error, 99):6.2f} "
+              f"max {error.max():6.2f} ms | spacing std {spacing.std() * 1e3:6.3f} ms, "
+              f"non-increasing {np.count_nonzero(spacing <= 0)}")
+    print(f"loss: {monitor.lost} counted, {lost} simulated, in {monitor.gaps} gaps | "
+          f"drift {monitor.clock.drift_ppm():+.0f} ppm (true {drift_ppm:+.0f}) | "
+          f"{len(index)} packets in {elapsed:.2f} s")
+    assert monitor.lost == lost
+
+
+if __name__ == "__main__":
+    main()
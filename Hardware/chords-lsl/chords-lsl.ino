@@ -86,6 +86,9 @@ uint8_t currentChannel;            // Current channel being sampled
 uint16_t adcValue = 0;             // ADC current value
 bool timerStatus = false;          // SATUS bit
 bool bufferReady = false;          // Buffer ready status bit
+#define MOTOR_PIN 7                   // Vibration motor (see motor/motor.ino)
+#define VIBRATE_MS 1000               // Length of one VIBRATE pulse
+unsigned long vibrateUntil = 0;    // millis() at which the motor turns off, 0 = off
 
 
 // Designed for 125 Hz!!!!
@@ -191,7 +194,7 @@ void timerBegin(float sampling_rate) {
 
 void setup() {
   Serial.begin(BAUD_RATE);
-  pinMode(7, OUTPUT);
+  pinMode(MOTOR_PIN, OUTPUT);
   // while (!Serial) {
   //   ;  // Wait for serial port to connect. Needed for native USB
   // }
@@ -240,6 +243,11 @@ void loop() {
     else if (command == "START")  {
       timerStart();
     } 
+    else if (command == "VIBRATE") {
+      // Non-blocking so sampling keeps running while the motor is on
+      digitalWrite(MOTOR_PIN, HIGH);
+      vibrateUntil = millis() + VIBRATE_MS;
+    }
     // else if (command == "STOP")  // Stop data acquisition
     // {
     //   timerStop();
@@ -273,6 +281,11 @@ void loop() {
       timerStop();
     }
   }
+  if (vibrateUntil && (long)(millis() - vibrateUntil) >= 0) {
+    digitalWrite(MOTOR_PIN, LOW);
+    vibrateUntil = 0;
+  }
+
   // Send data if the buffer is ready and the timer is activ
   if (timerStatus and bufferReady) {
     // Send the packetBuffer to the Serial port
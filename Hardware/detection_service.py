@@ -0,0 +1,204 @@
+"""
+Live nightmare detection and motor trigger.
+
+Subscribes to the acquisition pipeline, runs the streaming R-peak detector and
+HRV engine on the ECG channel and applies the REM-gated rule from the
+notebooks: during REM, a heart-rate spike over the slow baseline together with
+an elevated LF/HF ratio sends VIBRATE to the board (chords-lsl.ino pulses the
+motor on pin 7).
+
+Every beat is timestamped at each stage (arrival of the packet holding the R
+sample, beat confirmed, HRV updated, decision, command written) and the
+stage-to-stage latencies go into fixed-bin histograms, see latency_report().
+"""
+
+import math
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "HRV-nightmare-detect"))
+from rpeak_detector import RPeakDetector  # noqa: E402
+from hrv_engine import HRVEngine  # noqa: E402
+
+import metrics  # noqa: E402
+from metrics import LatencyHistogram  # noqa: E402
+from packet_decoder import SAMPLE_RATE  # noqa: E402
+
+# --- Rule configuration ---
+ECG_CHANNEL = 0
+HR_FAST_TAU_S = 10.0        # short HR average that has to spike
+HR_BASELINE_TAU_S = 600.0   # 10 min baseline, as in the notebooks
+HR_SPIKE_RATIO = 1.25       # +25% over baseline ...
+HR_SPIKE_BPM = 12.0         # ... or +12 BPM
+LF_HF_THRESHOLD = 2.0
+WARMUP_S = 300.0            # no decisions until the baseline has settled
+COOLDOWN_S = 300.0          # minimum time between two vibrations
+VIBRATE_COMMAND = b"VIBRATE\n"
+REM_STAGES = ('R', 'REM')
+
+BEAT_DETECTION = metrics.timer("beat_detection")
+HRV_UPDATE = metrics.timer("hrv_update")
+BEATS = metrics.counter("beats")
+VIBRATIONS = metrics.counter("vibrations")
+
+STAGES = ('arrival_to_beat', 'beat_to_hrv', 'hrv_to_decision', 'decision_to_command',
+          'batch_to_decision', 'arrival_to_decision')
+
+
+class DetectionService:
+    """
+    Pipeline consumer: subscribe(..., self.consume, policy='block') so no samples are lost.
+    `stage_fn` returns the current sleep stage label (e.g. 'REM') or None when unknown;
+    a `stager` (live_staging.LiveStager) is fed every beat and is the default stage_fn.
+    With require_rem=False the rule runs regardless of stage (bench and bedside testing).
+    """
+
+    def __init__(self, transport=None, fs=SAMPLE_RATE, channel=ECG_CHANNEL,
+                 stage_fn=None, require_rem=True, stager=None, on_message=print):
+        self.transport = transport
+        self.fs = fs
+        self.channel = channel
+        self.stager = stager
+        self.stage_fn = stage_fn or (stager.current_stage if stager else None)
+        self.require_rem = require_rem
+        self.on_message = on_message
+
+        self.detector = RPeakDetector(fs=fs, channel=channel)
+        self.engine = HRVEngine()
+        self.samples = 0
+        # (first detector sample, arrival time, stream index of each sample) of recent batches
+        self.arrivals = deque()
+
+        self.hr_fast = None
+        self.hr_baseline = None
+        self.last_trigger = -math.inf
+        self.triggers = []       # (beat time s, wall time) of every vibration
+        self.latest = None       # last HRVSample
+        self.latency = {name: LatencyHistogram() for name in STAGES}
+
+    def consume(self, batch):
+        start = self.samples
+        n = len(batch.counters)
+        self.samples += n
+        self.arrivals.append((start, batch.received, self._stream_index(batch, start, n)))
+        # Keep only batches that can still hold an unconfirmed R sample
+        horizon = start - 2 * self.fs
+        while len(self.arrivals) > 1 and self.arrivals[1][0] <= horizon:
+            self.arrivals.popleft()
+
+        with BEAT_DETECTION.time():
+            beats = self.detector.process(batch.values[:, self.channel])
+        BEATS.inc(len(beats))
+        t_beat = time.time()
+        for r_index, rr, hr in beats.tolist():
+            self._on_beat(int(r_index), t_beat, batch.received)
+
+    def _stream_index(self, batch, start, n):
+        """
+        Running stream index of each sample (stream_monitor.py): lost packets keep their slot,
+        so beats after a gap keep their true spacing. The detector only counts received samples.
+        """
+        if batch.index is None:
+            return np.arange(start, start + n)
+        if batch.times is None:
+            return batch.index + np.arange(n)
+        # SampleClock times are linear in the index, so they carry gaps inside the batch as well
+        return batch.index + np.rint((batch.times - batch.times[0]) * self.fs).astype(np.int64)
+
+    def _batch_of(self, r_index):
+        found = self.arrivals[0]
+        for entry in self.arrivals:
+            if entry[0] > r_index:
+                break
+            found = entry
+        return found
+
+    def _on_beat(self, r_index, t_beat, t_batch):
+        first, t_arrival, index = self._batch_of(r_index)
+        t = int(index[min(max(r_index - first, 0), len(index) - 1)]) / self.fs
+        if self.stager:
+            self.stager.add_beat(t)
+        with HRV_UPDATE.time():
+            sample = self.engine.add_beat(t)
+        t_hrv = time.time()
+        fired = False
+        if sample is not None:
+            self.latest = sample
+            fired = self._decide(sample)
+        t_decision = time.time()
+
+        self.latency['arrival_to_beat'].record(t_beat - t_arrival)
+        self.latency['beat_to_hrv'].record(t_hrv - t_beat)
+        self.latency['hrv_to_decision'].record(t_decision - t_hrv)
+        self.latency['batch_to_decision'].record(t_decision - t_batch)
+        self.latency['arrival_to_decision'].record(t_decision - t_arrival)
+        if fired:
+            self._vibrate(sample.time)
+            self.latency['decision_to_command'].record(time.time() - t_decision)
+
+    def _decide(self, sample):
+        # Exponential averages with per-beat weights, so the baseline tracks time, not beat count
+        rr = 60.0 / sample.hr
+        if self.hr_fast is None:
+            self.hr_fast = self.hr_baseline = sample.hr
+            return False
+        self.hr_fast += (1 - math.exp(-rr / HR_FAST_TAU_S)) * (sample.hr - self.hr_fast)
+        self.hr_baseline += (1 - math.exp(-rr / HR_BASELINE_TAU_S)) * (sample.hr - self.hr_baseline)
+
+        if sample.time < WARMUP_S or sample.time - self.last_trigger < COOLDOWN_S:
+            return False
+        if self.require_rem:
+            stage = self.stage_fn() if self.stage_fn else None
+            if stage not in REM_STAGES:
+                return False
+        spike = (self.hr_fast > self.hr_baseline * HR_SPIKE_RATIO
+                 or self.hr_fast - self.hr_baseline >= HR_SPIKE_BPM)
+        return spike and np.isfinite(sample.lf_hf) and sample.lf_hf > LF_HF_THRESHOLD
+
+    def _vibrate(self, beat_time):
+        self.last_trigger = beat_time
+        self.triggers.append((beat_time, time.time()))
+        VIBRATIONS.inc()
+        if self.transport:
+            self.transport.write(VIBRATE_COMMAND)
+        self.on_message(f"[Detection] Nightmare pattern at {beat_time:.1f}s "
+                        f"(HR {self.hr_fast:.0f} vs {self.hr_baseline:.0f} BPM, LF/HF {self.latest.lf_hf:.2f}), vibrating")
+
+    def latency_report(self):
+        return {name: hist.summary() for name, hist in self.latency.items()}
+
+    def format_latency(self):
+        lines = []
+        for name, s in self.latency_report().items():
+            if s['count']:
+                lines.append(f"{name:20s} n={s['count']:6d} p50={s['p50'] * 1e3:8.2f}ms "
+                             f"p99={s['p99'] * 1e3:8.2f}ms max={s['max'] * 1e3:8.2f}ms")
+        return "\n".join(lines)
+
+
+def replay_night(beat_times, stages=None, epoch_s=30, require_rem=True):
+    """
+    Beat times (s) at which the rule would have fired over a finished night.
+    `stages` holds one label per epoch_s epoch (e.g. 'REM', from post-hoc
+    staging) in place of the live stage; nothing is written or counted.
+    """
+    service = DetectionService(require_rem=require_rem, on_message=lambda msg: None)
+    current = [None]
+    service.stage_fn = lambda: current[0]
+    fired = []
+    for t in np.asarray(beat_times, dtype=np.float64).tolist():
+        if stages is not None:
+            epoch = int(t // epoch_s)
+            current[0] = stages[epoch] if epoch < len(stages) else None
+        sample = service.engine.add_beat(t)
+        if sample is None:
+            continue
+        service.latest = sample
+        if service._decide(sample):
+            service.last_trigger = sample.time
+            fired.append(sample.time)
+    return fired
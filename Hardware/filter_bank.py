@@ -0,0 +1,97 @@
+"""
+Streaming preprocessing for the board's channels: baseline removal,
+bandpass and mains notch as one cascade of second-order IIR sections.
+
+    bank = FilterBank(fs=125)              # all NUM_CHANNELS at once
+    for block in blocks:                   # any block size, e.g. live batches or 30 s
+        clean = bank.process(block)        # (n, channels) float64, ADC offset removed
+
+The section state (zi) is carried between calls, and is initialised from the
+first sample only, so streaming a night in chunks gives bit-identical output
+to filtering it in one call. Used by the live plot, the offline RR extraction
+(HRV-nightmare-detect/hrv_interval_inaator.py) and the filtered EDF exports
+(session_format.to_edf, backend/csvToEDF.py).
+"""
+
+import numpy as np
+from scipy.signal import butter, iirnotch, sosfilt, sosfilt_zi, tf2sos
+
+from packet_decoder import NUM_CHANNELS, SAMPLE_RATE
+
+# --- Default chain ---
+HIGHPASS_HZ = 0.5   # baseline wander (breathing, movement)
+LOWPASS_HZ = 40.0   # EMG and noise above the ECG band
+NOTCH_HZ = 50.0     # mains; 60 in the Americas
+NOTCH_Q = 30.0
+ORDER = 2           # Butterworth order of each band edge
+ADC_OFFSET = 32768  # raw values are int16 + 0x8000
+
+
+def design(fs, highpass=HIGHPASS_HZ, lowpass=LOWPASS_HZ, notch=NOTCH_HZ, order=ORDER, notch_q=NOTCH_Q):
+    """(n_sections, 6) SOS of the chain; a stage is left out when its frequency is None or not below Nyquist."""
+    nyquist = fs / 2.0
+    highpass = highpass if highpass and highpass < nyquist else None
+    lowpass = lowpass if lowpass and lowpass < nyquist else None
+    sections = []
+    if highpass and lowpass:
+        sections.append(butter(order, [highpass, lowpass], btype='bandpass', fs=fs, output='sos'))
+    elif highpass:
+        sections.append(butter(order, highpass, btype='highpass', fs=fs, output='sos'))
+    elif lowpass:
+        sections.append(butter(order, lowpass, btype='lowpass', fs=fs, output='sos'))
+    if notch and notch < nyquist:
+        sections.append(tf2sos(*iirnotch(notch, notch_q, fs=fs)))
+    if not sections:
+        return np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])  # pass-through
+    return np.vstack(sections)
+
+
+def prefilter_label(fs, highpass=HIGHPASS_HZ, lowpass=LOWPASS_HZ, notch=NOTCH_HZ):
+    """EDF 'prefilter' header text, e.g. 'HP:0.5Hz LP:40Hz N:50Hz'."""
+    nyquist = fs / 2.0
+    parts = []
+    if highpass and highpass < nyquist:
+        parts.append(f"HP:{highpass:g}Hz")
+    if lowpass and lowpass < nyquist:
+        parts.append(f"LP:{lowpass:g}Hz")
+    if notch and notch < nyquist:
+        parts.append(f"N:{notch:g}Hz")
+    return " ".join(parts)
+
+
+class FilterBank:
+    """Stateful SOS cascade over (n, channels) blocks; see design() for the stages."""
+
+    def __init__(self, fs=SAMPLE_RATE, channels=NUM_CHANNELS, highpass=HIGHPASS_HZ, lowpass=LOWPASS_HZ,
+                 notch=NOTCH_HZ, offset=ADC_OFFSET):
+        self.fs = fs
+        self.channels = channels
+        self.offset = offset
+        self.sos = design(fs, highpass, lowpass, notch)
+        self.prefilter = prefilter_label(fs, highpass, lowpass, notch)
+        self._zi_unit = sosfilt_zi(self.sos)[:, :, None]  # (sections, 2, 1): steady state for a unit step
+        self.zi = None
+
+    def reset(self):
+        """Forget the state; the next block starts a new stream."""
+        self.zi = None
+
+    def process(self, block):
+        """Filter one block; a 1-D block is taken as one channel."""
+        x = np.asarray(block, dtype=np.float64)
+        flat = x.ndim == 1
+        if not len(x):
+            # Empty reads are normal; reshape(0, -1) cannot infer the channel count
+            return np.empty(0) if flat else np.empty((0, x.shape[1] if x.ndim == 2 else self.channels))
+        x = x.reshape(len(x), -1) - self.offset
+        if self.zi is None:
+            # Start as if the first sample had always been there: no step response at the start
+            self.zi = self._zi_unit * x[0]
+        y, self.zi = sosfilt(self.sos, x, axis=0, zi=self.zi)
+        return y[:, 0] if flat else y
+
+
+def filter_signal(x, fs=SAMPLE_RATE, **options):
+    """One-shot FilterBank over a whole (n,) or (n, channels) array."""
+    x = np.asarray(x)
+    return FilterBank(fs, 1 if x.ndim == 1 else x.shape[1], **options).process(x)
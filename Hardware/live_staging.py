@@ -0,0 +1,202 @@
+"""
+Live sleep staging from the beat stream, one 30 s epoch at a time.
+
+    stager = LiveStager(on_stage=print)
+    stager.add_beat(t)            # R-peak time (s since the stream started), e.g. from DetectionService
+    stager.current_stage()        # 'WAKE' / 'NREM' / 'REM', or None until the first epoch is staged
+
+sleepecg computes the features of epoch k (starting at k * 30 s) from the RR
+intervals in [start - lookback, start + lookforward) -- 120 s and 150 s for
+wrn-gru-mesa -- so epoch k is final once a beat past start + lookforward has
+arrived; the live stage therefore trails real time by about lookforward.
+For every newly final epoch:
+  * features are extracted from only the beats inside its window (plus a
+    margin), shifted so sleepecg's epoch grid lines up, and cached; they
+    equal the features of the whole-night extraction, except pNN50/pNN20,
+    which sleepecg divides by the longest window of the whole record
+  * the classifier runs over the last CONTEXT_EPOCHS cached feature rows only,
+    and the last row's probabilities are the live estimate for that epoch
+Both costs depend on lookback/lookforward and CONTEXT_EPOCHS, not on how long
+the night has been running. The model is bidirectional, so the live estimate
+(no future context) can differ from post-hoc staging of the finished night.
+
+The classifier is loaded once per process on a background thread, and all
+stagers share one staging thread, so neither TensorFlow's start-up nor a
+model run ever blocks the beat path.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+from metrics import LatencyHistogram
+from sleep_score import EPOCH_S, NREM, REM, WAKE
+
+# --- Configuration ---
+CLASSIFIER = "wrn-gru-mesa"       # as backend/sleepScoreData.py
+CLASSIFIER_SOURCE = "SleepECG"
+CONTEXT_EPOCHS = 160              # feature rows the classifier sees per run (80 min, about one sleep cycle)
+WINDOW_MARGIN_S = 10.0            # extra beats around a feature window, for RR and interpolation at its edges
+GUARD_RR_S = 1.0                  # spacing of the guard beats appended for sleepecg, see epoch_features()
+STAGE_LABELS = {NREM: 'NREM', REM: 'REM', WAKE: 'WAKE'}
+
+STAGING = metrics.timer("staging")
+EPOCHS_STAGED = metrics.counter("epochs_staged")
+
+_classifier = None
+_classifier_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_classifier(name=CLASSIFIER, source=CLASSIFIER_SOURCE):
+    """The process-wide classifier, loaded on first use."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            import sleepecg
+
+            _classifier = sleepecg.load_classifier(name, source)
+    return _classifier
+
+
+def _staging_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="staging")
+    return _executor
+
+
+class LiveStager:
+    def __init__(self, clf=None, context_epochs=CONTEXT_EPOCHS, on_stage=None, on_message=print):
+        self.context_epochs = context_epochs
+        self.on_stage = on_stage      # called with (epoch, probs row, label) on the staging thread
+        self.on_message = on_message
+        self.clf = clf
+        self.params = None
+        self.lookback = self.lookforward = None
+        self.failed = False
+
+        self.beats = deque()          # beat times still inside a window that is not final yet
+        self.next_epoch = 0           # first epoch not handed to the staging thread yet
+        self.features = deque(maxlen=context_epochs)  # cached feature rows of the latest epochs
+        self.probs = []               # (epoch, probs row) of every staged epoch
+        self.latest = None            # (epoch, probs row, label)
+        self.latency = LatencyHistogram()
+        self.closed = False
+        self._executor = _staging_executor()
+        self._executor.submit(self._load)
+
+    # --- Beat side (caller's thread) ---
+    def add_beat(self, t):
+        if self.closed or self.failed:
+            return
+        self.beats.append(t)
+        if self.lookforward is None:
+            return  # classifier still loading: keep every beat until its windows are known
+        last_final = math.floor((t - self.lookforward) / EPOCH_S)
+        if last_final < self.next_epoch:
+            return
+        first, self.next_epoch = self.next_epoch, last_final + 1
+        lo = first * EPOCH_S - self.lookback - WINDOW_MARGIN_S
+        beats = np.fromiter((b for b in self.beats if b >= lo), dtype=np.float64)
+        # Beats before the next epoch's window are never needed again
+        keep_from = self.next_epoch * EPOCH_S - self.lookback - WINDOW_MARGIN_S
+        while self.beats and self.beats[0] < keep_from:
+            self.beats.popleft()
+        self._executor.submit(self._stage, first, self.next_epoch, beats, time.perf_counter())
+
+    def add_beats(self, times):
+        for t in np.asarray(times, dtype=np.float64).tolist():
+            self.add_beat(t)
+
+    def current_stage(self):
+        """Label of the newest staged epoch, or None; usable as DetectionService's stage_fn."""
+        latest = self.latest
+        return latest[2] if latest else None
+
+    def close(self):
+        """Stop staging new epochs (work already queued still runs)."""
+        self.closed = True
+
+    # --- Staging thread ---
+    def _load(self):
+        try:
+            self.clf = self.clf or get_classifier()
+        except Exception as e:  # sleepecg/TensorFlow missing or model not downloadable
+            self.failed = True
+            self.on_message(f"[Staging] Live staging disabled: {type(e).__name__}: {e}")
+            return
+        self.params = dict(self.clf.feature_extraction_params)
+        # Set last: add_beat starts handing over epochs as soon as lookforward is known
+        self.lookback = self.params["lookback"]
+        self.lookforward = self.params["lookforward"]
+
+    def epoch_features(self, first, stop, beats):
+        """Feature rows of epochs [first, stop) from the beats around them, as the whole-night extraction gives them."""
+        from sleepecg import SleepRecord, extract_features
+
+        # Shift by whole epochs so epoch `first` sits at least `lookback` after the record start
+        base = max(0, first - math.ceil(self.lookback / EPOCH_S))
+        # sleepecg's PSD fails on a record where every window has a gap (short records, one artifact
+        # in the overlap of all windows), so a regular beat train follows the real beats. It starts
+        # after the first beat past epoch stop - 1's window, so none of the returned rows sees it.
+        guard = beats[-1] + GUARD_RR_S * np.arange(1, math.ceil((self.lookback + self.lookforward) / GUARD_RR_S)
+                                                    + 2 * EPOCH_S)
+        times = np.concatenate([beats, guard]) - base * EPOCH_S
+        record = SleepRecord(sleep_stage_duration=EPOCH_S, heartbeat_times=times)
+        features = extract_features([record], sleep_stage_duration=EPOCH_S, **self.params)[0][0]
+        return features[first - base:stop - base]
+
+    def _stage(self, first, stop, beats, submitted):
+        if self.closed:
+            return
+        try:
+            with STAGING.time():
+                rows = self.epoch_features(first, stop, beats)
+                # Epochs handed over together share a run and each gets its own row of it. A handoff
+                # longer than the context (a long beat gap, a slow classifier load) runs in chunks
+                # of at most context_epochs, so every row is still in the run that stages it.
+                staged = []
+                for lo in range(0, len(rows), self.context_epochs):
+                    part = rows[lo:lo + self.context_epochs]
+                    self.features.extend(part)
+                    context = np.array(self.features)
+                    context[~np.isfinite(context)] = self.clf.mask_value
+                    probs = np.asarray(self.clf.model.predict_on_batch(context[np.newaxis, ...]))[0]
+                    staged.extend(probs[len(probs) - len(part):])
+        except Exception as e:
+            self.on_message(f"[Staging] Epochs {first}-{stop - 1} failed: {type(e).__name__}: {e}")
+            return
+        for epoch, row in zip(range(first, stop), staged):
+            label = STAGE_LABELS.get(int(np.argmax(row)))
+            self.probs.append((epoch, row))
+            self.latest = (epoch, row, label)
+            if self.on_stage:
+                self.on_stage(epoch, row, label)
+        EPOCHS_STAGED.inc(stop - first)
+        self.latency.record(time.perf_counter() - submitted)
+
+    # --- Reporting ---
+    def stage_probabilities(self):
+        """(epochs, (n, 4) probabilities) of everything staged so far."""
+        if not self.probs:
+            return np.empty(0, np.int64), np.empty((0, 4))
+        epochs, rows = zip(*self.probs)
+        return np.array(epochs), np.vstack(rows)
+
+    def format_stats(self):
+        if self.failed:
+            return "Staging: disabled"
+        if not self.latest:
+            return "Staging: no epoch staged yet"
+        epoch, row, label = self.latest
+        s = self.latency.summary()
+        return (f"Staging: {len(self.probs)} epochs, epoch {epoch} {label} (p={row.max():.2f}) | "
+                f"per epoch p50={s['p50'] * 1e3:.1f}ms p99={s['p99'] * 1e3:.1f}ms")
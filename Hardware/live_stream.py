@@ -0,0 +1,326 @@
+"""
+Live server-sent events from the acquisition process, for the companion app.
+
+    server = LiveStreamServer(port=8765).start()   # asyncio event loop on its own thread
+    server.attach(device)                          # acquisition.Device, once started
+    ...
+    server.stop()
+
+    GET /live               -> JSON: the attached devices and their subscriber counts
+    GET /live/<device>      -> text/event-stream:
+        event: frame      data: {"t", "ecg": [min, max, ...], "hr", "stage"}   every FRAME_INTERVAL_S
+        event: detection  data: {"t", "wall"}                                  every vibration
+        event: end                                                             device detached
+
+One LiveProducer per device is a 'drop' consumer of its pipeline: it filters
+the ECG channel (filter_bank.py), keeps ECG_DECIMATE-sample min/max pairs
+(ring_buffer.PeakDecimator), reads HR, stage and new detections from the
+device's DetectionService, and serializes each frame once. The encoded bytes
+go to the event loop, which appends them to every subscriber's bounded deque
+of SUBSCRIBER_FRAMES frames. A subscriber's writer task sends what its deque
+holds and waits for the socket to drain; while it waits, newer frames push
+the oldest out (counted as dropped), so a slow client costs at most its
+deque, the transport's WRITE_BUFFER and the kernel's SEND_BUFFER, and never
+holds up the others or the producer. Detection events have their own deque and are sent before frames.
+"""
+
+import asyncio
+import json
+import re
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import unquote
+
+import metrics
+from filter_bank import FilterBank
+from pipeline import DROP
+from ring_buffer import PeakDecimator
+
+# --- Configuration ---
+FRAME_INTERVAL_S = 0.25      # one frame per device this often
+ECG_DECIMATE = 5             # samples per min/max pair: 125 Hz -> 50 points/s
+ECG_CHANNEL = 0
+PRODUCER_QUEUE = 64          # batches; the producer drops the oldest if it falls behind
+SUBSCRIBER_FRAMES = 8        # frames a slow client may lag behind (2 s) before old ones are dropped
+EVENT_BACKLOG = 16           # detection events kept for a client that is not reading
+WRITE_BUFFER = 32 * 1024     # bytes buffered per socket before the writer waits for the client
+SEND_BUFFER = 32 * 1024      # kernel send buffer per client (SO_SNDBUF), bounds kernel memory as well
+HEARTBEAT_S = 15.0           # comment line to idle streams, so dead clients are noticed
+MAX_REQUEST = 8192
+RETRY_MS = 2000              # EventSource reconnect delay
+PATH = re.compile(r"^/live(?:/([^?]*))?(?:\?.*)?$")  # device names are percent-encoded (/dev/ttyUSB0)
+
+FRAMES = metrics.counter("live_frames")
+DROPPED = metrics.counter("live_frames_dropped")
+CONNECTS = metrics.counter("live_connects")
+ENCODE = metrics.timer("live_encode")
+
+SSE_HEADERS = (b"HTTP/1.1 200 OK\r\n"
+               b"Content-Type: text/event-stream\r\n"
+               b"Cache-Control: no-cache\r\n"
+               b"Connection: keep-alive\r\n"
+               b"Access-Control-Allow-Origin: *\r\n"
+               b"X-Accel-Buffering: no\r\n\r\n"
+               + f"retry: {RETRY_MS}\n\n".encode())
+PING = b": ping\n\n"
+END = b"event: end\ndata: {}\n\n"
+
+
+def sse(event, data, event_id=None):
+    head = f"event: {event}\n" + (f"id: {event_id}\n" if event_id is not None else "")
+    return (head + "data: " + json.dumps(data, separators=(",", ":")) + "\n\n").encode()
+
+
+class _Subscriber:
+    __slots__ = ("writer", "frames", "events", "wake", "dropped")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.frames = deque(maxlen=SUBSCRIBER_FRAMES)
+        self.events = deque(maxlen=EVENT_BACKLOG)
+        self.wake = asyncio.Event()
+        self.dropped = 0
+
+
+class DeviceChannel:
+    """Subscribers of one device; only touched from the event loop."""
+
+    def __init__(self, name):
+        self.name = name
+        self.subscribers = set()
+        self.frames = 0
+        self.dropped = 0
+        self.closed = False
+
+    def publish_frame(self, payload):
+        self.frames += 1
+        for sub in self.subscribers:
+            if len(sub.frames) == SUBSCRIBER_FRAMES:
+                sub.dropped += 1
+                self.dropped += 1
+                DROPPED.inc()
+            sub.frames.append(payload)
+            sub.wake.set()
+
+    def publish_event(self, payload):
+        for sub in self.subscribers:
+            sub.events.append(payload)
+            sub.wake.set()
+
+    def ping(self):
+        for sub in self.subscribers:
+            if not sub.frames and not sub.events:
+                sub.frames.append(PING)
+                sub.wake.set()
+
+    def close(self):
+        self.closed = True
+        for sub in self.subscribers:
+            sub.wake.set()
+
+    def abort(self):
+        """Drop the connections still stuck on a client that stopped reading."""
+        for sub in list(self.subscribers):
+            sub.writer.transport.abort()
+
+    def stats(self):
+        return {"device": self.name, "subscribers": len(self.subscribers), "frames": self.frames,
+                "dropped": self.dropped}
+
+
+class LiveProducer:
+    """Pipeline consumer of one device: batches -> encoded frames handed to the server's loop."""
+
+    def __init__(self, server, device, channel=ECG_CHANNEL):
+        self.server = server
+        self.device = device
+        self.name = device.name
+        self.channel = channel
+        self.filter = FilterBank(fs=device.fs, channels=1)
+        self.decimator = PeakDecimator(ECG_DECIMATE, 1)
+        self.ecg = []
+        self.next_frame = 0.0
+        self.seq = 0
+        self.events_sent = 0
+
+    def consume(self, batch):
+        x = self.filter.process(batch.values[:, self.channel])
+        self.ecg.extend(self.decimator.process(x)[:, 0].round().astype(int).tolist())
+        now = time.monotonic()
+        if now < self.next_frame:
+            return
+        self.next_frame = now + FRAME_INTERVAL_S
+        with ENCODE.time():
+            detection = self.device.detection
+            latest = detection.latest if detection else None
+            stager = detection.stager if detection else None
+            frame = {
+                "t": round(float(batch.times[-1]) - self.device.start_time, 3) if batch.times is not None else None,
+                "ecg": self.ecg,
+                "hr": round(latest.hr, 1) if latest else None,
+                "stage": stager.current_stage() if stager else None,
+            }
+            self.ecg = []
+            payload = sse("frame", frame, self.seq)
+            self.seq += 1
+            events = []
+            if detection and len(detection.triggers) > self.events_sent:
+                events = [sse("detection", {"t": round(t, 1), "wall": wall})
+                          for t, wall in detection.triggers[self.events_sent:]]
+                self.events_sent += len(events)
+        FRAMES.inc()
+        self.server.publish(self.name, payload, events)
+
+
+class LiveStreamServer:
+    def __init__(self, port, host="0.0.0.0"):
+        self.port = port
+        self.host = host
+        self.channels = {}
+        self.loop = None
+        self.thread = None
+        self._server = None
+        self._started = threading.Event()
+
+    # --- Acquisition side (any thread) ---
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="live-stream", daemon=True)
+        self.thread.start()
+        self._started.wait()
+        return self
+
+    def attach(self, device):
+        """Publish a started acquisition.Device under its name."""
+        producer = LiveProducer(self, device)
+        self.loop.call_soon_threadsafe(self._add_channel, device.name)
+        device.subscribe("live", producer.consume, maxsize=PRODUCER_QUEUE, policy=DROP)
+        return producer
+
+    def detach(self, name):
+        self.loop.call_soon_threadsafe(self._close_channel, name)
+
+    def publish(self, name, payload, events=()):
+        self.loop.call_soon_threadsafe(self._publish, name, payload, events)
+
+    def stats(self):
+        """Per-device subscriber and frame counts (read from the loop thread)."""
+        return asyncio.run_coroutine_threadsafe(self._stats(), self.loop).result()
+
+    def format_stats(self):
+        return " | ".join(f"{s['device']}: {s['subscribers']} subscribers, {s['frames']} frames, "
+                          f"{s['dropped']} dropped" for s in self.stats()) or "no devices"
+
+    def stop(self):
+        if not self.loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.thread.join()
+
+    # --- Event loop ---
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, limit=MAX_REQUEST, backlog=1024))
+        self.port = self._server.sockets[0].getsockname()[1]  # the real one when started with port 0
+        self.loop.create_task(self._heartbeat())
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # Streams still writing to slow clients and the heartbeat
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    async def _shutdown(self):
+        channels = list(self.channels.values())
+        for name in list(self.channels):
+            self._close_channel(name)
+        self._server.close()
+        await asyncio.sleep(0.1)  # let the writers send their end events
+        for channel in channels:
+            channel.abort()
+        await asyncio.sleep(0.05)  # their writers see the reset and finish
+        self.loop.stop()
+
+    async def _stats(self):
+        return [channel.stats() for channel in self.channels.values()]
+
+    def _add_channel(self, name):
+        self.channels[name] = DeviceChannel(name)
+
+    def _close_channel(self, name):
+        channel = self.channels.pop(name, None)
+        if channel:
+            channel.close()
+
+    def _publish(self, name, payload, events):
+        channel = self.channels.get(name)
+        if channel:
+            for event in events:
+                channel.publish_event(event)
+            channel.publish_frame(payload)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_S)
+            for channel in self.channels.values():
+                channel.ping()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10.0)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        parts = request.split(b"\r\n", 1)[0].decode("latin-1").split()
+        match = PATH.match(parts[1]) if len(parts) == 3 and parts[0] == "GET" else None
+        name = unquote(match.group(1) or "") if match else None
+        if not match:
+            await self._respond(writer, "404 Not Found", {"success": False, "message": "Not found"})
+        elif not name:
+            await self._respond(writer, "200 OK", {"success": True, "devices": await self._stats()})
+        elif name not in self.channels:
+            await self._respond(writer, "404 Not Found", {"success": False, "message": "Device not live"})
+        else:
+            await self._stream(self.channels[name], writer)
+
+    @staticmethod
+    async def _respond(writer, status, body):
+        data = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                     f"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n".encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _stream(self, channel, writer):
+        CONNECTS.inc()
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER)
+        writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        sub = _Subscriber(writer)
+        channel.subscribers.add(sub)
+        try:
+            writer.write(SSE_HEADERS)
+            while not channel.closed:
+                await sub.wake.wait()
+                sub.wake.clear()
+                chunks = list(sub.events) + list(sub.frames)
+                sub.events.clear()
+                sub.frames.clear()
+                writer.writelines(chunks)
+                await writer.drain()
+            writer.write(END)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            channel.subscribers.discard(sub)
+            writer.close()
@@ -0,0 +1,168 @@
+"""
+Load test for live_stream.py: hundreds of server-sent-event subscribers per device.
+
+Runs DEVICES replayed boards (working.csv, looping, at --speed times real
+time so frames carry that many times the ECG, live detection on) with a LiveStreamServer in this process, and for each
+subscriber count opens that many connections per device from a child
+process (asyncio clients, so client work is not counted here). SLOW_FRACTION
+of them never read after the headers and have a tiny receive buffer, like a
+phone that went to sleep. Over each step it reports this process's CPU (all
+threads, in % of one core) and resident memory, the frames fast clients
+received against the frames published, and the frames dropped for slow
+clients: CPU grows with subscribers, memory stays bounded however many
+clients stall.
+
+    python load_live_stream.py [SUBSCRIBERS ...] [--devices D] [--seconds S] [--slow-fraction F]
+                                                [--speed X] [--warmup S] [--buffer B]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+
+from acquisition import AcquisitionManager
+import live_stream
+from live_stream import LiveStreamServer
+import metrics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, "working.csv")
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+
+
+# --- Client process ---
+async def _client(port, device, slow, counts, stop):
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if slow:
+        # Before connecting, so the advertised window stays small
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2048)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, ("127.0.0.1", port))
+    await loop.sock_sendall(sock, f"GET /live/{device} HTTP/1.1\r\nHost: load\r\n\r\n".encode())
+    if slow:
+        # Raw socket, never read: a StreamReader would keep pulling bytes into its own buffer
+        await loop.sock_recv(sock, 256)
+        counts["connected"] += 1
+        try:
+            await stop.wait()
+        finally:
+            sock.close()
+        return
+    reader, writer = await asyncio.open_connection(sock=sock)
+    await reader.readuntil(b"\r\n\r\n")
+    counts["connected"] += 1
+    try:
+        while not stop.is_set():
+            data = await reader.read(1 << 16)
+            if not data:
+                break
+            counts["frames"] += data.count(b"event: frame")
+    finally:
+        writer.close()
+
+
+def run_clients(port, devices, per_device, slow_fraction, conn):
+    async def main():
+        counts = {"connected": 0, "frames": 0}
+        stop = asyncio.Event()
+        n_slow = int(per_device * slow_fraction)
+        tasks = [asyncio.create_task(_client(port, device, i < n_slow, counts, stop))
+                 for device in devices for i in range(per_device)]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, conn.recv)  # "measure": reset the count
+        counts["frames"] = 0
+        await loop.run_in_executor(None, conn.recv)  # "stop"
+        conn.send((counts["connected"], counts["frames"]))
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+# --- Server side ---
+def wait_for(server, subscribers, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(s["subscribers"] == subscribers for s in server.stats()):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def totals(server):
+    stats = server.stats()
+    return sum(s["frames"] for s in stats), sum(s["dropped"] for s in stats)
+
+
+def step(server, devices, per_device, args):
+    # spawn: the clients must not inherit this process's acquisition threads and event loop
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    proc = context.Process(target=run_clients, args=(server.port, devices, per_device, args.slow_fraction, child))
+    proc.start()
+    if not wait_for(server, per_device):
+        print(f"  {per_device} subscribers per device did not all connect")
+    time.sleep(args.warmup)  # let the slow clients' buffers fill
+
+    parent.send("measure")
+    frames0, dropped0 = totals(server)
+    cpu0, t0 = time.process_time(), time.monotonic()
+    time.sleep(args.seconds)
+    cpu = (time.process_time() - cpu0) / (time.monotonic() - t0)
+    frames, dropped = totals(server)
+    parent.send("stop")
+    connected, received = parent.recv()
+    proc.join()
+    wait_for(server, 0)
+
+    published = (frames - frames0) / len(devices)
+    fast = connected - int(per_device * args.slow_fraction) * len(devices)
+    slow = connected - fast
+    print(f"{per_device:5d} per device ({connected:5d} connected, {slow:4d} slow) | server CPU {cpu:6.1%} | "
+          f"RSS {rss_mb():6.1f} MB | {published:4.0f} frames/device, fast clients got "
+          f"{received / max(fast, 1) / max(published, 1):6.1%} | "
+          f"dropped for slow clients {(dropped - dropped0) / max(slow, 1):5.1f} each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live SSE fan-out load test")
+    parser.add_argument("subscribers", nargs="*", type=int, default=[0, 100, 300, 500])
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--speed", type=float, default=4.0, help="replay speed of every device")
+    parser.add_argument("--warmup", type=float, default=10.0, help="seconds connected before measuring")
+    parser.add_argument("--buffer", type=int, default=1024,
+                        help="server send buffers per client (bytes); small, so slow clients fall behind within a step")
+    args = parser.parse_args()
+    live_stream.WRITE_BUFFER = live_stream.SEND_BUFFER = args.buffer
+
+    manager = AcquisitionManager(log_format=None, staging=False, on_message=lambda text: None)
+    server = LiveStreamServer(0).start()
+    names = []
+    for i in range(args.devices):
+        device = manager.add(f"replay:{SOURCE}?speed={args.speed:g}&loop=1&seed={i}", name=f"bed-{i}")
+        server.attach(device)
+        names.append(device.name)
+    time.sleep(2.0)
+    print(f"{args.devices} devices at {args.speed:g}x, frames every 0.25 s, {args.slow_fraction:.0%} slow clients, "
+          f"{os.cpu_count()} cores (clients share them)")
+    for per_device in args.subscribers:
+        step(server, names, per_device, args)
+    manager.stop_all()
+    server.stop()
+    print(metrics.format_summary())
+
+
+if __name__ == "__main__":
+    main()
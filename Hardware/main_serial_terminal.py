@@ -1,144 +1,35 @@
 import sys
 import serial
 import serial.tools.list_ports
-import csv
 import os
 import time
-from collections import deque
-from datetime import datetime
 
+import numpy as np
 from PyQt6.QtWidgets import *
-from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
 import pyqtgraph as pg
 
+import metrics
+from packet_decoder import NUM_CHANNELS
+from pipeline import DROP
+from ring_buffer import RingBuffer, PeakDecimator
+from filter_bank import FilterBank
+from acquisition import Device, BAUD_RATE, LOG_FORMAT, LIVE_DETECTION
+from replay import REPLAY_PREFIX
+
 # --- Configuration ---
-BAUD_RATE = 115200
-NUM_CHANNELS = 6
-PACKET_LEN = NUM_CHANNELS * 2 + 3 + 1  # 16 bytes
-SYNC1 = 0xC7
-SYNC2 = 0x7C
-END_BYTE = 0x01
-
-# --- Worker Thread for Serial Reading ---
-import random
-import string
-
-class SerialReader(QThread):
-    data_received = pyqtSignal(str)
-    packet_decoded = pyqtSignal(list)
-
-    def __init__(self, port, baud, log_csv=False):
-        super().__init__()
-        self.port = port
-        self.baud = baud
-        self.log_csv = log_csv
-        self.running = False
-        self.ser = None
-        self.csv_file = None
-        self.csv_writer = None
-        self.full_csv_file = None
-        self.full_csv_writer = None
-        self.start_time = None
-        self.csv_start_time = None
-        self.csv_index = 0
-        self.session_id = ''.join(random.choices(string.ascii_lowercase, k=6))  # e.g. "asdfjk"
-
-    def open_new_csv(self):
-        """Open new chunk CSV and keep full CSV open throughout the session."""
-        # Close previous chunk if needed
-        if self.csv_file:
-            self.csv_file.close()
-        self.csv_index += 1
-        script_dir = os.path.dirname(os.path.abspath(__file__))
+PLOT_FPS = 30  # redraw rate, independent of the sample rate
+PLOT_QUEUE_LEN = 32  # batches; older ones are dropped if the GUI falls behind
+FILTER_PLOT = True  # plot through filter_bank (baseline, bandpass, notch) instead of raw - 32768
+STATS_LOG_INTERVAL = 60  # seconds between stream health and metrics lines in the terminal
+
+PLOT_REFRESH = metrics.timer("plot_refresh")
+
+# --- Acquisition runs in acquisition.Device; the GUI only subscribes ---
+class MessageBridge(QObject):
+    """Carries device messages from acquisition threads to the GUI thread."""
+    message = pyqtSignal(str)
 
-        # --- Chunked 30s file ---
-        csv_name = f"biosignals-{self.session_id}.csv"
-        csv_path = os.path.join(script_dir, csv_name)
-        self.csv_file = open(csv_path, 'w', newline='')
-        self.csv_writer = csv.writer(self.csv_file)
-        self.csv_writer.writerow(['ElapsedTime', 'Counter'] + [f'CH{i}' for i in range(NUM_CHANNELS)])
-        self.csv_start_time = time.time()
-
-        # --- Full session file (created once) ---
-        if not self.full_csv_file:
-            full_name = f"biosignals-{self.session_id}-full.csv"
-            full_path = os.path.join(script_dir, full_name)
-            self.full_csv_file = open(full_path, 'w', newline='')
-            self.full_csv_writer = csv.writer(self.full_csv_file)
-            self.full_csv_writer.writerow(['ElapsedTime', 'Counter'] + [f'CH{i}' for i in range(NUM_CHANNELS)])
-            self.data_received.emit(f"[Logging] Started full session file: {full_name}")
-
-        self.data_received.emit(f"[Logging] Started new chunk file: {csv_name}")
-
-    def run(self):
-        try:
-            self.ser = serial.Serial(self.port, self.baud, timeout=1)
-            self.running = True
-
-            if self.log_csv:
-                self.open_new_csv()
-
-            self.start_time = time.time()
-            buffer = bytearray()
-
-            while self.running:
-                if self.ser.in_waiting:
-                    buffer.extend(self.ser.read(self.ser.in_waiting))
-
-                    # --- Rotate CSV every 30 seconds ---
-                    if self.log_csv and (time.time() - self.csv_start_time) >= 30.0:
-                        self.open_new_csv()
-
-                    while len(buffer) >= PACKET_LEN:
-                        if buffer[0] == SYNC1 and buffer[1] == SYNC2:
-                            packet = buffer[:PACKET_LEN]
-                            buffer = buffer[PACKET_LEN:]
-                            if packet[-1] == END_BYTE:
-                                counter, values = self.decode_packet(packet)
-                                text = f"{counter}: {values}"
-                                self.data_received.emit(text)
-                                self.packet_decoded.emit(values)
-                                if self.csv_writer:
-                                    elapsed = time.time() - self.start_time
-                                    row = [f"{elapsed:.3f}", counter] + values
-                                    self.csv_writer.writerow(row)         # chunk file
-                                    if self.full_csv_writer:
-                                        self.full_csv_writer.writerow(row) # full file
-                            else:
-                                buffer.pop(0)
-                        elif buffer[0] == 0x2 and buffer[1] == 0x0 and buffer[2] == 0x0:
-                            packet = buffer[:PACKET_LEN]
-                            buffer = buffer[PACKET_LEN:]
-                            if packet[-1] == 0x2:
-                                command = [chr(i) for i in packet[3:PACKET_LEN-1] if i != 0]
-                                command = ''.join(command).encode('utf-8')
-                                command = str(command, 'utf-8')
-                                self.data_received.emit(command)
-                        else:
-                            buffer.pop(0)
-        except serial.SerialException as e:
-            self.data_received.emit(f"Serial error: {e}")
-        finally:
-            # Clean up files and serial
-            if self.csv_file:
-                self.csv_file.close()
-            if self.full_csv_file:
-                self.full_csv_file.close()
-            if self.ser and self.ser.is_open:
-                self.ser.close()
-
-    def stop(self):
-        self.running = False
-
-    def decode_packet(self, packet):
-        counter = packet[2]
-        values = []
-        for i in range(NUM_CHANNELS):
-            high = packet[3 + 2 * i]
-            low = packet[4 + 2 * i]
-            val = (high << 8) | low
-            values.append(val)
-        return counter, values
 
 # --- Main GUI Window ---
 class SerialTerminal(QWidget):
@@ -153,6 +44,7 @@ class SerialTerminal(QWidget):
         # Port selection
         self.port_label = QLabel("Port:")
         self.port_box = QComboBox()
+        self.port_box.setEditable(True)  # also takes pyserial URLs and replay:<recording>?speed=N
         self.refresh_ports()
         self.refresh_button = QPushButton("Refresh")
         self.refresh_button.clicked.connect(self.refresh_ports)
@@ -165,6 +57,13 @@ class SerialTerminal(QWidget):
         top_row.addWidget(self.refresh_button)
         top_row.addWidget(self.connect_button)
 
+        # Stream health, refreshed once per second
+        self.stats_label = QLabel("Not connected")
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_stats)
+        self.stats_timer.start(1000)
+        self.last_stats_log = time.time()
+
         # Plot area
         self.plot_widget = pg.PlotWidget(title="ECG Signals")
         self.plot_widget.setYRange(0, 4096)  # assuming 12-bit ADC
@@ -179,7 +78,14 @@ class SerialTerminal(QWidget):
 
         # Data buffers
         self.buffer_len = 500  # ~4 seconds at 125Hz
-        self.data_buffers = [deque([0]*self.buffer_len, maxlen=self.buffer_len) for _ in range(NUM_CHANNELS)]
+        self.downsample = True  # min/max per pixel when the window is wider than the plot
+        self.data_buffer = RingBuffer(self.buffer_len, NUM_CHANNELS)
+        self.reset_display()
+
+        # Redraws are paced by the timer, not by incoming packets
+        self.plot_timer = QTimer(self)
+        self.plot_timer.timeout.connect(self.refresh_plot)
+        self.plot_timer.start(int(1000 / PLOT_FPS))
 
         # Terminal area
         self.output = QTextEdit()
@@ -196,73 +102,150 @@ class SerialTerminal(QWidget):
 
         # Layout setup
         layout.addLayout(top_row)
+        layout.addWidget(self.stats_label)
         layout.addWidget(self.plot_widget)
         layout.addWidget(self.output)
         layout.addLayout(bottom_row)
         self.setLayout(layout)
 
-        # Serial thread placeholder
-        self.reader_thread = None
+        # Acquisition device placeholder
+        self.device = None
+        self.plot_queue = None
+        self.plot_filter = None
+        self.messages = MessageBridge()
+        self.messages.message.connect(self.display_data)
 
     def refresh_ports(self):
         self.port_box.clear()
         ports = serial.tools.list_ports.comports()
         for port in ports:
             self.port_box.addItem(port.device)
+        # Recorded sessions can be replayed as if a board were attached (replay.py)
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(script_dir)):
+            if name.startswith("biosignals-") and name.endswith(".session"):
+                self.port_box.addItem(f"{REPLAY_PREFIX}{os.path.join(script_dir, name)}?speed=1")
 
     def toggle_connection(self):
-        if self.reader_thread and self.reader_thread.running:
+        if self.device and self.device.running:
             # Disconnect
             self.send_stop()
-            self.reader_thread.stop()
-            self.reader_thread.wait()
-            self.reader_thread = None
-            self.connect_button.setText("Connect")
+            self.disconnect_device()
             self.output.append("Disconnected.\n")
         else:
             # Connect
+            if self.device:
+                # The reader ended before refresh_stats noticed: drain and close its session first
+                self.disconnect_device()
             port = self.port_box.currentText()
             if not port:
                 self.output.append("No port selected.\n")
                 return
 
-            self.reader_thread = SerialReader(port, BAUD_RATE, log_csv=True)
-            self.reader_thread.data_received.connect(self.display_data)
-            self.reader_thread.packet_decoded.connect(self.update_plot)
-            self.reader_thread.start()
-            self.connect_button.setText("Disconnect")
             self.output.append(f"Connecting to {port}\n")
+            device = Device(port, BAUD_RATE, log_format=LOG_FORMAT, detection=LIVE_DETECTION,
+                            on_message=self.messages.message.emit)
+            try:
+                device.start()
+            except (serial.SerialException, ValueError) as e:
+                self.output.append(f"Serial error: {e}")
+                return
+            self.device = device
+            self.plot_filter = FilterBank(fs=device.fs) if FILTER_PLOT else None
+            # Slow consumers must never hold up the port: the plot drops stale batches
+            self.plot_queue = device.subscribe("plot", maxsize=PLOT_QUEUE_LEN, policy=DROP)
+            self.connect_button.setText("Disconnect")
+
+    def disconnect_device(self):
+        if self.device:
+            self.device.stop()
+        self.device = None
+        self.plot_queue = None
+        self.connect_button.setText("Connect")
+
+    def closeEvent(self, event):
+        self.disconnect_device()  # flush and close the logs
+        super().closeEvent(event)
 
     def send_command(self):
         cmd = self.input.text().strip()
         if not cmd:
             return
-        if self.reader_thread and self.reader_thread.ser:
-            self.reader_thread.ser.write((cmd + '\n').encode('utf-8'))
+        if self.device and self.device.running:
+            self.device.write((cmd + '\n').encode('utf-8'))
             self.output.append(f"> {cmd}")
             self.input.clear()
         else:
             self.output.append("Not connected.\n")
     
     def send_stop(self):
-        if self.reader_thread and self.reader_thread.ser:
-            self.reader_thread.ser.write(("STOP" + '\n').encode('utf-8'))
+        if self.device and self.device.running:
+            self.device.write(("STOP" + '\n').encode('utf-8'))
             self.output.append(f"> Disconnecting...")
     
     def send_start(self):
-        if self.reader_thread and self.reader_thread.ser:
-            self.reader_thread.ser.write(("START" + '\n').encode('utf-8'))
+        if self.device and self.device.running:
+            self.device.write(("START" + '\n').encode('utf-8'))
             self.output.append(f"> Starting...")
 
     def display_data(self, text):
         self.output.append(text)
 
-    def update_plot(self, values):
-        for i, val in enumerate(values):
-            if (True):
-                self.data_buffers[i].append(val - 32768)
-                self.plot_curves[i].setData(list(self.data_buffers[i]))
-
+    def refresh_stats(self):
+        if not self.device:
+            return
+        if not self.device.running:
+            # The reader ended on its own (serial error, replay finished)
+            self.disconnect_device()
+            return
+        line = self.device.pipeline.format_stream()
+        self.stats_label.setText(line)
+        if time.time() - self.last_stats_log >= STATS_LOG_INTERVAL:
+            self.output.append(line)
+            self.output.append(metrics.format_summary())
+            self.last_stats_log = time.time()
+
+    def display_step(self):
+        if not self.downsample:
+            return 1
+        return max(1, self.buffer_len // max(1, self.plot_widget.width()))
+
+    def reset_display(self):
+        """Rebuild the (possibly decimated) display buffer from the raw history."""
+        step = self.display_step()
+        points = self.buffer_len if step == 1 else 2 * (self.buffer_len // step)
+        self.decimator = PeakDecimator(step, NUM_CHANNELS)
+        self.display_buffer = RingBuffer(points, NUM_CHANNELS)
+        self.display_buffer.extend(self.decimator.process(self.data_buffer.latest()))
+        self.display_x = np.arange(points) if step == 1 else np.arange(points) // 2 * step
+        self.plot_dirty = True
+
+    def update_plot(self, counters, values):
+        if self.plot_filter:
+            samples = self.plot_filter.process(values).astype(np.float32)
+        else:
+            samples = values.astype(np.float32) - 32768
+        self.data_buffer.extend(samples)
+        self.display_buffer.extend(self.decimator.process(samples))
+        self.plot_dirty = True
+
+    def refresh_plot(self):
+        t0 = time.perf_counter()
+        if self.plot_queue:
+            batches = self.plot_queue.drain()
+            for batch in batches:
+                self.update_plot(batch.counters, batch.values)
+            if batches:
+                self.output.append(f"{batch.counters[-1]}: {batch.values[-1].tolist()}")
+        if self.display_step() != self.decimator.step:
+            self.reset_display()
+        if not self.plot_dirty:
+            return
+        window = self.display_buffer.latest()
+        for i, curve in enumerate(self.plot_curves):
+            curve.setData(self.display_x, window[:, i], skipFiniteCheck=True)
+        self.plot_dirty = False
+        PLOT_REFRESH.observe(time.perf_counter() - t0)
 
 def main():
     app = QApplication(sys.argv)
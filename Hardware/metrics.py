@@ -0,0 +1,314 @@
+"""
+Process-wide timers and counters for the acquisition and analysis stages.
+
+    DECODE = metrics.timer("decode")          # look up once, at import
+    with DECODE.time():
+        ...
+    metrics.counter("packets").inc(len(counters))
+
+    @metrics.timed("csv_to_edf")              # whole calls of a function
+
+    metrics.render_prometheus()   # text exposition format (backend GET /metrics, acquisitiond --metrics-port)
+    metrics.format_summary()      # one line for the terminal
+
+A timer keeps a LatencyHistogram (fixed log-spaced bins, constant memory) and
+is exported as a Prometheus summary with quantiles read from the bins; a
+counter is one integer. Both take labels, e.g. timer("api_request",
+endpoint="api.get_items"). Worker processes hand their numbers to the parent
+with snapshot(reset=True) and merge().
+
+With BIOSIGNALS_METRICS=0 in the environment (or disable()) time() returns a
+shared no-op context manager and observe()/inc() return before taking a lock,
+so instrumented code pays one attribute lookup and a call.
+"""
+
+import bisect
+import functools
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("BIOSIGNALS_METRICS", "1") != "0"
+PREFIX = "biosignals"
+QUANTILES = (0.5, 0.9, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyHistogram:
+    """Log-spaced fixed bins from 10 us to 100 s; recording is O(log bins), memory constant."""
+
+    def __init__(self, low=1e-5, high=100.0, bins_per_decade=20):
+        decades = math.log10(high / low)
+        self.edges = [low * 10 ** (i / bins_per_decade) for i in range(int(decades * bins_per_decade) + 1)]
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_right(self.edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, counts, count, total, maximum):
+        """Add another histogram's state (same bins)."""
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.count += count
+        self.total += total
+        self.max = max(self.max, maximum)
+
+    def percentile(self, q):
+        """Upper bin edge holding the q-th percentile (q in 0..100)."""
+        if not self.count:
+            return math.nan
+        target = q / 100.0 * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                return min(self.edges[i], self.max) if i < len(self.edges) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else math.nan,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class _NullTiming:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMING = _NullTiming()
+
+
+class _Timing:
+    __slots__ = ('timer', 'start')
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Timer:
+    kind = 'summary'
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.hist = LatencyHistogram()
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        if not ENABLED:
+            return
+        with self.lock:
+            self.hist.record(seconds)
+
+    def time(self):
+        """Context manager timing its block."""
+        return _Timing(self) if ENABLED else _NULL_TIMING
+
+    def state(self):
+        with self.lock:
+            return list(self.hist.counts), self.hist.count, self.hist.total, self.hist.max
+
+    def reset(self):
+        with self.lock:
+            self.hist = LatencyHistogram()
+
+    def merge(self, state):
+        with self.lock:
+            self.hist.merge(*state)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        if not ENABLED:
+            return
+        with self.lock:
+            self.value += n
+
+    def state(self):
+        return self.value
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+    def merge(self, state):
+        with self.lock:
+            self.value += state
+
+
+_registry = {}  # (kind, name, sorted label items) -> Timer / Counter
+_registry_lock = threading.Lock()
+
+
+def _get(cls, name, labels):
+    key = (cls.kind, name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    metric = _registry.get(key)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.setdefault(key, cls(name, key[2]))
+    return metric
+
+
+def timer(name, **labels):
+    return _get(Timer, name, labels)
+
+
+def counter(name, **labels):
+    return _get(Counter, name, labels)
+
+
+def timed(name, **labels):
+    """Decorator: time every call of the function with timer(name, **labels)."""
+    def decorate(fn):
+        t = timer(name, **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with t.time():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+def disable():
+    enable(False)
+
+
+def all_metrics():
+    with _registry_lock:
+        return list(_registry.values())
+
+
+# --- Moving numbers between processes ---
+def snapshot(reset=False):
+    """Picklable state of every metric; reset=True starts them from zero (hand-off from a worker)."""
+    items = []
+    for metric in all_metrics():
+        items.append((metric.kind, metric.name, dict(metric.labels), metric.state()))
+        if reset:
+            metric.reset()
+    return items
+
+
+def merge(items):
+    """Add a snapshot() from another process into this one's metrics."""
+    for kind, name, labels, state in items or ():
+        (timer if kind == Timer.kind else counter)(name, **labels).merge(state)
+
+
+# --- Export ---
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(name, labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return name
+    return name + '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _number(value):
+    return "NaN" if math.isnan(value) else f"{value:.6g}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    by_name = {}
+    for metric in all_metrics():
+        by_name.setdefault((metric.kind, metric.name), []).append(metric)
+    for (kind, name), group in sorted(by_name.items()):
+        if kind == Timer.kind:
+            full = f"{PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {full} summary")
+            for metric in group:
+                with metric.lock:
+                    hist = metric.hist
+                    quantiles = [(q, hist.percentile(q * 100)) for q in QUANTILES]
+                    total, count = hist.total, hist.count
+                for q, value in quantiles:
+                    lines.append(f"{_series(full, metric.labels, [('quantile', f'{q:g}')])} {_number(value)}")
+                lines.append(f"{_series(full + '_sum', metric.labels)} {_number(total)}")
+                lines.append(f"{_series(full + '_count', metric.labels)} {count}")
+        else:
+            full = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {full} counter")
+            for metric in group:
+                lines.append(f"{_series(full, metric.labels)} {metric.value}")
+    return "\n".join(lines) + "\n"
+
+
+def format_summary():
+    """One line: every timer (labels merged) as count and p50/p99, then the counters."""
+    timers, counters = {}, {}
+    for metric in all_metrics():
+        if metric.kind == Timer.kind:
+            merged = timers.setdefault(metric.name, LatencyHistogram())
+            merged.merge(*metric.state())
+        else:
+            counters[metric.name] = counters.get(metric.name, 0) + metric.value
+    parts = [f"{name} n={h.count} p50={h.percentile(50) * 1e3:.2f}ms p99={h.percentile(99) * 1e3:.2f}ms"
+             for name, h in sorted(timers.items()) if h.count]
+    parts += [f"{name}={value}" for name, value in sorted(counters.items()) if value]
+    return "[Metrics] " + (" | ".join(parts) if parts else "nothing recorded")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host=''):
+    """GET /metrics on `port` from a daemon thread (for processes without the Flask app); returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
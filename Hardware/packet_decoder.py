@@ -0,0 +1,136 @@
+"""
+Bulk decoder for the Chords 16-byte packet stream.
+
+Packet layout (see chords-lsl.ino):
+    [SYNC1, SYNC2, counter, CH0_hi, CH0_lo, ... CH5_hi, CH5_lo, END_BYTE]
+Command replies from the board are framed as [0x02, 0x00, 0x00, ascii..., 0x02].
+"""
+
+import numpy as np
+
+NUM_CHANNELS = 6
+SAMPLE_RATE = 125  # Hz, SAMP_RATE in chords-lsl.ino
+PACKET_LEN = NUM_CHANNELS * 2 + 3 + 1  # 16 bytes
+SYNC1 = 0xC7
+SYNC2 = 0x7C
+END_BYTE = 0x01
+COMMAND_BYTE = 0x02
+
+# Compact the internal buffer once this many consumed bytes sit in front of the read offset
+COMPACT_THRESHOLD = 1 << 16
+
+_FRAME = np.arange(PACKET_LEN)
+
+
+class PacketDecoder:
+    """Incremental decoder: feed() raw serial bytes, get whole batches back."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0  # first byte not yet consumed
+        self.discarded = 0   # bytes skipped because no frame started there
+        self.resyncs = 0     # runs of skipped bytes, i.e. times the stream lost frame alignment
+        self._skipping = False  # the last feed() ended inside such a run
+
+    def feed(self, data):
+        """
+        Append raw bytes and decode every complete frame in one pass.
+        Returns (counters, values, commands):
+            counters -- uint8 array (n,)
+            values   -- uint16 array (n, NUM_CHANNELS)
+            commands -- list of command reply strings
+        """
+        self.buffer.extend(data)
+        buf = np.frombuffer(self.buffer, dtype=np.uint8)
+        n = len(buf)
+        last = n - PACKET_LEN  # last position with a full frame behind it
+        if last < self.offset:
+            del buf
+            return empty_batch()
+
+        # --- Candidate frame starts, found with one vectorized scan ---
+        head = buf[self.offset:last + 1]
+        second = buf[self.offset + 1:last + 2]
+        tail = buf[self.offset + PACKET_LEN - 1:n]
+        is_data = (head == SYNC1) & (second == SYNC2) & (tail == END_BYTE)
+        is_cmd = (head == COMMAND_BYTE) & (second == 0) & (buf[self.offset + 2:last + 3] == 0)
+        starts = np.flatnonzero(is_data | is_cmd) + self.offset
+
+        # Frames must not overlap: take them greedily in stream order, exactly like a
+        # byte-by-byte resync would. Overlaps only happen when payload bytes mimic a
+        # header, so the common case never leaves NumPy.
+        if len(starts) > 1 and np.any(np.diff(starts) < PACKET_LEN):
+            starts = _greedy_frames(starts)
+
+        if len(starts):
+            consumed = int(starts[-1]) + PACKET_LEN
+        else:
+            consumed = self.offset
+        # Bytes that could never start a frame are dropped, the tail waits for more data
+        new_offset = max(consumed, last + 1)
+        self._count_skipped(starts, new_offset)
+        self.offset = new_offset
+
+        frames = buf[starts[:, None] + _FRAME]
+        data_rows = frames[:, 0] == SYNC1
+        packets = frames[data_rows]
+        counters = packets[:, 2].copy()
+        values = (packets[:, 3:PACKET_LEN - 1:2].astype(np.uint16) << 8) | packets[:, 4:PACKET_LEN - 1:2]
+
+        commands = []
+        for frame in frames[~data_rows]:
+            if frame[-1] == COMMAND_BYTE:
+                commands.append(bytes(c for c in frame[3:PACKET_LEN - 1] if c != 0).decode('utf-8', 'replace'))
+
+        del buf, head, second, tail
+        if self.offset >= COMPACT_THRESHOLD:
+            del self.buffer[:self.offset]
+            self.offset = 0
+        return counters, values, commands
+
+    def _count_skipped(self, starts, new_offset):
+        # Gaps in front of every accepted frame and after the last one
+        frame_ends = np.concatenate([[self.offset], starts + PACKET_LEN])
+        skipped = np.concatenate([starts, [new_offset]]) - frame_ends
+        runs = np.count_nonzero(skipped)
+        if runs and self._skipping and skipped[0]:
+            runs -= 1  # continues the run the previous feed() ended in
+        self.discarded += int(skipped.sum())
+        self.resyncs += int(runs)
+        self._skipping = bool(skipped[-1])
+
+    def pending(self):
+        """Number of buffered bytes not yet consumed."""
+        return len(self.buffer) - self.offset
+
+
+def empty_batch():
+    return np.empty(0, np.uint8), np.empty((0, NUM_CHANNELS), np.uint16), []
+
+
+def _greedy_frames(starts):
+    keep = []
+    next_free = -1
+    for s in starts.tolist():
+        if s >= next_free:
+            keep.append(s)
+            next_free = s + PACKET_LEN
+    return np.asarray(keep, dtype=starts.dtype)
+
+
+def encode_packets(counters, values):
+    """Inverse of PacketDecoder: build the raw byte stream for (counters, values)."""
+    values = np.asarray(values, dtype=np.uint16)
+    frames = np.empty((len(values), PACKET_LEN), dtype=np.uint8)
+    frames[:, 0] = SYNC1
+    frames[:, 1] = SYNC2
+    frames[:, 2] = np.asarray(counters, dtype=np.uint8)
+    frames[:, 3:PACKET_LEN - 1] = values.astype('>u2').view(np.uint8).reshape(len(values), -1)
+    frames[:, -1] = END_BYTE
+    return frames.tobytes()
+
+
+def encode_command(text):
+    """Frame a command reply the way the board does."""
+    payload = text.encode('utf-8')[:PACKET_LEN - 4].ljust(PACKET_LEN - 4, b'\x00')
+    return bytes([COMMAND_BYTE, 0, 0]) + payload + bytes([COMMAND_BYTE])
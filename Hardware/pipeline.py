@@ -0,0 +1,293 @@
+"""
+Multi-stage acquisition pipeline.
+
+    serial --(reader)--> raw queue --(decoder)--> Batch --> consumer queues --> callbacks
+
+The reader only blocks on serial reads, so nothing downstream can delay the
+UART. Every consumer gets its own bounded queue with a policy:
+    'drop'  -- when full, the oldest queued batch is discarded (plots, live analysis)
+    'block' -- the decoder waits for room (loggers that must not lose data)
+A blocking consumer can only stall the decoder; the reader keeps draining the
+port into the raw queue meanwhile. Consumers without a callback are polled
+with drain(), e.g. from a GUI timer. A callback consumer runs on its own
+thread, or, given an executor, as short drain tasks on a pool shared with
+other pipelines (still one batch at a time and in order per consumer).
+
+The decoder stage also runs a StreamMonitor (stream_monitor.py): every Batch
+carries the running sample index of its first packet (lost packets counted)
+and one reconstructed timestamp per sample, and stats() reports loss,
+resyncs, discarded bytes and backlog. Decoding time and packet counts also
+go to the process-wide metrics (metrics.py).
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+from packet_decoder import PacketDecoder, SAMPLE_RATE
+from stream_monitor import StreamMonitor
+
+# received: host time.time() when the bytes of this batch came off the port
+# index:    running sample index of the first packet, lost packets included
+# times:    per-sample host-clock timestamps rebuilt from the sample rate (SampleClock)
+Batch = namedtuple('Batch', ['counters', 'values', 'commands', 'received', 'index', 'times'],
+                   defaults=(None, None))
+
+DROP = 'drop'
+BLOCK = 'block'
+POOL_BATCHES = 16  # batches one pool task handles before yielding the worker to other consumers
+
+DECODE = metrics.timer("decode")
+PACKETS = metrics.counter("packets")
+
+
+class Consumer:
+    def __init__(self, name, callback=None, maxsize=64, policy=DROP, executor=None):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.name = name
+        self.callback = callback
+        self.policy = policy
+        self.queue = queue.Queue(maxsize)
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.on_error = None
+        self.thread = None
+        self.executor = executor if callback else None
+        self.lock = threading.Lock()
+        self.scheduled = False    # a pool task is queued or running for this consumer
+        self.idle = threading.Event()
+        self.idle.set()
+        if callback and not executor:
+            self.thread = threading.Thread(target=self._run, name=f'consumer-{name}', daemon=True)
+            self.thread.start()
+
+    def offer(self, batch):
+        """Called from the decoder thread."""
+        if self.policy == BLOCK:
+            self.queue.put(batch)
+        else:
+            try:
+                self.queue.put_nowait(batch)
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+                self.queue.put_nowait(batch)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        if self.executor:
+            with self.lock:
+                if self.scheduled:
+                    return
+                self.scheduled = True
+                self.idle.clear()
+            self.executor.submit(self._run_pooled)
+
+    def drain(self):
+        """Return every queued batch (for consumers without a callback)."""
+        batches = []
+        while True:
+            try:
+                batches.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.delivered += len(batches)
+        return batches
+
+    def close(self):
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+        elif self.executor:
+            self.idle.wait()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'policy': self.policy,
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            self._handle(batch)
+
+    def _run_pooled(self):
+        for _ in range(POOL_BATCHES):
+            try:
+                batch = self.queue.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    # offer() may have queued a batch after the failed get; it saw scheduled=True
+                    if self.queue.empty():
+                        self.scheduled = False
+                        self.idle.set()
+                        return
+                continue
+            self._handle(batch)
+        self.executor.submit(self._run_pooled)  # more queued: go to the back of the pool's queue
+
+    def _handle(self, batch):
+        try:
+            self.callback(batch)
+        except Exception as e:
+            self.errors += 1
+            if self.on_error:
+                self.on_error(f"[{self.name}] {type(e).__name__}: {e}")
+        self.delivered += 1
+
+
+class AcquisitionPipeline:
+    """
+    Owns the reader and decoder stages for one open transport (anything with
+    serial.Serial's read()/in_waiting, opened with a read timeout).
+    """
+
+    def __init__(self, transport, on_message=print, fs=SAMPLE_RATE, read_interval=0.0):
+        self.transport = transport
+        self.on_message = on_message
+        self.read_interval = read_interval
+        self.decoder = PacketDecoder()
+        self.monitor = StreamMonitor(fs)
+        self.consumers = []
+        self.raw = queue.Queue()
+        self.running = False
+        self.start_time = None
+        self.reader_thread = None
+        self.decoder_thread = None
+        self.bytes_read = 0
+        self.packets = 0
+        self.batches = 0
+        self.max_backlog = 0
+
+    def subscribe(self, name, callback=None, maxsize=64, policy=DROP, executor=None):
+        consumer = Consumer(name, callback, maxsize, policy, executor)
+        consumer.on_error = self.on_message
+        # Replace rather than mutate so the decoder thread can iterate without a lock
+        self.consumers = self.consumers + [consumer]
+        return consumer
+
+    def unsubscribe(self, consumer):
+        self.consumers = [c for c in self.consumers if c is not consumer]
+        consumer.close()
+
+    def start(self, reader=True):
+        """Start the decoder; with reader=False the caller runs read_loop() on its own thread."""
+        self.running = True
+        self.start_time = time.time()
+        self.decoder_thread = threading.Thread(target=self._decode_loop, name='decoder', daemon=True)
+        self.decoder_thread.start()
+        if reader:
+            self.reader_thread = threading.Thread(target=self.read_loop, name='reader', daemon=True)
+            self.reader_thread.start()
+
+    def stop(self):
+        """Ask the reader to finish; it returns within the transport's read timeout."""
+        self.running = False
+
+    def join(self):
+        """Wait for the reader, decode what is left, then flush and close every consumer."""
+        if self.reader_thread:
+            self.reader_thread.join()
+        self.raw.put(None)
+        if self.decoder_thread:
+            self.decoder_thread.join()
+        for consumer in self.consumers:
+            consumer.close()
+
+    def read_loop(self):
+        try:
+            while self.running:
+                # Blocks until at least one byte arrives or the read timeout expires
+                data = self.transport.read(max(1, self.transport.in_waiting))
+                if data:
+                    self.raw.put((time.time(), data))
+                    if self.read_interval:
+                        # Let bytes collect in the driver buffer: the per-batch cost of every stage
+                        # is then paid once per interval instead of once per USB transfer
+                        time.sleep(self.read_interval)
+        except EOFError as e:  # replay.ReplayTransport at the end of a recording
+            self.on_message(str(e))
+        except Exception as e:
+            self.on_message(f"Serial error: {e}")
+        finally:
+            self.running = False
+
+    def _decode_loop(self):
+        while True:
+            item = self.raw.get()
+            if item is None:
+                break
+            received, data = item
+            # Decode a backlog in one go instead of read by read
+            backlog = self.raw.qsize()
+            self.max_backlog = max(self.max_backlog, backlog)
+            chunks = [data]
+            stop = False
+            for _ in range(backlog):
+                item = self.raw.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                received, data = item
+                chunks.append(data)
+            self._decode(b''.join(chunks), received)
+            if stop:
+                break
+
+    def _decode(self, data, received):
+        self.bytes_read += len(data)
+        with DECODE.time():
+            counters, values, commands = self.decoder.feed(data)
+            if len(counters):
+                index, times = self.monitor.update(counters, received)
+        for command in commands:
+            self.on_message(command)
+        if not len(counters):
+            return
+        self.packets += len(counters)
+        self.batches += 1
+        PACKETS.inc(len(counters))
+        batch = Batch(counters, values, commands, received, index, times)
+        for consumer in self.consumers:
+            consumer.offer(batch)
+
+    def stats(self):
+        return {
+            'bytes_read': self.bytes_read,
+            'packets': self.packets,
+            'batches': self.batches,
+            'raw_backlog': self.raw.qsize(),
+            'max_raw_backlog': self.max_backlog,
+            'stream': self.monitor.stats(self.decoder, self.backlog_bytes()),
+            'consumers': [c.stats() for c in self.consumers],
+        }
+
+    def backlog_bytes(self):
+        """Bytes read but not yet decoded: queued raw reads plus the decoder's partial frame."""
+        with self.raw.mutex:
+            queued = sum(len(item[1]) for item in self.raw.queue if item)
+        return queued + self.decoder.pending()
+
+    def format_stream(self):
+        return f"[Stream] {self.monitor.format_stats(self.decoder, self.backlog_bytes())}"
+
+    def format_stats(self):
+        consumers = ', '.join(
+            f"{c['name']}: depth {c['depth']}/{c['max_depth']} dropped {c['dropped']}"
+            for c in (c.stats() for c in self.consumers)
+        )
+        return f"[Pipeline] {self.packets} packets in {self.batches} batches, backlog {self.raw.qsize()} | {consumers}"
@@ -0,0 +1,201 @@
+"""
+Random access to recorded sessions (session_format.py) without loading them.
+
+    rec = Recording("biosignals-abcdef.session")
+    elapsed, ecg = rec.window(3600, 3630, channels=0)       # views into the memmaps
+    elapsed, data = rec.epoch(120)                          # 30 s epoch, all channels
+    t, lo, hi = rec.overview(0, rec.duration, 2000, channels=0)
+
+Index: one searchsorted over the (non-decreasing) elapsed column gives the
+first sample of every whole second, so a time -> sample lookup is a table
+read plus a search inside one second, and epochs are every EPOCH_S-th entry.
+
+Overviews: a min/max pyramid per channel, OVERVIEW_BASE samples per bucket at
+level 0 and OVERVIEW_FACTOR times coarser per level. It is built in one
+blocked pass the first time it is needed, saved under <session>/overview/ and
+memory-mapped afterwards, so drawing any zoom level of a night reads at most
+a few thousand buckets regardless of its length.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from session_format import SessionReader
+
+EPOCH_S = 30
+OVERVIEW_DIR = 'overview'
+OVERVIEW_BASE = 64        # samples per level-0 bucket (~0.5 s at 125 Hz)
+OVERVIEW_FACTOR = 8       # buckets merged per level
+OVERVIEW_MIN_BUCKETS = 64  # stop adding levels below this many buckets
+BUILD_BLOCK = OVERVIEW_BASE * 16384  # samples per pass of the level-0 build
+
+
+class Recording:
+    def __init__(self, path, cache=True):
+        self.path = path
+        self.reader = SessionReader(path)
+        self.fs = self.reader.sample_rate
+        self.elapsed = self.reader.elapsed
+        self.channels = self.reader.channels
+        self.cache = cache
+        self._seconds = None
+        self._levels = None
+
+    def __len__(self):
+        return len(self.reader)
+
+    @property
+    def num_channels(self):
+        return self.channels.shape[1]
+
+    @property
+    def start(self):
+        return float(self.elapsed[0]) if len(self) else 0.0
+
+    @property
+    def duration(self):
+        return float(self.elapsed[-1]) - self.start if len(self) else 0.0
+
+    # --- Time index ---
+    @property
+    def seconds(self):
+        """seconds[s] = first sample at or after start + s."""
+        if self._seconds is None:
+            marks = self.start + np.arange(int(np.ceil(self.duration)) + 2)
+            self._seconds = np.searchsorted(self.elapsed, marks, side='left')
+        return self._seconds
+
+    def sample_at(self, t):
+        """First sample whose elapsed time (relative to start) is >= t."""
+        if t <= 0:
+            return 0
+        whole = int(t)
+        if whole + 1 >= len(self.seconds):
+            return len(self)
+        lo, hi = self.seconds[whole], self.seconds[whole + 1]
+        return int(lo + np.searchsorted(self.elapsed[lo:hi], self.start + t, side='left'))
+
+    def time_at(self, index):
+        return float(self.elapsed[index]) - self.start
+
+    @property
+    def num_epochs(self):
+        return int(np.ceil(self.duration / EPOCH_S)) if len(self) else 0
+
+    def epoch_bounds(self, k):
+        """(start, stop) samples of 30 s epoch k, aligned to sleepecg's sleep_stage_duration=30."""
+        return self.sample_at(k * EPOCH_S), self.sample_at((k + 1) * EPOCH_S)
+
+    # --- Data access ---
+    def window(self, t0, t1, channels=None):
+        """(elapsed, values) between t0 and t1 s; views unless `channels` is an uneven list."""
+        return self.samples(self.sample_at(t0), self.sample_at(t1), channels)
+
+    def epoch(self, k, channels=None):
+        return self.samples(*self.epoch_bounds(k), channels)
+
+    def samples(self, start, stop, channels=None):
+        return self.elapsed[start:stop], self.channels[start:stop, _channel_index(channels)]
+
+    # --- Overviews ---
+    def overview(self, t0, t1, max_points, channels=None):
+        """
+        (times, mins, maxs) for [t0, t1) with at most ~max_points rows, from the
+        finest pyramid level that fits; raw samples (mins == maxs) when they fit.
+        """
+        start, stop = self.sample_at(t0), self.sample_at(t1)
+        index = _channel_index(channels)
+        if stop - start <= max_points:
+            elapsed, values = self.samples(start, stop, channels)
+            return elapsed - self.start, values, values
+        levels = self.levels()
+        for level, (mins, maxs) in enumerate(levels):
+            size = OVERVIEW_BASE * OVERVIEW_FACTOR ** level
+            first, last = start // size, -(-stop // size)
+            if last - first <= max_points or level == len(levels) - 1:
+                last = min(last, len(mins))
+                times = self.elapsed[np.minimum(np.arange(first, last) * size, len(self) - 1)] - self.start
+                return times, mins[first:last, index], maxs[first:last, index]
+
+    def levels(self):
+        """[(mins, maxs), ...] per pyramid level, each (buckets, channels) uint16."""
+        if self._levels is None:
+            self._levels = self._load_levels() if self.cache else None
+            if self._levels is None:
+                self._levels = self._build_levels()
+                if self.cache:
+                    self._save_levels(self._levels)
+        return self._levels
+
+    def _build_levels(self):
+        n = len(self)
+        buckets = -(-n // OVERVIEW_BASE)
+        mins = np.empty((buckets, self.num_channels), dtype=self.channels.dtype)
+        maxs = np.empty_like(mins)
+        for start in range(0, n, BUILD_BLOCK):
+            block = self.channels[start:start + BUILD_BLOCK]
+            b0 = start // OVERVIEW_BASE
+            whole = len(block) // OVERVIEW_BASE * OVERVIEW_BASE
+            shaped = block[:whole].reshape(-1, OVERVIEW_BASE, self.num_channels)
+            mins[b0:b0 + len(shaped)] = shaped.min(axis=1)
+            maxs[b0:b0 + len(shaped)] = shaped.max(axis=1)
+            if whole < len(block):  # final partial bucket
+                mins[-1] = block[whole:].min(axis=0)
+                maxs[-1] = block[whole:].max(axis=0)
+        levels = [(mins, maxs)]
+        while len(levels[-1][0]) > OVERVIEW_MIN_BUCKETS:
+            mins, maxs = levels[-1]
+            levels.append((_reduce(mins, np.minimum), _reduce(maxs, np.maximum)))
+        return levels
+
+    def _overview_path(self, name):
+        return os.path.join(self.path, OVERVIEW_DIR, name)
+
+    def _load_levels(self):
+        try:
+            with open(self._overview_path('overview.json')) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if info.get('rows') != len(self) or info.get('base') != OVERVIEW_BASE or info.get('factor') != OVERVIEW_FACTOR:
+            return None  # the session grew or the layout changed
+        return [(np.load(self._overview_path(f'min-{i}.npy'), mmap_mode='r'),
+                 np.load(self._overview_path(f'max-{i}.npy'), mmap_mode='r'))
+                for i in range(info['levels'])]
+
+    def _save_levels(self, levels):
+        try:
+            os.makedirs(os.path.join(self.path, OVERVIEW_DIR), exist_ok=True)
+            for i, (mins, maxs) in enumerate(levels):
+                np.save(self._overview_path(f'min-{i}.npy'), mins)
+                np.save(self._overview_path(f'max-{i}.npy'), maxs)
+            # Written last: a half-written cache is never picked up
+            with open(self._overview_path('overview.json'), 'w') as f:
+                json.dump({'rows': len(self), 'base': OVERVIEW_BASE, 'factor': OVERVIEW_FACTOR,
+                           'levels': len(levels)}, f)
+        except OSError:
+            pass  # read-only session: keep the overview in memory only
+
+
+def _reduce(values, op):
+    whole = len(values) // OVERVIEW_FACTOR * OVERVIEW_FACTOR
+    reduced = op.reduce(values[:whole].reshape(-1, OVERVIEW_FACTOR, values.shape[1]), axis=1)
+    if whole < len(values):
+        reduced = np.concatenate([reduced, op.reduce(values[whole:], axis=0, keepdims=True)])
+    return reduced
+
+
+def _channel_index(channels):
+    """Column index that keeps numpy slicing a view where possible."""
+    if channels is None:
+        return slice(None)
+    if isinstance(channels, (int, np.integer, slice)):
+        return channels
+    channels = list(channels)
+    if len(channels) > 1:
+        step = channels[1] - channels[0]
+        if step > 0 and channels == list(range(channels[0], channels[-1] + 1, step)):
+            return slice(channels[0], channels[-1] + 1, step)
+    return channels
@@ -0,0 +1,224 @@
+"""
+Replay recorded sessions as a live board.
+
+A recording (biosignals-*.csv or a binary .session directory) is re-encoded
+into the board's 16-byte packet stream and delivered at the recorded sample
+rate times `speed` (speed=None: as fast as the reader takes it), optionally
+with corrupted and dropped bytes. Two transports:
+
+    ReplayTransport  -- in-memory, serial.Serial's read()/in_waiting/write()
+    PtyReplay        -- writes into a pseudo-terminal; open .port with pyserial
+
+open_transport() is what SerialReader uses to open its port, so any of
+    COM3 / /dev/ttyUSB0             a real board
+    loop://, socket://host:port     pyserial URL handlers
+    replay:biosignals-abcdef.session?speed=10&corrupt=1e-4&drop=1e-4&loop=1
+    replay:working.csv?speed=max
+can be typed into the port box.
+"""
+
+import os
+import threading
+import time
+from urllib.parse import parse_qsl
+
+import numpy as np
+import serial
+
+from packet_decoder import encode_packets, NUM_CHANNELS, SAMPLE_RATE
+from session_format import SessionReader
+
+REPLAY_PREFIX = 'replay:'
+WRITE_INTERVAL = 0.008   # s between deliveries at a finite speed, like the USB-serial bridge
+MAX_CHUNK = 4096         # packets encoded per delivery at max speed
+MAX_BUFFERED = 1 << 20   # bytes the in-memory transport holds before the producer waits
+
+
+# --- Sources ---
+def load_source(path):
+    """(counters uint8, values uint16 (n, NUM_CHANNELS), sample rate) of a recording."""
+    path = path.rstrip(os.sep)
+    if os.path.isdir(path):
+        reader = SessionReader(path)
+        return reader.counter, reader.channels, reader.sample_rate
+    data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=range(2 + NUM_CHANNELS), ndmin=2)
+    elapsed = data[:, 0]
+    # ElapsedTime is stamped per received batch; the spread over a long file still gives the rate
+    fs = SAMPLE_RATE
+    if len(elapsed) > 1 and elapsed[-1] - elapsed[0] > 10.0:
+        fs = round((len(elapsed) - 1) / (elapsed[-1] - elapsed[0]))
+    return data[:, 1].astype(np.int64).astype(np.uint8), data[:, 2:].astype(np.uint16), fs
+
+
+def impair(stream, rng, corrupt=0.0, drop=0.0):
+    """Overwrite a fraction `corrupt` of the bytes with random values and delete a fraction `drop`."""
+    if not corrupt and not drop:
+        return stream
+    buf = np.frombuffer(stream, dtype=np.uint8).copy()
+    if corrupt:
+        hit = np.flatnonzero(rng.random(len(buf)) < corrupt)
+        buf[hit] = rng.integers(0, 256, len(hit), dtype=np.uint8)
+    if drop:
+        buf = buf[rng.random(len(buf)) >= drop]
+    return buf.tobytes()
+
+
+def replay_chunks(counters, values, fs=SAMPLE_RATE, speed=1.0, corrupt=0.0, drop=0.0,
+                  loop=False, seed=0, stop=None):
+    """
+    Yield the encoded stream in deliveries paced to fs * speed packets/s
+    (unpaced for speed=None). `stop` is an optional threading.Event.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(counters)
+    rate = fs * speed if speed else None
+    t0 = time.monotonic()
+    sent = 0  # packets delivered, counting every loop
+    while n and not (stop and stop.is_set()):
+        if rate:
+            due = int((time.monotonic() - t0) * rate)
+            if due <= sent:
+                time.sleep(WRITE_INTERVAL)
+                continue
+            count = min(due - sent, n - sent % n)
+        else:
+            count = min(MAX_CHUNK, n - sent % n)
+        start = sent % n
+        chunk = encode_packets(counters[start:start + count], values[start:start + count])
+        yield impair(chunk, rng, corrupt, drop)
+        sent += count
+        if sent >= n and not loop:
+            break
+
+
+# --- Transports ---
+class ReplayTransport:
+    """
+    In-memory stand-in for serial.Serial fed by a replay thread. Once a replay
+    without loop has been read to the end, read() raises EOFError.
+    """
+
+    def __init__(self, source, speed=1.0, corrupt=0.0, drop=0.0, loop=False, seed=0, timeout=1.0):
+        counters, values, fs = load_source(source) if isinstance(source, str) else source
+        self.timeout = timeout
+        self.is_open = True
+        self.written = []        # bytes the host sent (commands, VIBRATE)
+        self.bytes_sent = 0
+        self.packets = len(counters)
+        self.finished = threading.Event()
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._chunks = replay_chunks(counters, values, fs, speed, corrupt, drop, loop, seed, self._stop)
+        self._thread = threading.Thread(target=self._produce, name='replay', daemon=True)
+        self._thread.start()
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + (self.timeout if self.timeout is not None else 1e9)
+        with self._cond:
+            while not self._buffer and self.is_open and not self.finished.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._cond.notify_all()
+        if not data and self.finished.is_set() and self.is_open:
+            # A board would keep the port open; a finished replay has nothing more to send
+            raise EOFError("Replay finished")
+        return data
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _produce(self):
+        try:
+            for chunk in self._chunks:
+                with self._cond:
+                    while len(self._buffer) >= MAX_BUFFERED and not self._stop.is_set():
+                        self._cond.wait(0.1)
+                    self._buffer.extend(chunk)
+                    self.bytes_sent += len(chunk)
+                    self._cond.notify_all()
+        finally:
+            self.finished.set()
+            with self._cond:
+                self._cond.notify_all()
+
+
+class PtyReplay:
+    """Replays into a pseudo-terminal (POSIX); `port` is the slave device to open."""
+
+    def __init__(self, source, speed=1.0, corrupt=0.0, drop=0.0, loop=False, seed=0):
+        import tty
+
+        counters, values, fs = load_source(source) if isinstance(source, str) else source
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.packets = len(counters)
+        self.bytes_sent = 0
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._chunks = replay_chunks(counters, values, fs, speed, corrupt, drop, loop, seed, self._stop)
+        self._thread = threading.Thread(target=self._produce, name='replay-pty', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        os.close(self.master)
+        self._thread.join()
+        os.close(self.slave)
+
+    def _produce(self):
+        try:
+            for chunk in self._chunks:
+                view = memoryview(chunk)
+                while view:
+                    written = os.write(self.master, view)
+                    view = view[written:]
+                self.bytes_sent += len(chunk)
+        except OSError:
+            pass  # master closed
+        finally:
+            self.finished.set()
+
+
+def parse_replay_url(port):
+    """'replay:<path>?speed=10&corrupt=1e-4' -> (path, kwargs for ReplayTransport)."""
+    path, _, query = port[len(REPLAY_PREFIX):].partition('?')
+    options = dict(parse_qsl(query))
+    speed = options.get('speed', '1')
+    return path, {
+        'speed': None if speed in ('max', '0') else float(speed),
+        'corrupt': float(options.get('corrupt', 0)),
+        'drop': float(options.get('drop', 0)),
+        'loop': options.get('loop', '0') not in ('0', 'false', ''),
+        'seed': int(options.get('seed', 0)),
+    }
+
+
+def open_transport(port, baud, timeout=1):
+    """A board connection for `port`: a replay: URL, a pyserial URL or a device name."""
+    if port.startswith(REPLAY_PREFIX):
+        path, options = parse_replay_url(port)
+        if not os.path.exists(path):
+            raise serial.SerialException(f"Replay source not found: {path}")
+        return ReplayTransport(path, timeout=timeout, **options)
+    return serial.serial_for_url(port, baud, timeout=timeout)
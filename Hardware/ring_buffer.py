@@ -0,0 +1,75 @@
+"""
+Preallocated ring buffers for batched sample streams.
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-length (length x channels) history that takes whole batches.
+    Every row is written twice (at i and i + length) so the latest window is
+    always one contiguous slice and reading it never copies.
+    """
+
+    def __init__(self, length, channels, dtype=np.float32):
+        self.length = length
+        self.channels = channels
+        self.data = np.zeros((2 * length, channels), dtype=dtype)
+        self.index = 0   # next write position in [0, length)
+        self.count = 0   # rows written so far, capped at length
+
+    def extend(self, block):
+        block = np.asarray(block).reshape(-1, self.channels)
+        n = len(block)
+        if n == 0:
+            return
+        if n >= self.length:
+            block = block[-self.length:]
+            self.data[:self.length] = block
+            self.data[self.length:] = block
+            self.index = 0
+            self.count = self.length
+            return
+        first = min(n, self.length - self.index)
+        for offset in (0, self.length):
+            self.data[offset + self.index:offset + self.index + first] = block[:first]
+            self.data[offset:offset + n - first] = block[first:]
+        self.index = (self.index + n) % self.length
+        self.count = min(self.length, self.count + n)
+
+    def latest(self):
+        """View of the last `length` rows, oldest first."""
+        return self.data[self.index:self.index + self.length]
+
+    def clear(self):
+        self.data[:] = 0
+        self.index = 0
+        self.count = 0
+
+
+class PeakDecimator:
+    """
+    Reduces a stream to (min, max) pairs per `step` samples, carrying partial
+    buckets between batches, so a plot can keep one point pair per pixel.
+    """
+
+    def __init__(self, step, channels, dtype=np.float32):
+        self.step = step
+        self.channels = channels
+        self.pending = np.empty((0, channels), dtype=dtype)
+
+    def process(self, block):
+        """Returns (2 * buckets, channels) rows: min and max of each completed bucket."""
+        block = np.asarray(block, dtype=self.pending.dtype).reshape(-1, self.channels)
+        if self.step == 1:
+            return block
+        if len(self.pending):
+            block = np.concatenate([self.pending, block])
+        full = len(block) // self.step * self.step
+        self.pending = block[full:].copy()
+        buckets = block[:full].reshape(-1, self.step, self.channels)
+        out = np.empty((2 * len(buckets), self.channels), dtype=block.dtype)
+        out[0::2] = buckets.min(axis=1)
+        out[1::2] = buckets.max(axis=1)
+        return out
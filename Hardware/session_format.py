@@ -0,0 +1,232 @@
+"""
+Columnar binary session recordings.
+
+A session is a directory `biosignals-<id>.session/` with one append-only file
+per column and a small JSON header:
+    meta.json     -- session id, channel count, nominal sample rate, start time
+    counter.u8    -- packet counter, uint8
+    elapsed.f8    -- seconds since session start, little-endian float64
+    channels.u16  -- raw ADC values, little-endian uint16, NUM_CHANNELS per row
+Row i of every column is sample i, so the file sizes are the index: readers
+memory-map the columns directly, and after a crash every column is cut back
+to the number of complete rows they all share.
+
+    python session_format.py to-csv biosignals-abcdef.session [out.csv]
+    python session_format.py to-edf biosignals-abcdef.session [out.edf] [--filtered]
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from packet_decoder import NUM_CHANNELS, SAMPLE_RATE
+
+COLUMNS = {
+    # name: (file, dtype, values per row)
+    'counter': ('counter.u8', np.dtype(np.uint8), 1),
+    'elapsed': ('elapsed.f8', np.dtype('<f8'), 1),
+    'channels': ('channels.u16', np.dtype('<u2'), NUM_CHANNELS),
+}
+META_FILE = 'meta.json'
+CSV_HEADER = ['ElapsedTime', 'Counter'] + [f'CH{i}' for i in range(NUM_CHANNELS)]
+
+
+def _row_bytes(name):
+    _, dtype, width = COLUMNS[name]
+    return dtype.itemsize * width
+
+
+def complete_rows(path):
+    """Number of rows present in every column file."""
+    rows = []
+    for name, (fname, _, _) in COLUMNS.items():
+        fpath = os.path.join(path, fname)
+        size = os.path.getsize(fpath) if os.path.exists(fpath) else 0
+        rows.append(size // _row_bytes(name))
+    return min(rows)
+
+
+def recover(path):
+    """Truncate all columns to their common length (drops a half-written tail)."""
+    n = complete_rows(path)
+    for name, (fname, _, _) in COLUMNS.items():
+        fpath = os.path.join(path, fname)
+        if os.path.exists(fpath) and os.path.getsize(fpath) != n * _row_bytes(name):
+            with open(fpath, 'r+b') as f:
+                f.truncate(n * _row_bytes(name))
+    return n
+
+
+class SessionWriter:
+    """
+    Appends decoded batches to a session directory from a background thread.
+    append() only queues the arrays, so the acquisition loop never waits on disk.
+    """
+
+    def __init__(self, path, session_id, sample_rate=SAMPLE_RATE, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            self.rows = recover(path)
+        else:
+            self.rows = 0
+            meta = {
+                'session_id': session_id,
+                'num_channels': NUM_CHANNELS,
+                'sample_rate': sample_rate,
+                'start_time': time.time(),
+            }
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f, indent=2)
+
+        self.files = {name: open(os.path.join(path, fname), 'ab')
+                      for name, (fname, _, _) in COLUMNS.items()}
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='session-writer', daemon=True)
+        self.thread.start()
+
+    def append(self, counters, values, elapsed):
+        """Queue one batch; `elapsed` is a scalar for the whole batch or one value per row."""
+        elapsed = np.broadcast_to(np.asarray(elapsed, dtype='<f8'), (len(counters),))
+        self.queue.put((np.asarray(counters, np.uint8), np.asarray(values, '<u2'), elapsed))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                counters, values, elapsed = item
+                # Write the widest column last: a crash mid-batch leaves it short and recover() trims the rest
+                self.files['counter'].write(counters.tobytes())
+                self.files['elapsed'].write(elapsed.tobytes())
+                self.files['channels'].write(values.tobytes())
+                self.rows += len(counters)
+            if time.time() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.time()
+        self._flush()
+        for f in self.files.values():
+            f.close()
+
+    def _flush(self):
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class SessionReader:
+    """Read-only, memory-mapped view of a session directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.sample_rate = self.meta['sample_rate']
+        n = complete_rows(path)
+        for name, (fname, dtype, width) in COLUMNS.items():
+            shape = (n, width) if width > 1 else (n,)
+            if n:
+                column = np.memmap(os.path.join(path, fname), dtype=dtype, mode='r', shape=shape)
+            else:
+                column = np.empty(shape, dtype=dtype)
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.counter)
+
+    def blocks(self, rows):
+        """Yield (counter, elapsed, channels) slices of at most `rows` samples."""
+        for start in range(0, len(self), rows):
+            stop = start + rows
+            yield self.counter[start:stop], self.elapsed[start:stop], self.channels[start:stop]
+
+
+# --- Converters ---
+def to_csv(path, out_path=None, block_rows=1 << 16):
+    """Write the session in the legacy biosignals CSV layout."""
+    reader = SessionReader(path)
+    out_path = out_path or path.rstrip(os.sep).replace('.session', '') + '-full.csv'
+    fmt = ['%.3f', '%d'] + ['%d'] * NUM_CHANNELS
+    with open(out_path, 'w', newline='') as f:
+        f.write(','.join(CSV_HEADER) + '\n')
+        for counter, elapsed, channels in reader.blocks(block_rows):
+            np.savetxt(f, np.column_stack([elapsed, counter, channels]), fmt=fmt, delimiter=',')
+    return out_path
+
+
+def to_edf(path, out_path=None, block_seconds=60, filtered=False):
+    """
+    Write all channels to EDF+. Raw ADC counts map 1:1 onto EDF digital values,
+    so no min/max pass is needed and the conversion is lossless. With
+    filtered=True every channel goes through filter_bank.FilterBank first
+    (ADC offset removed, rounded to whole counts, the chain in 'prefilter').
+    """
+    import pyedflib
+
+    reader = SessionReader(path)
+    fs = int(round(reader.sample_rate))
+    bank = None
+    if filtered:
+        from filter_bank import FilterBank
+
+        bank = FilterBank(fs=fs)
+    out_path = out_path or path.rstrip(os.sep).replace('.session', '') + '.edf'
+    f = pyedflib.EdfWriter(out_path, n_channels=NUM_CHANNELS, file_type=pyedflib.FILETYPE_EDFPLUS)
+    try:
+        f.setSignalHeaders([
+            {
+                'label': 'ECG' if i == 0 else f'CH{i}',
+                'dimension': 'adc',
+                'sample_frequency': fs,
+                'physical_min': -32768 if bank else 0,
+                'physical_max': 32767 if bank else 65535,
+                'digital_min': -32768,
+                'digital_max': 32767,
+                'transducer': '',
+                'prefilter': bank.prefilter if bank else '',
+            }
+            for i in range(NUM_CHANNELS)
+        ])
+        # Whole data records per call; writeSamples pads the final partial record
+        for _, _, channels in reader.blocks(fs * block_seconds):
+            if bank:
+                digital = np.clip(np.rint(bank.process(channels)), -32768, 32767).astype(np.int32)
+            else:
+                digital = channels.astype(np.int32) - 32768
+            f.writeSamples([np.ascontiguousarray(digital[:, i]) for i in range(NUM_CHANNELS)], digital=True)
+    finally:
+        f.close()
+    return out_path
+
+
+def main():
+    args = [a for a in sys.argv[1:] if a != '--filtered']
+    if len(args) < 2 or args[0] not in ('to-csv', 'to-edf'):
+        print(__doc__)
+        sys.exit(1)
+    if args[0] == 'to-csv':
+        out_path = to_csv(args[1], args[2] if len(args) > 2 else None)
+    else:
+        out_path = to_edf(args[1], args[2] if len(args) > 2 else None, filtered='--filtered' in sys.argv)
+    print(f"Saved {out_path}")
+
+
+if __name__ == "__main__":
+    main()
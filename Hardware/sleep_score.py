@@ -1,63 +1,145 @@
-# we have a list of lists
-# sub-lists are formatted [unknown, nrem, rem, awake]
-
-my_input = [[6.7717599e-04, 2.5841177e-01, 2.5973726e-02, 7.1493727e-01], 
-            [2.6535531e-04, 2.5332743e-01, 1.7589109e-02, 7.2881818e-01],
-            [1.8706617e-04, 2.2932185e-01, 1.5328194e-02, 7.5516295e-01],
-            [2.3121174e-04, 2.1493009e-01, 1.6798854e-02, 7.6803988e-01],
-            [4.4561972e-04, 2.0256965e-01, 2.3033723e-02, 7.7395099e-01]]
-
-# in seconds
-time_interval = 1
-
-count = [0,0,0,0]
-
-for row in my_input:
-    index_max = row.index(max(row))
-    count[index_max] += 1
-
-sub_scores = {}
-
-# calculate total sleep time score
-total_sleep_time = len(my_input)*time_interval # time in seconds
-total_sleep_score = min(100, 100/(9*3600) * total_sleep_time) 
-sub_scores["total_sleep_score"] = total_sleep_score
-# 9*3600 = 9 hours of sleep
-
-
-# calculate nrem score
-nrem_sleep_time = count[1]*time_interval
-nrem_score = 0
-if nrem_sleep_time < 5580:
-    nrem_score = 95/5580 * nrem_sleep_time
-else:
-    nrem_score = min(100, ((100-95) / (8670-5580))+86)
-sub_scores["nrem_score"] = nrem_score
-
-# calculate rem score
-rem_sleep_time = count[2]*time_interval
-rem_score = 0
-if rem_sleep_time < 6690:
-    rem_score = 95/6690 * rem_sleep_time
-else:
-    rem_score = min(100, ((100-95) / (8820-6690))+79.3)
-sub_scores["rem_score"] = rem_score
-
 """
-sleep efficiency -- time asleep/total time in bed
-sleep latency -- time from enabling "sleep state" to actually falling asleep --> hrv
-sleep timing -- closeness of enabling "sleep state" to "good" times to sleep 
+Sleep score from sleepecg stage probabilities.
+
+Input is what sleepecg.stage(clf, record, return_mode="prob") returns for the
+wake-rem-nrem classifiers: an (n_epochs, 4) array, columns
+[unknown, nrem, rem, awake], one row per 30 s epoch. Epochs are labelled by
+argmax and counted with bincount-style reductions, so scoring is vectorized
+over epochs and over nights:
+
+    score, sub_scores = score_night(probs)
+    scores = score_nights(stacked, lengths)   # many nights in one call
+
+Sub-scores, 0..100:
+    total_sleep_score -- recorded time against TARGET_SLEEP_S (9 h)
+    nrem_score        -- NREM time: 0..95 up to its target, 95..100 up to its maximum
+    rem_score         -- REM time, same shape
+    efficiency_score  -- time asleep / time in bed
+    latency_score     -- sleep onset latency: 100 up to 15 min, 0 from 60 min on
+The score is their SCORE_WEIGHTS-weighted mean.
 """
 
-weights = {
-        'total_sleep_score': 0.6,
-        # 'restfulness_score': 0.15,
-        # 'efficiency_score': 0.10,
-        # 'latency_score': 0.10,
-        'nrem_score': 0.15,
-        'rem_score': 0.25,
-        # 'timing_score': 0.10
+import numpy as np
+
+# Probability columns for stages_mode wake-rem-nrem
+UNDEFINED, NREM, REM, WAKE = range(4)
+NUM_STAGES = 4
+EPOCH_S = 30
+
+TARGET_SLEEP_S = 9 * 3600
+NREM_TARGET_S, NREM_MAX_S = 5580, 8670
+REM_TARGET_S, REM_MAX_S = 6690, 8820
+LATENCY_GOOD_S, LATENCY_BAD_S = 15 * 60, 60 * 60
+
+SCORE_WEIGHTS = {
+    'total_sleep_score': 0.6,
+    # 'restfulness_score': 0.15,
+    'efficiency_score': 0.10,
+    'latency_score': 0.10,
+    'nrem_score': 0.15,
+    'rem_score': 0.25,
+    # 'timing_score': 0.10
+}
+SUB_SCORES = tuple(SCORE_WEIGHTS)
+
+LABEL_BLOCK = 1 << 18  # epochs per argmax block, bounds the temporaries
+
+
+def stage_labels(probs):
+    """argmax stage per epoch as int8, computed in blocks over the leading axis."""
+    probs = np.asarray(probs)
+    labels = np.empty(probs.shape[:-1], dtype=np.int8)
+    flat_probs = probs.reshape(-1, probs.shape[-1])
+    flat = labels.reshape(-1)
+    for start in range(0, len(flat), LABEL_BLOCK):
+        flat[start:start + LABEL_BLOCK] = flat_probs[start:start + LABEL_BLOCK].argmax(axis=1)
+    return labels
+
+
+def _ramp(seconds, target, upper):
+    # 0..95 up to the target, then 95..100 up to the upper bound
+    below = 95.0 / target * seconds
+    above = np.minimum(100.0, 95.0 + (100.0 - 95.0) / (upper - target) * (seconds - target))
+    return np.where(seconds < target, below, above)
+
+
+def _ragged_counts(labels, starts, lengths, values):
+    """Per-night count of each value over concatenated nights."""
+    counts = np.zeros((len(lengths), len(values)), dtype=np.int64)
+    nonempty = lengths > 0
+    if not len(labels) or not nonempty.any():
+        return counts
+    for j, value in enumerate(values):
+        hits = (labels == value).view(np.int8)
+        counts[nonempty, j] = np.add.reduceat(hits, starts[nonempty], dtype=np.int64)
+    return counts
+
+
+def score_nights(probs, lengths=None, epoch_s=EPOCH_S):
+    """
+    Score many nights at once. `probs` is either
+      * (n_nights, max_epochs, 4), padded; `lengths` gives each night's epochs (default: all), or
+      * (total_epochs, 4), nights concatenated; `lengths` gives each night's epochs
+        (default: a single night).
+    Returns a dict of (n_nights,) arrays: 'score', every SUB_SCORES entry,
+    'onset_s' (NaN when no sleep) and 'stage_epochs' (n_nights, 4).
+    """
+    probs = np.asarray(probs)
+    labels = stage_labels(probs)
+    if probs.ndim == 3:
+        n_nights, max_epochs = labels.shape
+        lengths = np.full(n_nights, max_epochs) if lengths is None else np.asarray(lengths)
+        lengths = lengths.astype(np.int64)
+        # Padding becomes its own label, counted nowhere
+        labels[np.arange(max_epochs) >= lengths[:, None]] = NUM_STAGES
+        counts = np.stack([np.count_nonzero(labels == stage, axis=1) for stage in range(NUM_STAGES)], axis=1)
+        asleep = (labels == NREM) | (labels == REM)
+        has_sleep = asleep.any(axis=1)
+        first = asleep.argmax(axis=1)
+    else:
+        lengths = np.array([len(labels)]) if lengths is None else np.asarray(lengths)
+        lengths = lengths.astype(np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        counts = _ragged_counts(labels, starts, lengths, range(NUM_STAGES))
+        # First asleep epoch: where the running count of asleep epochs first passes its value at the night start
+        cum = np.concatenate([[0], np.cumsum((labels == NREM) | (labels == REM), dtype=np.int32)])
+        has_sleep = cum[starts + lengths] > cum[starts]
+        first = np.searchsorted(cum, cum[starts] + 1) - 1 - starts
+    onset_s = np.where(has_sleep, first * epoch_s, np.nan)
+
+    sleep_epochs = counts[:, NREM] + counts[:, REM]
+    in_bed = lengths - counts[:, UNDEFINED]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        efficiency = np.where(in_bed > 0, 100.0 * sleep_epochs / in_bed, 0.0)
+    latency = np.where(has_sleep, np.clip(100.0 * (LATENCY_BAD_S - onset_s) / (LATENCY_BAD_S - LATENCY_GOOD_S),
+                                          0.0, 100.0), 0.0)
+
+    result = {
+        'total_sleep_score': np.minimum(100.0, 100.0 / TARGET_SLEEP_S * lengths * epoch_s),
+        'efficiency_score': efficiency,
+        'latency_score': latency,
+        'nrem_score': _ramp(counts[:, NREM] * epoch_s, NREM_TARGET_S, NREM_MAX_S),
+        'rem_score': _ramp(counts[:, REM] * epoch_s, REM_TARGET_S, REM_MAX_S),
     }
+    total_weight = sum(SCORE_WEIGHTS.values())
+    result['score'] = sum(result[name] * weight for name, weight in SCORE_WEIGHTS.items()) / total_weight
+    result['onset_s'] = onset_s
+    result['stage_epochs'] = counts
+    return result
+
+
+def score_night(probs, epoch_s=EPOCH_S):
+    """(score, {sub-score: value}) for one night's (n_epochs, 4) probabilities."""
+    result = score_nights(probs, epoch_s=epoch_s)
+    return float(result['score'][0]), {name: float(result[name][0]) for name in SUB_SCORES}
 
-final_score = sum(sub_scores[score] * weight for score, weight in weights)
 
+if __name__ == '__main__':
+    # The example night this file used to score, one row per epoch
+    my_input = [[6.7717599e-04, 2.5841177e-01, 2.5973726e-02, 7.1493727e-01],
+                [2.6535531e-04, 2.5332743e-01, 1.7589109e-02, 7.2881818e-01],
+                [1.8706617e-04, 2.2932185e-01, 1.5328194e-02, 7.5516295e-01],
+                [2.3121174e-04, 2.1493009e-01, 1.6798854e-02, 7.6803988e-01],
+                [4.4561972e-04, 2.0256965e-01, 2.3033723e-02, 7.7395099e-01]]
+    final_score, sub_scores = score_night(np.array(my_input))
+    print(f"score {final_score:.1f}", sub_scores)
@@ -0,0 +1,179 @@
+"""
+Packet-loss, resync and timing accounting for the live packet stream.
+
+The board numbers packets with an 8-bit counter. StreamMonitor unwraps it into
+a running sample index: a step of k > 1 between consecutive packets means
+k - 1 packets were lost (a gap of 256 or more packets aliases and is counted
+modulo 256), unless the counter itself was corrupted in transit. Lost packets keep their slot in the index, so samples after a gap
+still land at the right time.
+
+Host arrival times carry the serial/USB batching jitter (rows 1 ms apart, then
+a pause), so SampleClock rebuilds one timestamp per sample from the nominal
+rate instead:
+    t(index) = base_time + (index - base_index) * period
+The earliest arrivals are the ones with the least transport delay. Once per
+CLOCK_WINDOW_S, the smallest residual (arrival - t) of that window pulls the
+line onto the lower envelope of arrivals, and a least-squares fit over the
+last CLOCK_HISTORY envelope points sets `period`, which absorbs the board's
+crystal drift. Corrections after the first windows are capped at
+MAX_STEP_PERIODS sample periods, so from then on timestamps stay strictly
+increasing (while locking, the line may step back once per window).
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+from packet_decoder import SAMPLE_RATE
+
+CLOCK_WINDOW_S = 10.0
+CLOCK_HISTORY = 30          # envelope points in the drift fit (5 min)
+CLOCK_LOCK_WINDOWS = 2      # windows in which the full correction is applied
+MAX_STEP_PERIODS = 0.5      # largest later correction, in sample periods
+MAX_DRIFT = 0.005           # clamp on the fitted rate error (5000 ppm)
+RATE_WINDOW_S = 5.0         # packets/s and loss % are over this long
+
+
+class SampleClock:
+    """Per-sample timestamps on the host clock from the nominal rate, corrected for drift."""
+
+    def __init__(self, fs=SAMPLE_RATE, window_s=CLOCK_WINDOW_S, history=CLOCK_HISTORY):
+        self.fs = fs
+        self.nominal = 1.0 / fs
+        self.period = self.nominal
+        self.window = int(window_s * fs)
+        self.base_index = None
+        self.base_time = None
+        self.window_end = None
+        self.window_min = np.inf
+        self.window_min_at = None
+        self.windows = 0
+        self.envelope = deque(maxlen=history)  # (index, earliest plausible time of that sample)
+        self.last_residual = 0.0
+
+    def predict(self, index):
+        return self.base_time + (np.asarray(index) - self.base_index) * self.period
+
+    def update(self, index, received):
+        """Timestamps for sample indices `index` (int64 array) whose last one arrived at `received`."""
+        last = int(index[-1])
+        if self.base_index is None:
+            self.base_index, self.base_time = last, received
+            self.window_end = last + self.window
+        residual = received - float(self.predict(last))
+        self.last_residual = residual
+        if residual < self.window_min:
+            self.window_min, self.window_min_at = residual, last
+        times = self.predict(index)
+        if last >= self.window_end:
+            self._correct(last)
+        return times
+
+    def drift_ppm(self):
+        return (self.period / self.nominal - 1.0) * 1e6
+
+    def _correct(self, last):
+        self.windows += 1
+        now = float(self.predict(last))
+        at = self.window_min_at
+        self.envelope.append((at, float(self.predict(at)) + self.window_min))
+        if len(self.envelope) >= 3:
+            idx, t = np.array(self.envelope).T
+            slope = np.polyfit(idx - idx[-1], t, 1)[0]
+            self.period = self.nominal * (1.0 + np.clip(slope / self.nominal - 1.0, -MAX_DRIFT, MAX_DRIFT))
+        step = self.window_min
+        if self.windows > CLOCK_LOCK_WINDOWS:
+            limit = MAX_STEP_PERIODS * self.period
+            step = min(max(step, -limit), limit)
+        self.base_index, self.base_time = last, now + step
+        self.window_end = last + self.window
+        self.window_min = np.inf
+        self.window_min_at = None
+
+
+class StreamMonitor:
+    """Counter unwrapping, loss/resync totals and rolling rates for one connection."""
+
+    def __init__(self, fs=SAMPLE_RATE):
+        self.fs = fs
+        self.clock = SampleClock(fs)
+        self.last_counter = None
+        self.next_index = 0       # running sample index of the next packet, lost ones included
+        self.packets = 0
+        self.lost = 0
+        self.gaps = 0
+        self.bad_counters = 0
+        self.started = None
+        self.rates = deque()      # (host time, packets, lost) per batch within RATE_WINDOW_S
+
+    def update(self, counters, received):
+        """(first sample index, per-sample timestamps) for one decoded batch."""
+        index = self.unwrap(counters, received)
+        return int(index[0]), self.clock.update(index, received)
+
+    def unwrap(self, counters, received=None):
+        """Running sample index of every packet in a batch; updates the loss counters."""
+        counters = np.asarray(counters, dtype=np.int16)
+        steps = np.empty(len(counters), dtype=np.int64)
+        if self.last_counter is None:
+            steps[0] = 0
+            self.started = received
+        else:
+            steps[0] = (counters[0] - self.last_counter - 1) & 0xFF
+        steps[1:] = (np.diff(counters) - 1) & 0xFF
+        if len(counters) > 1:
+            # A packet out of step with both neighbours while they are two apart had its counter
+            # byte corrupted; it is not a loss (a corruption on a batch edge still counts as one)
+            prev = np.empty(len(counters) - 1, dtype=np.int16)
+            prev[0] = counters[0] - 1 if self.last_counter is None else self.last_counter
+            prev[1:] = counters[:-2]
+            bad = np.flatnonzero((steps[:-1] > 0) & (steps[1:] > 0) & (((counters[1:] - prev) & 0xFF) == 2))
+            steps[bad] = 0
+            steps[bad + 1] = 0
+            self.bad_counters += len(bad)
+        lost = int(steps.sum())
+        index = self.next_index + np.arange(len(counters)) + np.cumsum(steps)
+
+        self.last_counter = int(counters[-1])
+        self.next_index = int(index[-1]) + 1
+        self.packets += len(counters)
+        self.lost += lost
+        self.gaps += int(np.count_nonzero(steps))
+        if received is not None:
+            self.rates.append((received, len(counters), lost))
+            while self.rates and self.rates[0][0] < received - RATE_WINDOW_S:
+                self.rates.popleft()
+        return index
+
+    def stats(self, decoder=None, backlog=0):
+        now = time.time()
+        recent = [r for r in self.rates if r[0] >= now - RATE_WINDOW_S]
+        recent_packets = sum(r[1] for r in recent)
+        recent_lost = sum(r[2] for r in recent)
+        uptime = now - self.started if self.started else 0.0
+        stats = {
+            'packets': self.packets,
+            'lost': self.lost,
+            'gaps': self.gaps,
+            'bad_counters': self.bad_counters,
+            'loss_pct': 100.0 * self.lost / max(1, self.packets + self.lost),
+            'packets_per_s': recent_packets / RATE_WINDOW_S,
+            'recent_loss_pct': 100.0 * recent_lost / max(1, recent_packets + recent_lost),
+            'drift_ppm': self.clock.drift_ppm(),
+            'jitter_ms': self.clock.last_residual * 1e3,
+            'backlog_bytes': backlog,
+        }
+        if decoder is not None:
+            stats['resyncs'] = decoder.resyncs
+            stats['discarded_bytes'] = decoder.discarded
+            stats['resyncs_per_min'] = 60.0 * decoder.resyncs / uptime if uptime > 0 else 0.0
+        return stats
+
+    def format_stats(self, decoder=None, backlog=0):
+        s = self.stats(decoder, backlog)
+        text = (f"{s['packets_per_s']:.0f} pkt/s | loss {s['recent_loss_pct']:.2f}% "
+                f"({s['lost']} lost in {s['gaps']} gaps, {s['loss_pct']:.3f}% total)")
+        if decoder is not None:
+            text += f" | resyncs {s['resyncs']} ({s['resyncs_per_min']:.2f}/min, {s['discarded_bytes']} B discarded)"
+        return text + f" | backlog {s['backlog_bytes']} B | clock {s['drift_ppm']:+.0f} ppm"
@@ -0,0 +1,51 @@
+"""
+A finite replay ends the acquisition on its own, like a board being unplugged.
+
+    python -m pytest test_replay.py
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from packet_decoder import NUM_CHANNELS, SAMPLE_RATE
+from pipeline import AcquisitionPipeline, BLOCK
+from replay import ReplayTransport
+
+
+def source(n=500):
+    rng = np.random.default_rng(0)
+    return (np.arange(n) % 256).astype(np.uint8), rng.integers(0, 65536, (n, NUM_CHANNELS), dtype=np.uint16), \
+        SAMPLE_RATE
+
+
+def test_read_raises_eof_after_the_last_byte():
+    transport = ReplayTransport(source(), speed=None, timeout=0.1)
+    try:
+        transport.finished.wait(5.0)
+        assert len(transport.read(1 << 20)) == transport.bytes_sent
+        with pytest.raises(EOFError):
+            transport.read(1)
+    finally:
+        transport.close()
+
+
+def test_finite_replay_stops_the_pipeline():
+    transport = ReplayTransport(source(), speed=None, timeout=0.1)
+    messages = []
+    pipeline = AcquisitionPipeline(transport, on_message=messages.append)
+    counts = []
+    pipeline.subscribe("count", lambda batch: counts.append(len(batch.counters)), maxsize=1024, policy=BLOCK)
+    pipeline.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while pipeline.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not pipeline.running
+    finally:
+        pipeline.stop()
+        pipeline.join()
+        transport.close()
+    assert sum(counts) == transport.packets
+    assert messages == ["Replay finished"]
@@ -1,18 +1,45 @@
-from flask import Flask, jsonify, request
+import os
+import sys
+import time
+
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from models import db, setup_db
+from ingest import setup_recordings
 from routes import blueprint_api
 
-def create_app():
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+import metrics  # noqa: E402
+
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mydatabase.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config or {})
 
     CORS(app)
     setup_db(app)  # from models
+    setup_recordings(app)  # from ingest
 
     app.register_blueprint(blueprint_api, url_prefix='/api')
 
+    # Handler timings per endpoint and status, next to the worker stages merged in by ingest
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            metrics.timer('api_request', endpoint=request.endpoint or 'unmatched', method=request.method,
+                          status=response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render_prometheus(), content_type=metrics.CONTENT_TYPE)
+
     @app.route('/')
     def hello():
         return jsonify({'message': 'Welcome to NatHacks2025 API'})
@@ -0,0 +1,227 @@
+"""
+Batch sleep scoring of many recorded nights across a process pool.
+
+    python batchScore.py RECORDINGS... [-o scores.npz] [-j WORKERS] [--no-resume]
+
+RECORDINGS are files, directories or glob patterns; directories are searched
+for *.edf, *.csv and *.session recordings. Every worker process loads the
+classifier once and then scores nights one after another.
+
+Results go to a single columnar .npz, one entry per night:
+    path, size, mtime, digest    -- which recording (resume key: path, size, mtime)
+    n_beats, n_epochs, seconds   -- heartbeats found, 30 s epochs, worker time
+    score, <sub-scores>          -- Hardware/sleep_score.py
+    epoch_offset                 -- night i's rows in probs: [epoch_offset[i], epoch_offset[i] + n_epochs[i])
+    probs                        -- (total epochs, 4) float32 stage probabilities
+The file is rewritten atomically every FLUSH_INTERVAL seconds, so an interrupted
+run loses at most that much work; run again with the same output to resume.
+--rescore recomputes every score from the stored probabilities in one
+vectorized call (after a change to the scoring), without staging again.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+from sleep_score import score_night as night_score, score_nights, SUB_SCORES  # noqa: E402
+
+RECORDING_PATTERNS = ("*.edf", "*.csv", "*.session")
+COLUMNS = ("path", "size", "mtime", "digest", "n_beats", "n_epochs", "seconds", "score") + SUB_SCORES
+FLUSH_INTERVAL = 10.0  # seconds between rewrites of the output file
+WORKER_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                      "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS")
+
+_scorer = None  # sleepScoreData, imported once per worker
+
+
+# --- Input discovery ---
+def find_recordings(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item) and not item.rstrip(os.sep).endswith(".session"):
+            for pattern in RECORDING_PATTERNS:
+                paths.extend(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        elif glob.has_magic(item):
+            paths.extend(glob.glob(item, recursive=True))
+        else:
+            paths.append(item)
+    return sorted(set(os.path.abspath(p.rstrip(os.sep)) for p in paths))
+
+
+def file_key(path):
+    """(size, mtime) of a recording; for a session directory, summed over its files (not caches like overview/)."""
+    if os.path.isdir(path):
+        stats = [entry.stat() for entry in os.scandir(path) if entry.is_file()]
+        return sum(s.st_size for s in stats), max((s.st_mtime for s in stats), default=0.0)
+    s = os.stat(path)
+    return s.st_size, s.st_mtime
+
+
+# --- Worker ---
+def pin_worker_threads():
+    """
+    One thread per worker: parallelism comes from the pool, not from BLAS/TF inside it.
+    Call in the parent before starting a spawn-context pool: BLAS reads these when numpy
+    is imported, which a worker does while unpickling _init_worker, before it runs.
+    """
+    for var in WORKER_THREAD_VARS:
+        os.environ.setdefault(var, "1")
+
+
+def _init_worker():
+    global _scorer
+    import sleepScoreData
+    sleepScoreData.get_classifier()
+    _scorer = sleepScoreData
+
+
+def score_night(path):
+    """Runs in a worker: returns (row dict, probs) or raises."""
+    t0 = time.perf_counter()
+    size, mtime = file_key(path)
+    digest = _scorer.file_digest(path)
+    times = _scorer.heartbeat_times(path, digest)
+    probs, _ = _scorer.stage_probabilities(times)
+    score, sub_scores = night_score(probs)
+    row = {
+        "path": path, "size": size, "mtime": mtime, "digest": digest,
+        "n_beats": len(times), "n_epochs": len(probs),
+        "seconds": time.perf_counter() - t0, "score": score,
+    }
+    row.update(sub_scores)
+    return row, np.asarray(probs, dtype=np.float32)
+
+
+# --- Output ---
+def load_results(out_path):
+    """Existing rows and probability blocks of an output file, or empty lists."""
+    if not os.path.exists(out_path):
+        return [], []
+    with np.load(out_path, allow_pickle=False) as data:
+        n = len(data["path"])
+        # Sub-scores added after the file was written read as NaN until --rescore
+        columns = {name: (data[name] if name in data else np.full(n, np.nan)).tolist() for name in COLUMNS}
+        offsets, probs = data["epoch_offset"], data["probs"]
+    rows = [dict(zip(COLUMNS, values)) for values in zip(*(columns[name] for name in COLUMNS))]
+    blocks = [probs[o:o + row["n_epochs"]] for o, row in zip(offsets, rows)]
+    return rows, blocks
+
+
+def save_results(out_path, rows, blocks):
+    counts = np.array([row["n_epochs"] for row in rows], dtype=np.int64)
+    arrays = {
+        "path": np.array([row["path"] for row in rows], dtype=str),
+        "digest": np.array([row["digest"] for row in rows], dtype=str),
+        "size": np.array([row["size"] for row in rows], dtype=np.int64),
+        "mtime": np.array([row["mtime"] for row in rows], dtype=np.float64),
+        "n_beats": np.array([row["n_beats"] for row in rows], dtype=np.int64),
+        "n_epochs": counts,
+        "epoch_offset": np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64),
+        "probs": np.concatenate(blocks) if blocks else np.empty((0, 4), np.float32),
+    }
+    for name in ("seconds", "score") + SUB_SCORES:
+        arrays[name] = np.array([row[name] for row in rows], dtype=np.float64)
+    # Write then rename, so an interrupted run never leaves a truncated file
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, out_path)
+
+
+# --- Driver ---
+def run(inputs, out_path, workers=None, resume=True, on_message=print):
+    paths = find_recordings(inputs)
+    rows, blocks = load_results(out_path) if resume else ([], [])
+    done = {(row["path"], row["size"], row["mtime"]) for row in rows}
+    todo, missing = [], []
+    for p in paths:
+        try:
+            key = (p,) + file_key(p)
+        except OSError as e:  # named on the command line but missing, or removed since
+            on_message(f"{p}: {e.strerror or e}, skipped")
+            missing.append(p)
+            continue
+        if key not in done:
+            todo.append(p)
+    # A recording that changed since it was scored is replaced, not duplicated
+    stale = set(todo)
+    keep = [i for i, row in enumerate(rows) if row["path"] not in stale]
+    rows, blocks = [rows[i] for i in keep], [blocks[i] for i in keep]
+    on_message(f"{len(paths)} recordings, {len(paths) - len(todo) - len(missing)} already scored, "
+               f"{len(todo)} to go" + (f", {len(missing)} missing" if missing else ""))
+    if not todo:
+        return rows
+
+    workers = workers or os.cpu_count()
+    failed = []
+    t0 = last_flush = time.time()
+    pin_worker_threads()
+    # spawn: a forked worker would inherit the parent's BLAS thread pools as they are
+    with ProcessPoolExecutor(max_workers=min(workers, len(todo)), mp_context=get_context("spawn"),
+                             initializer=_init_worker) as pool:
+        futures = {pool.submit(score_night, p): p for p in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                row, probs = future.result()
+            except Exception as e:
+                failed.append(path)
+                on_message(f"[{i}/{len(todo)}] {os.path.basename(path)}: {type(e).__name__}: {e}")
+                continue
+            rows.append(row)
+            blocks.append(probs)
+            elapsed = time.time() - t0
+            eta = elapsed / i * (len(todo) - i)
+            on_message(f"[{i}/{len(todo)}] {os.path.basename(path)}: score {row['score']:.1f}, "
+                       f"{row['n_epochs']} epochs ({row['seconds']:.1f}s) | "
+                       f"{i / elapsed:.2f} nights/s, ETA {eta:.0f}s")
+            if time.time() - last_flush >= FLUSH_INTERVAL:
+                save_results(out_path, rows, blocks)
+                last_flush = time.time()
+    save_results(out_path, rows, blocks)
+    on_message(f"Scored {len(todo) - len(failed)} nights in {time.time() - t0:.1f}s -> {out_path}"
+               + (f" ({len(failed)} failed)" if failed else ""))
+    return rows
+
+
+def rescore(out_path, on_message=print):
+    """Recompute score and sub-scores of every night in `out_path` from its stored probabilities."""
+    rows, blocks = load_results(out_path)
+    if not rows:
+        on_message(f"Nothing to rescore in {out_path}")
+        return rows
+    t0 = time.perf_counter()
+    result = score_nights(np.concatenate(blocks), [row["n_epochs"] for row in rows])
+    for i, row in enumerate(rows):
+        for name in ("score",) + SUB_SCORES:
+            row[name] = float(result[name][i])
+    save_results(out_path, rows, blocks)
+    on_message(f"Rescored {len(rows)} nights in {time.perf_counter() - t0:.2f}s -> {out_path}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inputs", nargs="*", help="recording files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="scores.npz")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--no-resume", action="store_true", help="score everything again")
+    parser.add_argument("--rescore", action="store_true", help="only recompute scores in the output file")
+    args = parser.parse_args()
+    if args.rescore:
+        rescore(args.output)
+    elif not args.inputs:
+        parser.error("no recordings given")
+    else:
+        run(args.inputs, args.output, args.workers, resume=not args.no_resume)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
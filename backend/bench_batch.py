@@ -0,0 +1,43 @@
+"""
+Scaling of batchScore across worker counts.
+
+Writes N synthetic nights (see bench_sleepscore.py) and scores them from scratch
+with 1, 2, 4, ... workers up to the core count, reporting nights/s and the
+speedup over one worker. Pool start-up (one classifier load per worker) is
+included, as it is for a real run.
+
+    python bench_batch.py [nights] [hours]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from bench_sleepscore import make_night
+import batchScore
+
+
+def main():
+    nights = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    cores = os.cpu_count()
+    counts = sorted({1, cores} | {2 ** k for k in range(1, cores.bit_length()) if 2 ** k <= cores})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(nights):
+            make_night(os.path.join(tmp, f"night{i:03d}.edf"), hours, seed=i)
+        print(f"{nights} nights of {hours:g} h, {cores} cores")
+        base = None
+        for workers in counts:
+            out = os.path.join(tmp, f"scores-{workers}.npz")
+            t0 = time.perf_counter()
+            batchScore.run([tmp], out, workers, resume=False, on_message=lambda msg: None)
+            elapsed = time.perf_counter() - t0
+            base = base or elapsed
+            print(f"workers {workers:3d}: {elapsed:7.2f} s  {nights / elapsed:6.2f} nights/s  "
+                  f"speedup {base / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
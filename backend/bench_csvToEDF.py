@@ -0,0 +1,78 @@
+"""
+Memory and time of the streaming CSV -> EDF conversion.
+
+Writes synthetic 6-channel board CSVs of increasing length, converts each in a
+fresh process and reports wall time and peak RSS, which should stay flat as
+the night gets longer. The first converted file is read back and compared
+with the CSV sample for sample.
+
+    python bench_csvToEDF.py [hours ...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+FS = 125
+NUM_CHANNELS = 6
+BLOCK_ROWS = 1 << 16
+
+
+def write_csv(path, hours, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = int(hours * 3600 * FS)
+    with open(path, "w") as f:
+        f.write(",".join(["ElapsedTime", "Counter"] + [f"CH{i}" for i in range(NUM_CHANNELS)]) + "\n")
+        for start in range(0, rows, BLOCK_ROWS):
+            n = min(BLOCK_ROWS, rows - start)
+            index = np.arange(start, start + n)
+            values = rng.integers(0, 1 << 16, size=(n, NUM_CHANNELS))
+            block = np.column_stack([index / FS, index % 256, values])
+            np.savetxt(f, block, fmt=["%.3f", "%d"] + ["%d"] * NUM_CHANNELS, delimiter=",")
+
+
+def convert_in_child(csv_path, edf_path):
+    code = ("import resource, sys, time; from csvToEDF import CSVtoEDF; t = time.perf_counter(); "
+            f"CSVtoEDF({csv_path!r}, {edf_path!r}); "
+            "print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    seconds, maxrss_kb = out.stdout.strip().splitlines()[-1].split()
+    return float(seconds), int(maxrss_kb) / 1024
+
+
+def check_roundtrip(csv_path, edf_path):
+    import pyedflib
+
+    expected = pd.read_csv(csv_path, usecols=[f"CH{i}" for i in range(NUM_CHANNELS)]).to_numpy()
+    with pyedflib.EdfReader(edf_path) as f:
+        assert f.getSampleFrequency(0) == FS, f.getSampleFrequency(0)
+        assert f.getLabel(0) == "ECG"
+        for i in range(NUM_CHANNELS):
+            digital = f.readSignal(i, digital=True)[:len(expected)]
+            assert np.array_equal(digital.astype(np.int64) + 32768, expected[:, i]), f"CH{i} differs"
+
+
+def main():
+    hours = [float(h) for h in sys.argv[1:]] or [0.5, 2.0, 8.0]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, h in enumerate(hours):
+            csv_path, edf_path = os.path.join(tmp, f"night{i}.csv"), os.path.join(tmp, f"night{i}.edf")
+            write_csv(csv_path, h, seed=i)
+            seconds, peak_mb = convert_in_child(csv_path, edf_path)
+            if i == 0:
+                check_roundtrip(csv_path, edf_path)
+            size_mb = os.path.getsize(csv_path) / 2 ** 20
+            print(f"{h:5.1f} h  csv {size_mb:7.1f} MB  {seconds:6.2f} s  "
+                  f"{size_mb / seconds:6.1f} MB/s  peak RSS {peak_mb:6.1f} MB")
+            os.remove(csv_path)
+            os.remove(edf_path)
+    print("round trip OK")
+
+
+if __name__ == "__main__":
+    main()
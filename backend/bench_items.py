@@ -0,0 +1,147 @@
+"""
+Per-row vs bulk throughput of the /api/items endpoints on a SQLite file.
+
+Creates, updates and deletes N items through the Flask test client, once
+one request (and one commit) per row and once through /items/bulk in
+batches of B, and reports rows/s for each. Then pages through a full table
+with keyset pagination, all fields and id+name only, and measures listing
+latency while another thread keeps committing bulk inserts: in WAL mode
+readers are never blocked by the writer.
+
+    python bench_items.py [N] [--batch B] [--journal wal|delete]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app import create_app
+import models
+
+
+def rate(n, fn):
+    t0 = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - t0)
+
+
+def per_row(client, n):
+    ids = []
+
+    def create():
+        for i in range(n):
+            ids.append(client.post('/api/items', json={'name': f'item-{i}', 'description': 'per row'})
+                       .get_json()['item']['id'])
+
+    def update():
+        for item_id in ids:
+            assert client.patch(f'/api/items/{item_id}', json={'description': 'updated'}).status_code == 200
+
+    def remove():
+        for item_id in ids:
+            assert client.delete(f'/api/items/{item_id}').status_code == 200
+
+    return rate(n, create), rate(n, update), rate(n, remove)
+
+
+def bulk(client, n, batch):
+    ids = []
+
+    def create():
+        for lo in range(0, n, batch):
+            items = [{'name': f'item-{i}', 'description': 'bulk'} for i in range(lo, min(n, lo + batch))]
+            response = client.post('/api/items/bulk', json={'items': items})
+            ids.extend(item['id'] for item in response.get_json()['items'])
+
+    def update():
+        for lo in range(0, n, batch):
+            items = [{'id': item_id, 'description': 'updated'} for item_id in ids[lo:lo + batch]]
+            assert client.patch('/api/items/bulk', json={'items': items}).status_code == 200
+
+    def remove():
+        for lo in range(0, n, batch):
+            assert client.delete('/api/items/bulk', json={'ids': ids[lo:lo + batch]}).status_code == 200
+
+    return rate(n, create), rate(n, update), rate(n, remove)
+
+
+def page_all(client, query=''):
+    after, pages, rows = 0, 0, 0
+    while after is not None:
+        body = client.get(f'/api/items?limit=1000&after={after}{query}').get_json()
+        pages += 1
+        rows += len(body['items'])
+        after = body['nextCursor']
+    return pages, rows
+
+
+def read_while_writing(app, batch, duration=3.0):
+    """Listing latency (ms) and failed reads while a second thread commits bulk inserts."""
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        client = app.test_client()
+        while not stop.is_set():
+            client.post('/api/items/bulk', json={'items': [{'name': 'w'}] * batch})
+            writes[0] += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    client = app.test_client()
+    latencies, failed = [], 0
+    t_end = time.perf_counter() + duration
+    while time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        try:
+            ok = client.get('/api/items?limit=100&fields=id,name').status_code == 200
+        except Exception:  # "database is locked" propagates out of the test client
+            ok = False
+        latencies.append(time.perf_counter() - t0)
+        failed += not ok
+    stop.set()
+    thread.join()
+    return np.array(latencies) * 1e3, failed, writes[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Items API per-row vs bulk benchmark")
+    parser.add_argument("n", nargs="?", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--journal", choices=["wal", "delete"], default="wal")
+    args = parser.parse_args()
+    if args.journal == "delete":
+        models.SQLITE_PRAGMAS = tuple(p.replace("journal_mode=WAL", "journal_mode=DELETE")
+                                      for p in models.SQLITE_PRAGMAS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'items.db')}",
+                          'RECORDINGS_DIR': os.path.join(tmp, 'recordings')})
+        client = app.test_client()
+        print(f"{args.n} items, bulk batches of {args.batch}, journal_mode={args.journal}")
+        single = per_row(client, args.n)
+        batched = bulk(client, args.n, args.batch)
+        for op, a, b in zip(("create", "update", "delete"), single, batched):
+            print(f"{op:7s}: per row {a:8.0f} rows/s | bulk {b:9.0f} rows/s | {b / a:6.1f}x")
+
+        total = 100000
+        for lo in range(0, total, 5000):
+            client.post('/api/items/bulk', json={'items': [{'name': f'item-{i}', 'description': 'x' * 80}
+                                                           for i in range(lo, lo + 5000)]})
+        for label, query in (("all fields", ""), ("id,name", "&fields=id,name")):
+            t0 = time.perf_counter()
+            pages, rows = page_all(client, query)
+            print(f"list {rows} items ({label:10s}): {pages} pages in {time.perf_counter() - t0:5.2f}s")
+
+        ms, failed, writes = read_while_writing(app, args.batch)
+        print(f"reads during {writes} bulk commits: {len(ms)} pages, p50 {np.percentile(ms, 50):5.2f} ms, "
+              f"p99 {np.percentile(ms, 99):6.2f} ms, {failed} failed")
+        app.extensions['recordings'].shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Timing of sleepscore() calls: cold, warm and cached.
+
+Builds two synthetic EDF nights (QRS-like spikes with a drifting, breathing-
+modulated heart rate; different seeds so the content hashes differ; the
+recorded working.csv has too many artefacts for the classifier's RR limits
+once tiled to a whole night), then times:
+    cold   -- first call in the process: classifier load + heartbeats + staging
+    warm   -- classifier already loaded, new night: heartbeats + staging
+    cached -- same night again: hash + staging only
+and checks the cached result matches the first one.
+
+    python bench_sleepscore.py [hours]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyedflib
+
+FS = 125
+
+
+def synthetic_ecg(hours, seed):
+    rng = np.random.default_rng(seed)
+    duration = hours * 3600
+    n_beats = int(duration / 0.6)
+    drift = np.cumsum(rng.normal(0, 0.005, n_beats))
+    drift -= np.linspace(0, drift[-1], n_beats)  # keep the mean HR near 70 BPM
+    rr = 0.85 + drift + 0.04 * np.sin(np.arange(n_beats) * 0.8 * 0.25) + rng.normal(0, 0.01, n_beats)
+    beats = np.cumsum(np.clip(rr, 0.45, 1.5))
+    beats = beats[beats < duration - 1]
+
+    n = int(duration * FS)
+    ecg = 32768 + rng.normal(0, 20, n)
+    kernel = 3000 * np.exp(-0.5 * (np.arange(-5, 6) / 1.5) ** 2)  # ~25 ms QRS
+    for offset, k in zip(range(-5, 6), kernel):
+        ecg[np.round(beats * FS).astype(int) + offset] += k
+    return ecg
+
+
+def make_night(path, hours, seed=0):
+    ecg = synthetic_ecg(hours, seed)
+    f = pyedflib.EdfWriter(path, n_channels=1, file_type=pyedflib.FILETYPE_EDFPLUS)
+    f.setSignalHeaders([{
+        "label": "ECG", "dimension": "uV", "sample_frequency": FS,
+        "physical_min": 0, "physical_max": 65535,
+        "digital_min": -32768, "digital_max": 32767,
+        "transducer": "", "prefilter": "",
+    }])
+    f.writeSamples([ecg])
+    f.close()
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = os.path.join(tmp, "night1.edf"), os.path.join(tmp, "night2.edf")
+        make_night(first, hours)
+        make_night(second, hours, seed=1)
+
+        t0 = time.perf_counter()
+        import sleepScoreData
+        import_s = time.perf_counter() - t0
+
+        cold, cold_s = timed(sleepScoreData.sleepscore, first)
+        _, warm_s = timed(sleepScoreData.sleepscore, second)
+        cached, cached_s = timed(sleepScoreData.sleepscore, first)
+        _, hash_s = timed(sleepScoreData.file_digest, first)
+
+    assert np.array_equal(cold, cached), "cached result differs"
+    print(f"{hours:g} h night at {FS} Hz, {len(cold)} epochs")
+    print(f"import  {import_s:7.3f} s (no matplotlib: {'matplotlib' not in sys.modules})")
+    print(f"cold    {cold_s:7.3f} s")
+    print(f"warm    {warm_s:7.3f} s")
+    print(f"cached  {cached_s:7.3f} s (of which hashing {hash_s:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
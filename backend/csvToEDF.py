@@ -1,40 +1,147 @@
-import pandas as pd
+"""
+Streaming conversion of the board's biosignals CSV (ElapsedTime, Counter, CH0..CH5) to EDF+.
+
+The CSV is never loaded whole: the sample rate comes from the first and last
+ElapsedTime plus a newline count, and samples are written in blocks of whole
+one-second data records. Raw ADC counts map 1:1 onto EDF digital values
+(physical 0..65535, as in Hardware/session_format.to_edf), so no min/max pass
+is needed; with adc_range=False one extra pass finds each channel's range.
+filtered=True streams the ADC channels through Hardware/filter_bank.py
+(baseline, bandpass, notch) and records the chain in the EDF prefilter field.
+Peak memory depends on block_seconds, not on the length of the night.
+
+    python csvToEDF.py night.csv [out.edf] [--filtered]
+"""
+
+import os
+import sys
+
 import numpy as np
+import pandas as pd
 import pyedflib
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+import metrics  # noqa: E402
+
+DEFAULT_FS = 125       # for single-column exports without ElapsedTime
+ADC_MIN, ADC_MAX = 0, 65535
+BLOCK_SECONDS = 60     # data records per write
+TAIL_BYTES = 4096
+
+
+def _count_lines(fileName):
+    lines = 0
+    with open(fileName, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+        f.seek(max(0, f.tell() - 1))
+        if f.read(1) not in (b"\n", b""):
+            lines += 1  # last line without a newline
+    return lines
+
 
-def CSVtoEDF(fileName):
-    # Load ECG values
-    df = pd.read_csv(fileName, header=None)
-    ecg_signal = df.iloc[1:, 0].values.astype(np.float64)
+def _last_line(fileName):
+    with open(fileName, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - TAIL_BYTES))
+        lines = f.read().strip().splitlines()
+    return lines[-1].decode() if lines else ""
 
-    # Define sampling rate (Hz) — must be known or estimated
-    fs = 125  # Change this to your actual sampling frequency
+
+def csv_sample_rate(fileName):
+    """
+    Sample rate from the ElapsedTime column: (rows - 1) / (last - first), rounded
+    to whole Hz (EDF needs whole samples per one-second record). Reads only the
+    head and tail of the file plus a newline count.
+    """
+    header = pd.read_csv(fileName, nrows=2)
+    if "ElapsedTime" not in header.columns or len(header) < 2:
+        return DEFAULT_FS
+    rows = _count_lines(fileName) - 1
+    first = float(header["ElapsedTime"].iloc[0])
+    last = float(_last_line(fileName).split(",")[header.columns.get_loc("ElapsedTime")])
+    if rows < 2 or last <= first:
+        return DEFAULT_FS
+    return max(1, int(round((rows - 1) / (last - first))))
+
+
+def _channel_columns(fileName):
+    columns = list(pd.read_csv(fileName, nrows=0).columns)
+    channels = [c for c in columns if c.startswith("CH")]
+    return channels if channels else [columns[0]]
+
+
+def _scan_range(fileName, channels, chunk_rows):
+    lo = np.full(len(channels), np.inf)
+    hi = np.full(len(channels), -np.inf)
+    for chunk in pd.read_csv(fileName, usecols=channels, chunksize=chunk_rows):
+        values = chunk[channels].to_numpy(np.float64)
+        lo = np.minimum(lo, values.min(axis=0))
+        hi = np.maximum(hi, values.max(axis=0))
+    # EDF needs physical_min < physical_max
+    hi = np.where(hi > lo, hi, lo + 1)
+    return lo, hi
+
+
+@metrics.timed("csv_to_edf")
+def CSVtoEDF(fileName, output_file=None, adc_range=True, block_seconds=BLOCK_SECONDS, filtered=False):
+    """Convert every CH column of `fileName` to EDF+ at `output_file` (default: next to the CSV)."""
+    output_file = output_file or os.path.splitext(fileName)[0] + ".edf"
+    channels = _channel_columns(fileName)
+    fs = csv_sample_rate(fileName)
+    chunk_rows = fs * block_seconds
+    # Single-column exports are not raw ADC counts, so they always get a range pass
+    raw = adc_range and channels[0] == "CH0"
+    bank = None
+    if filtered:
+        if not raw:
+            raise ValueError("filtered export needs raw ADC channels (CH0..)")
+        from filter_bank import FilterBank
+
+        bank = FilterBank(fs=fs, channels=len(channels))
+        lo, hi = np.full(len(channels), -32768), np.full(len(channels), 32767)
+    elif raw:
+        lo, hi = np.full(len(channels), ADC_MIN), np.full(len(channels), ADC_MAX)
+    else:
+        lo, hi = _scan_range(fileName, channels, chunk_rows)
 
     # Create EDF writer
-    output_file = "ourECG.edf"
-    f = pyedflib.EdfWriter(
-        output_file, n_channels=1, file_type=pyedflib.FILETYPE_EDFPLUS
-    )
-
-    # Channel metadata
-    channel_info = [
-        {
-            "label": "ECG",
-            "dimension": "uV",  # or mV, arbitrary units, etc.
-            "sample_frequency": fs,
-            "physical_min": np.min(ecg_signal),
-            "physical_max": np.max(ecg_signal),
-            "digital_min": -32768,
-            "digital_max": 32767,
-            "transducer": "",
-            "prefilter": "",
-        }
-    ]
-
-    # Set header and write data
-    f.setSignalHeaders(channel_info)
-    f.writeSamples([ecg_signal])
-    f.close()
+    f = pyedflib.EdfWriter(output_file, n_channels=len(channels), file_type=pyedflib.FILETYPE_EDFPLUS)
+    try:
+        # Channel metadata; CH0 is the ECG lead sleepscore looks for
+        f.setSignalHeaders([
+            {
+                "label": "ECG" if i == 0 else name,
+                "dimension": "adc" if raw else "uV",
+                "sample_frequency": fs,
+                "physical_min": float(lo[i]),
+                "physical_max": float(hi[i]),
+                "digital_min": -32768,
+                "digital_max": 32767,
+                "transducer": "",
+                "prefilter": bank.prefilter if bank else "",
+            }
+            for i, name in enumerate(channels)
+        ])
+        # Whole data records per call; writeSamples pads the final partial record
+        for chunk in pd.read_csv(fileName, usecols=channels, chunksize=chunk_rows):
+            if bank:
+                values = np.clip(np.rint(bank.process(chunk[channels].to_numpy())), -32768, 32767).astype(np.int32)
+            elif raw:
+                values = chunk[channels].to_numpy(np.int32) - 32768
+            else:
+                values = chunk[channels].to_numpy(np.float64)
+            f.writeSamples([np.ascontiguousarray(values[:, i]) for i in range(len(channels))], digital=raw)
+    finally:
+        f.close()
 
     print(f"✅ EDF file saved as {output_file}")
+    return output_file
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--filtered"]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    CSVtoEDF(args[0], args[1] if len(args) > 1 else None, filtered="--filtered" in sys.argv)
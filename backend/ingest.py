@@ -0,0 +1,317 @@
+"""
+Storage and background processing for device recording uploads.
+
+Each recording is a directory under the recordings root:
+    <root>/<device_id>/<recording_id>/
+        status.json   -- format, sample rate, start time, state, timestamps, result summary
+        upload.csv    -- CSV uploads: the board's CSV, one header, chunks appended
+        upload.bin    -- binary uploads: the raw 16-byte packet stream from the board
+        night.session -- binary uploads, decoded by the worker (Hardware/session_format.py)
+        stages.npy    -- (n_epochs, 4) stage probabilities once processed
+The result summary also holds the night's stage minutes, the nightmare events
+the live rule would have fired (detection_service.replay_night, with the
+post-hoc stages) and HRV averaged over the asleep epochs; nightScores rolls
+them up per day, week and month.
+The byte offset of an upload is the size of its upload file, so resuming needs
+no extra bookkeeping: ask for the offset, send the rest from there.
+
+Request handlers only append bytes. complete() hands the recording to a
+process pool whose workers load the classifier once (batchScore._init_worker)
+and run decoding, beat detection and staging off the request path. Their
+stage timings (metrics.py) come back with the result and are merged into the
+server's metrics.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+import batchScore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "HRV-nightmare-detect"))
+import metrics  # noqa: E402
+from detection_service import replay_night  # noqa: E402
+from hrv_features import epoch_features  # noqa: E402
+from live_staging import STAGE_LABELS  # noqa: E402
+from packet_decoder import PacketDecoder, SAMPLE_RATE  # noqa: E402
+from session_format import SessionWriter  # noqa: E402
+from sleep_score import stage_labels, EPOCH_S, NREM, NUM_STAGES, REM  # noqa: E402
+from stream_monitor import StreamMonitor  # noqa: E402
+
+FORMATS = {"csv": "upload.csv", "binary": "upload.bin"}
+CSV_HEADER_PREFIX = b"ElapsedTime"
+STATUS_FILE = "status.json"
+SESSION_DIR = "night.session"
+STAGES_FILE = "stages.npy"
+STREAM_BLOCK = 64 * 1024     # bytes read from the request per write
+DECODE_BLOCK = 1 << 20       # bytes of packet stream decoded at a time
+ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# States: uploading -> queued -> processing -> done | failed
+UPLOADING, QUEUED, PROCESSING, DONE, FAILED = "uploading", "queued", "processing", "done", "failed"
+
+
+def setup_recordings(app):
+    root = app.config.get("RECORDINGS_DIR") or os.path.join(app.instance_path, "recordings")
+    app.extensions["recordings"] = RecordingStore(root, app.config.get("INGEST_WORKERS"))
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class RecordingStore:
+    def __init__(self, root, workers=None):
+        self.root = root
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.lock = threading.Lock()
+        self.recording_locks = {}
+        os.makedirs(root, exist_ok=True)
+
+    # --- Paths and status ---
+    def path(self, device_id, recording_id):
+        if not ID_PATTERN.match(device_id) or not ID_PATTERN.match(recording_id):
+            raise UploadError("Invalid device or recording id")
+        return os.path.join(self.root, device_id, recording_id)
+
+    def status(self, device_id, recording_id):
+        path = self.path(device_id, recording_id)
+        try:
+            with open(os.path.join(path, STATUS_FILE)) as f:
+                status = json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Recording not found", 404)
+        status["offset"] = self._size(path, status["format"])
+        return status
+
+    def list(self, device_id):
+        if not ID_PATTERN.match(device_id):
+            raise UploadError("Invalid device id")
+        device_dir = os.path.join(self.root, device_id)
+        if not os.path.isdir(device_dir):
+            return []
+        statuses = []
+        for rid in os.listdir(device_dir):
+            try:
+                statuses.append(self.status(device_id, rid))
+            except UploadError as e:
+                if e.status != 404:
+                    raise
+                # No status file yet (create() in progress) or any more (crash): not a listed recording
+        return sorted(statuses, key=lambda s: s["created"])
+
+    def _update(self, device_id, recording_id, **changes):
+        path = self.path(device_id, recording_id)
+        with self._lock_for(path):
+            status = self.status(device_id, recording_id)
+            status.update(changes, updated=time.time())
+            write_status(path, status)
+        return status
+
+    def _lock_for(self, path):
+        with self.lock:
+            return self.recording_locks.setdefault(path, threading.Lock())
+
+    @staticmethod
+    def _size(path, fmt):
+        upload = os.path.join(path, FORMATS[fmt])
+        return os.path.getsize(upload) if os.path.exists(upload) else 0
+
+    # --- Upload ---
+    def create(self, device_id, fmt="csv", sample_rate=SAMPLE_RATE, start_time=None):
+        if fmt not in FORMATS:
+            raise UploadError(f"Unknown format {fmt!r}, expected one of {sorted(FORMATS)}")
+        if not _is_number(sample_rate) or sample_rate <= 0:
+            raise UploadError("sampleRate must be a positive number")
+        if start_time is not None and not _is_number(start_time):
+            raise UploadError("startTime must be unix seconds")
+        recording_id = uuid.uuid4().hex
+        path = self.path(device_id, recording_id)
+        os.makedirs(path)
+        open(os.path.join(path, FORMATS[fmt]), "wb").close()
+        now = time.time()
+        status = {
+            "deviceId": device_id, "recordingId": recording_id, "format": fmt,
+            "sampleRate": sample_rate, "startTime": now if start_time is None else start_time,
+            "state": UPLOADING, "created": now, "updated": now,
+        }
+        write_status(path, status)
+        status["offset"] = 0
+        return status
+
+    def append(self, device_id, recording_id, stream, offset=None):
+        """
+        Copy a request body stream to the end of the upload, block by block.
+        `offset` is where the client thinks the upload ends; a mismatch is a 409
+        carrying the real offset so the client can resume from there.
+        """
+        path = self.path(device_id, recording_id)
+        with self._lock_for(path):
+            status = self.status(device_id, recording_id)
+            if status["state"] != UPLOADING:
+                raise UploadError(f"Recording is {status['state']}", 409, status["offset"])
+            if offset is not None and offset != status["offset"]:
+                raise UploadError("Offset mismatch", 409, status["offset"])
+            upload = os.path.join(path, FORMATS[status["format"]])
+            with open(upload, "ab") as f:
+                first = stream.read(STREAM_BLOCK)
+                if status["format"] == "csv" and status["offset"] and first.startswith(CSV_HEADER_PREFIX):
+                    # Every 30 s chunk CSV starts with a header; keep only the first one
+                    if self._ends_with_newline(upload):
+                        first = first[first.find(b"\n") + 1:] if b"\n" in first else b""
+                block = first
+                while block:
+                    f.write(block)
+                    block = stream.read(STREAM_BLOCK)
+        return self._size(path, status["format"])
+
+    @staticmethod
+    def _ends_with_newline(upload):
+        with open(upload, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    # --- Processing ---
+    def complete(self, device_id, recording_id, on_done=None):
+        """Mark the upload finished and queue it; returns immediately."""
+        path = self.path(device_id, recording_id)
+        with self._lock_for(path):
+            status = self.status(device_id, recording_id)
+            if status["state"] != UPLOADING:
+                raise UploadError(f"Recording is {status['state']}", 409, status["offset"])
+            status.update(state=QUEUED, updated=time.time())
+            write_status(path, status)
+        try:
+            future = self._pool().submit(process_recording, path, status["format"], status["sampleRate"])
+        except Exception as e:
+            return self._update(device_id, recording_id, state=FAILED, error=f"{type(e).__name__}: {e}")
+        future.add_done_callback(lambda f: self._finished(device_id, recording_id, f, on_done))
+        return status
+
+    def _pool(self):
+        with self.lock:
+            if self.pool is None:
+                # spawn: workers must not inherit the server's threads or sockets
+                batchScore.pin_worker_threads()
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"),
+                                                initializer=batchScore._init_worker)
+            return self.pool
+
+    def _finished(self, device_id, recording_id, future, on_done):
+        try:
+            row = future.result()
+        except Exception as e:
+            metrics.counter("ingest_failed").inc()
+            status = self._update(device_id, recording_id, state=FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            metrics.merge(row.pop("metrics", None))
+            summary = {
+                "beats": row["n_beats"], "epochs": row["n_epochs"], "score": row["score"],
+                "subScores": {k: row[k] for k in batchScore.SUB_SCORES},
+            }
+            summary.update(row["night"])
+            status = self._update(device_id, recording_id, state=DONE, result=summary)
+        if on_done:
+            # The executor swallows exceptions raised in its callbacks: keep them on the recording
+            try:
+                on_done(status)
+            except Exception as e:
+                metrics.counter("ingest_failed").inc()
+                self._update(device_id, recording_id, state=FAILED,
+                             error=f"Storing the result failed: {type(e).__name__}: {e}")
+
+    def shutdown(self):
+        if self.pool:
+            self.pool.shutdown(wait=True)
+
+
+def _is_number(value):
+    # JSON true/false arrive as bool, a subclass of int
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def write_status(path, status):
+    status = {k: v for k, v in status.items() if k != "offset"}
+    tmp = os.path.join(path, f"{STATUS_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, os.path.join(path, STATUS_FILE))
+
+
+def process_recording(path, fmt, sample_rate):
+    """Runs in a pool worker: decode if needed, then beats, staging and score."""
+    with open(os.path.join(path, STATUS_FILE)) as f:
+        status = json.load(f)
+    status.update(state=PROCESSING, updated=time.time())
+    write_status(path, status)
+
+    with metrics.timer("ingest_process", format=fmt).time():
+        if fmt == "binary":
+            source = decode_packets(os.path.join(path, FORMATS[fmt]), os.path.join(path, SESSION_DIR), sample_rate)
+        else:
+            source = os.path.join(path, FORMATS[fmt])
+
+        row, probs = batchScore.score_night(source)
+        np.save(os.path.join(path, STAGES_FILE), probs)
+        import sleepScoreData  # loaded by the pool initializer; heartbeats are memoized by digest
+        row["night"] = night_summary(sleepScoreData.heartbeat_times(source, row["digest"]), probs)
+    # This worker's numbers since its last recording, for the server's /metrics
+    row["metrics"] = metrics.snapshot(reset=True)
+    return row
+
+
+def _finite_mean(values):
+    values = values[np.isfinite(values)]
+    return float(values.mean()) if len(values) else None
+
+
+def night_summary(times, probs):
+    """Stage minutes, replayed nightmare events and asleep HRV of a processed night, JSON-ready."""
+    labels = stage_labels(probs)
+    counts = np.bincount(labels, minlength=NUM_STAGES)
+    nightmares = replay_night(times, [STAGE_LABELS.get(int(label)) for label in labels], EPOCH_S)
+    features = epoch_features(times)
+    n = min(len(labels), len(features["epoch"]))
+    asleep = np.isin(labels[:n], (NREM, REM))
+    return {
+        "stageMinutes": {name.lower(): float(counts[stage] * EPOCH_S / 60.0) for stage, name in STAGE_LABELS.items()},
+        "nightmares": len(nightmares),
+        "nightmareTimes": [round(t, 1) for t in nightmares],
+        "hrv": {key: _finite_mean(features[column][:n][asleep])
+                for key, column in (("hr", "hr"), ("rmssd", "rmssd"), ("sdnn", "sdnn"), ("lfHf", "lf_hf"))},
+    }
+
+
+@metrics.timed("ingest_decode")
+def decode_packets(upload, session_path, sample_rate=SAMPLE_RATE):
+    """
+    Board packet stream -> session directory; elapsed time is the sample index
+    over the rate, with lost packets (counter gaps) leaving their slot empty.
+    """
+    # SessionWriter appends to an existing session, so a retry starts from scratch
+    shutil.rmtree(session_path, ignore_errors=True)
+    decoder = PacketDecoder()
+    monitor = StreamMonitor(sample_rate)
+    writer = SessionWriter(session_path, os.path.basename(os.path.dirname(session_path)), sample_rate)
+    with open(upload, "rb") as f:
+        for block in iter(lambda: f.read(DECODE_BLOCK), b""):
+            counters, values, _ = decoder.feed(block)
+            if len(counters):
+                writer.append(counters, values, monitor.unwrap(counters) / sample_rate)
+    writer.close()
+    return session_path
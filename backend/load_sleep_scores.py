@@ -0,0 +1,122 @@
+"""
+Load test for /api/devices/<id>/sleep-scores against a populated SQLite file.
+
+For each size DEVICESxYEARS, fills a fresh database with one NightScore per
+device per night, then requests random (device, month) pairs through the Flask
+test client and reports latency percentiles for:
+    miss  -- cache cleared before every request: one indexed range query
+    hit   -- served from the LRU/TTL cache
+    304   -- client sends the ETag back (If-None-Match)
+The miss p99 should stay flat as devices and years grow.
+
+    python load_sleep_scores.py [DEVICESxYEARS ...] [--requests N] [--db-dir DIR]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app import create_app
+from models import db, NightScore
+import nightScores
+
+INSERT_BATCH = 50000
+
+
+def populate(app, devices, years, seed=0):
+    rng = random.Random(seed)
+    first = date(2025, 12, 31) - timedelta(days=int(365 * years))
+    nights = [first + timedelta(days=i) for i in range(int(365 * years))]
+    now = datetime.now()
+    with app.app_context():
+        table = NightScore.__table__
+        batch = []
+        for d in range(devices):
+            device_id = f"device-{d:05d}"
+            for night in nights:
+                if rng.random() < 0.1:
+                    continue  # nights without a recording
+                total, nrem, rem = rng.uniform(40, 100), rng.uniform(30, 100), rng.uniform(30, 100)
+                batch.append({
+                    'device_id': device_id, 'date': night, 'computed_at': now,
+                    'score': 0.6 * total + 0.15 * nrem + 0.25 * rem,
+                    'sub_scores': {'total_sleep_score': total, 'nrem_score': nrem, 'rem_score': rem},
+                })
+                if len(batch) >= INSERT_BATCH:
+                    db.session.execute(table.insert(), batch)
+                    batch = []
+        if batch:
+            db.session.execute(table.insert(), batch)
+        db.session.commit()
+    return nights[0], nights[-1]
+
+
+def measure(client, targets, mode):
+    latencies = []
+    etags = {}
+    for device_id, month in targets:
+        url = f"/api/devices/{device_id}/sleep-scores?month={month}"
+        headers = {}
+        if mode == 'miss':
+            nightScores.monthly_cache.clear()
+        elif mode == '304':
+            headers['If-None-Match'] = etags.get(url) or client.get(url).headers['ETag'].strip('"')
+            etags[url] = headers['If-None-Match']
+            headers['If-None-Match'] = f'"{etags[url]}"'
+        t0 = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        expected = 304 if mode == '304' else 200
+        assert response.status_code == expected, (mode, response.status_code)
+    ms = np.array(latencies) * 1e3
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def run_size(devices, years, requests, db_dir):
+    path = os.path.join(db_dir, f"scores-{devices}x{years:g}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}",
+                      'RECORDINGS_DIR': os.path.join(db_dir, 'recordings')})
+    t0 = time.perf_counter()
+    first, last = populate(app, devices, years)
+    fill_s = time.perf_counter() - t0
+    with app.app_context():
+        rows = NightScore.query.count()
+
+    rng = random.Random(1)
+    months = sorted({(first + timedelta(days=i)).strftime('%Y-%m') for i in range((last - first).days + 1)})
+    targets = [(f"device-{rng.randrange(devices):05d}", rng.choice(months)) for _ in range(requests)]
+    # A small hot set for the cache-hit case, as with a few active users refreshing
+    hot = targets[:64] * (requests // 64 + 1)
+
+    client = app.test_client()
+    nightScores.monthly_cache.clear()
+    miss = measure(client, targets, 'miss')
+    hit = measure(client, hot[:requests], 'hit')
+    not_modified = measure(client, hot[:requests], '304')
+    print(f"{devices:6d} devices x {years:g} y: {rows:9d} nights ({fill_s:5.1f}s fill) | "
+          f"miss p50 {miss[0]:5.2f} p99 {miss[1]:5.2f} ms | hit p50 {hit[0]:5.2f} p99 {hit[1]:5.2f} ms | "
+          f"304 p50 {not_modified[0]:5.2f} p99 {not_modified[1]:5.2f} ms")
+    os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sleep-scores endpoint load test")
+    parser.add_argument("sizes", nargs="*", default=["100x1", "1000x2", "4000x3"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--db-dir", default=None)
+    args = parser.parse_args()
+    db_dir = args.db_dir or tempfile.mkdtemp()
+    for size in args.sizes:
+        devices, years = size.split("x")
+        run_size(int(devices), float(years), args.requests, db_dir)
+
+
+if __name__ == "__main__":
+    main()
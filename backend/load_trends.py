@@ -0,0 +1,145 @@
+"""
+Load test for /api/devices/<id>/trends against a populated SQLite file.
+
+For each size DEVICESxYEARS, fills a fresh database with the day, week and
+month rollups of one synthetic night per device per night (the rows
+record_night would have written), then:
+    record -- record_night for new nights: the incremental rollup update
+    month  -- random devices, their whole history by month (cache cleared first)
+    week   -- random devices, the last 2 years by week (cache cleared first)
+    hit    -- the same month requests served from the TTL cache
+The miss p99 should stay flat as devices and years grow: a query reads at
+most TREND_MAX_BUCKETS rollup rows, never the nights.
+
+    python load_trends.py [DEVICESxYEARS ...] [--requests N] [--db-dir DIR]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app import create_app
+from models import db, TrendRollup
+import nightScores
+
+INSERT_BATCH = 50000
+
+
+def night_result(rng):
+    nightmares = rng.choice((0, 0, 0, 0, 1, 2))
+    return {
+        'beats': 28000, 'epochs': 960, 'score': rng.uniform(40, 100), 'subScores': {},
+        'stageMinutes': {'wake': rng.uniform(20, 90), 'nrem': rng.uniform(200, 320), 'rem': rng.uniform(60, 120)},
+        'nightmares': nightmares,
+        'hrv': {'hr': rng.uniform(50, 70), 'rmssd': rng.uniform(0.02, 0.08), 'sdnn': rng.uniform(0.03, 0.09),
+                'lfHf': rng.uniform(0.5, 4.0)},
+    }
+
+
+def populate(app, devices, years, seed=0):
+    rng = random.Random(seed)
+    first = date(2025, 12, 31) - timedelta(days=int(365 * years))
+    nights = [first + timedelta(days=i) for i in range(int(365 * years))]
+    with app.app_context():
+        table = TrendRollup.__table__
+        batch = []
+        for d in range(devices):
+            sums = defaultdict(lambda: dict.fromkeys(nightScores.ROLLUP_FIELDS, 0))
+            for night in nights:
+                if rng.random() < 0.1:
+                    continue  # nights without a recording
+                values = nightScores.night_rollup(night_result(rng))
+                for period in nightScores.TREND_PERIODS:
+                    row = sums[(period, nightScores.period_start(night, period))]
+                    for field in nightScores.ROLLUP_FIELDS:
+                        row[field] += values[field]
+            device_id = f"device-{d:05d}"
+            for (period, start), row in sums.items():
+                batch.append(dict(row, device_id=device_id, period=period, start=start))
+            if len(batch) >= INSERT_BATCH:
+                db.session.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(table.insert(), batch)
+        db.session.commit()
+    return nights[0], nights[-1]
+
+
+def record(app, devices, n, seed=2):
+    """Milliseconds per record_night of n new nights, on top of the populated rollups."""
+    rng = random.Random(seed)
+    latencies = []
+    with app.app_context():
+        for i in range(n):
+            status = {'deviceId': f"device-{rng.randrange(devices):05d}", 'recordingId': f"load-{i}",
+                      'startTime': datetime(2026, 1, 1 + i % 28, 23).timestamp(), 'created': 0,
+                      'result': night_result(rng)}
+            t0 = time.perf_counter()
+            nightScores.record_night(status)
+            latencies.append(time.perf_counter() - t0)
+    ms = np.array(latencies) * 1e3
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def measure(client, urls, clear):
+    latencies = []
+    for url in urls:
+        if clear:
+            nightScores.trends_cache.clear()
+        t0 = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code == 200, (url, response.status_code)
+    ms = np.array(latencies) * 1e3
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def run_size(devices, years, requests, db_dir):
+    path = os.path.join(db_dir, f"trends-{devices}x{years:g}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}",
+                      'RECORDINGS_DIR': os.path.join(db_dir, 'recordings')})
+    t0 = time.perf_counter()
+    first, last = populate(app, devices, years)
+    fill_s = time.perf_counter() - t0
+    with app.app_context():
+        rows = TrendRollup.query.count()
+
+    rng = random.Random(1)
+    targets = [f"device-{rng.randrange(devices):05d}" for _ in range(requests)]
+    months = [f"/api/devices/{d}/trends?period=month&from={first}&to={last}" for d in targets]
+    weeks = [f"/api/devices/{d}/trends?period=week&from={last - timedelta(days=730)}&to={last}" for d in targets]
+
+    client = app.test_client()
+    month = measure(client, months, clear=True)
+    week = measure(client, weeks, clear=True)
+    hit = measure(client, months[:64] * (requests // 64 + 1), clear=False)
+    update = record(app, devices, 200)
+    print(f"{devices:6d} devices x {years:g} y: {rows:8d} rollups ({fill_s:5.1f}s fill) | "
+          f"record p50 {update[0]:5.2f} p99 {update[1]:5.2f} ms | month p50 {month[0]:5.2f} p99 {month[1]:5.2f} ms | "
+          f"2y of weeks p50 {week[0]:5.2f} p99 {week[1]:5.2f} ms | hit p50 {hit[0]:5.2f} p99 {hit[1]:5.2f} ms")
+    app.extensions['recordings'].shutdown()
+    os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trends endpoint load test")
+    parser.add_argument("sizes", nargs="*", default=["100x1", "1000x2", "2000x5"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--db-dir", default=None)
+    args = parser.parse_args()
+    db_dir = args.db_dir or tempfile.mkdtemp()
+    for size in args.sizes:
+        devices, years = size.split("x")
+        run_size(int(devices), float(years), args.requests, db_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+# --- SQLite connection settings ---
+# WAL lets readers run while one writer commits, instead of failing with "database is locked";
+# busy_timeout makes a second writer wait for the lock. synchronous=NORMAL is durable in WAL mode
+# except for the last commits before a power loss.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+POOL_SIZE = 8            # connections kept open (request threads + ingest callback thread)
+POOL_MAX_OVERFLOW = 8
+POOL_TIMEOUT_S = 10
 
 db = SQLAlchemy()
 
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
 def setup_db(app):
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    on_file = uri.startswith('sqlite:') and ':memory:' not in uri and uri not in ('sqlite://', 'sqlite:///')
+    if on_file:
+        # One pooled connection per thread at a time; SQLite itself serializes the writers
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('pool_size', POOL_SIZE)
+        options.setdefault('max_overflow', POOL_MAX_OVERFLOW)
+        options.setdefault('pool_timeout', POOL_TIMEOUT_S)
     db.init_app(app)
     with app.app_context():
+        if on_file:
+            event.listen(db.engine, 'connect', _sqlite_pragmas)
         db.create_all()
 
 class Item(db.Model):
@@ -19,3 +50,91 @@ class Item(db.Model):
             'name': self.name,
             'description': self.description
         }
+
+
+class SleepSession(db.Model):
+    """One processed recording (a night) of a device."""
+    __tablename__ = 'sleep_sessions'
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False)
+    date = db.Column(db.Date, nullable=False)  # night date: the evening the recording started
+    recording_id = db.Column(db.String(64), unique=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    duration_s = db.Column(db.Float)
+    beats = db.Column(db.Integer)
+    epochs = db.Column(db.Integer)
+    __table_args__ = (db.Index('ix_sleep_sessions_device_date', 'device_id', 'date'),)
+
+    def format(self):
+        return {
+            'id': self.id,
+            'deviceId': self.device_id,
+            'date': self.date.isoformat(),
+            'recordingId': self.recording_id,
+            'startTime': self.start_time.isoformat(),
+            'durationSeconds': self.duration_s,
+            'beats': self.beats,
+            'epochs': self.epochs,
+        }
+
+
+class NightScore(db.Model):
+    """Sleep score of a device's night, computed once when its recording is processed."""
+    __tablename__ = 'night_scores'
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    session_id = db.Column(db.Integer, db.ForeignKey('sleep_sessions.id'))
+    score = db.Column(db.Float, nullable=False)
+    sub_scores = db.Column(db.JSON, nullable=False, default=dict)
+    computed_at = db.Column(db.DateTime, nullable=False)
+    # One score per night; the monthly endpoint is a single range scan of this index
+    __table_args__ = (db.UniqueConstraint('device_id', 'date', name='ux_night_scores_device_date'),)
+
+    def format(self):
+        return {
+            'date': self.date.isoformat(),
+            'score': int(round(self.score)),
+            'subScores': self.sub_scores,
+        }
+
+
+class TrendRollup(db.Model):
+    """
+    Sums over a device's nights in one day, week (from Monday) or month, kept up
+    to date by nightScores.record_night; means are the sums over the night counts.
+    """
+    __tablename__ = 'trend_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False)
+    period = db.Column(db.String(5), nullable=False)   # 'day' | 'week' | 'month'
+    start = db.Column(db.Date, nullable=False)
+    nights = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    wake_min = db.Column(db.Float, nullable=False, default=0.0)
+    nrem_min = db.Column(db.Float, nullable=False, default=0.0)
+    rem_min = db.Column(db.Float, nullable=False, default=0.0)
+    nightmares = db.Column(db.Integer, nullable=False, default=0)
+    nightmare_nights = db.Column(db.Integer, nullable=False, default=0)
+    hrv_nights = db.Column(db.Integer, nullable=False, default=0)  # nights with asleep HRV
+    hr_sum = db.Column(db.Float, nullable=False, default=0.0)
+    rmssd_sum = db.Column(db.Float, nullable=False, default=0.0)
+    sdnn_sum = db.Column(db.Float, nullable=False, default=0.0)
+    lf_hf_sum = db.Column(db.Float, nullable=False, default=0.0)
+    # A trends query is one range scan of this index
+    __table_args__ = (db.UniqueConstraint('device_id', 'period', 'start', name='ux_trend_rollups_device_period_start'),)
+
+    def format(self):
+        def mean(total, count):
+            return round(total / count, 4) if count else None
+        return {
+            'start': self.start.isoformat(),
+            'nights': self.nights,
+            'score': mean(self.score_sum, self.nights),
+            'stageMinutes': {'wake': mean(self.wake_min, self.nights), 'nrem': mean(self.nrem_min, self.nights),
+                             'rem': mean(self.rem_min, self.nights)},
+            'nightmares': self.nightmares,
+            'nightmareNights': self.nightmare_nights,
+            'hrv': {'hr': mean(self.hr_sum, self.hrv_nights), 'rmssd': mean(self.rmssd_sum, self.hrv_nights),
+                    'sdnn': mean(self.sdnn_sum, self.hrv_nights), 'lfHf': mean(self.lf_hf_sum, self.hrv_nights)},
+        }
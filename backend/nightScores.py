@@ -0,0 +1,228 @@
+"""
+Precomputed nightly sleep scores and the cached monthly view behind
+/devices/<id>/sleep-scores.
+
+A night's score is computed once, when its recording finishes processing
+(record_night, called from the ingest pool's done callback), and stored in
+NightScore. A month is then one range scan of the (device_id, date) index.
+The serialized response is kept in an in-process LRU with a TTL and an ETag.
+record_night invalidates the affected month here; other server processes see
+the new night within CACHE_TTL_S.
+
+record_night also adds the night to the device's TrendRollup rows: its day,
+its week (from Monday) and its month hold sums of score, stage minutes,
+nightmare events and asleep HRV. A night recorded again replaces its day and
+applies only the difference to the week and month, so rollups never rescan
+nights. device_trends answers /devices/<id>/trends from one range scan over
+at most TREND_MAX_BUCKETS rollup rows, cached the same way as the months.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from models import db, SleepSession, NightScore, TrendRollup
+
+CACHE_SIZE = 4096        # (device, month) responses kept
+CACHE_TTL_S = 300.0
+NIGHT_ROLLOVER_H = 12    # a night started before noon belongs to the previous date
+EPOCH_S = 30
+TREND_PERIODS = ('day', 'week', 'month')
+TREND_MAX_BUCKETS = 1000  # rollup rows per trends response (e.g. ~2.7 years of days, 83 of months)
+ROLLUP_FIELDS = ('nights', 'score_sum', 'wake_min', 'nrem_min', 'rem_min', 'nightmares', 'nightmare_nights',
+                 'hrv_nights', 'hr_sum', 'rmssd_sum', 'sdnn_sum', 'lf_hf_sum')
+HRV_FIELDS = (('hr', 'hr_sum'), ('rmssd', 'rmssd_sum'), ('sdnn', 'sdnn_sum'), ('lfHf', 'lf_hf_sum'))
+
+
+class TTLCache:
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items = OrderedDict()  # key -> (expires, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None or item[0] < time.monotonic():
+                self.misses += 1
+                if item is not None:
+                    del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+monthly_cache = TTLCache()
+trends_cache = TTLCache()
+_trend_generation = {}  # device -> count of nights recorded by this process, part of the trends cache key
+
+
+def night_date(start):
+    return (start - timedelta(hours=NIGHT_ROLLOVER_H)).date()
+
+
+def record_night(status):
+    """Store a processed recording's session and score; needs an app context."""
+    result = status['result']
+    device_id = status['deviceId']
+    start = datetime.fromtimestamp(status['created'] if status.get('startTime') is None else status['startTime'])
+    night = night_date(start)
+
+    session = SleepSession.query.filter_by(recording_id=status['recordingId']).first()
+    if session is None:
+        session = SleepSession(device_id=device_id, recording_id=status['recordingId'])
+        db.session.add(session)
+    session.date = night
+    session.start_time = start
+    session.beats = result['beats']
+    session.epochs = result['epochs']
+    session.duration_s = result['epochs'] * EPOCH_S
+    db.session.flush()
+
+    # A second recording of the same night replaces the score
+    score = NightScore.query.filter_by(device_id=device_id, date=night).first()
+    if score is None:
+        score = NightScore(device_id=device_id, date=night)
+        db.session.add(score)
+    score.session_id = session.id
+    score.score = result['score']
+    score.sub_scores = result['subScores']
+    score.computed_at = datetime.now()
+    add_to_rollups(device_id, night, result)
+    db.session.commit()
+
+    monthly_cache.invalidate((device_id, night.strftime('%Y-%m')))
+    _trend_generation[device_id] = _trend_generation.get(device_id, 0) + 1
+    return score
+
+
+# --- Trend rollups ---
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def night_rollup(result):
+    """A processed night's contribution to each ROLLUP_FIELDS sum (ingest result summary)."""
+    stages = result.get('stageMinutes') or {}
+    hrv = result.get('hrv') or {}
+    nightmares = result.get('nightmares') or 0
+    has_hrv = all(hrv.get(key) is not None for key, _ in HRV_FIELDS)
+    values = {
+        'nights': 1, 'score_sum': result['score'],
+        'wake_min': stages.get('wake', 0.0), 'nrem_min': stages.get('nrem', 0.0), 'rem_min': stages.get('rem', 0.0),
+        'nightmares': nightmares, 'nightmare_nights': int(nightmares > 0), 'hrv_nights': int(has_hrv),
+    }
+    values.update({field: hrv[key] if has_hrv else 0.0 for key, field in HRV_FIELDS})
+    return values
+
+
+def _rollup_row(device_id, period, start):
+    row = TrendRollup.query.filter_by(device_id=device_id, period=period, start=start).first()
+    if row is None:
+        row = TrendRollup(device_id=device_id, period=period, start=start, **{f: 0 for f in ROLLUP_FIELDS})
+        db.session.add(row)
+    return row
+
+
+def add_to_rollups(device_id, night, result):
+    """Put a night into its day, week and month rows (part of the caller's transaction)."""
+    values = night_rollup(result)
+    # The day row is this night alone; a re-recorded night moves the week and month by the difference
+    day = _rollup_row(device_id, 'day', night)
+    delta = {f: values[f] - (getattr(day, f) or 0) for f in ROLLUP_FIELDS}
+    for f in ROLLUP_FIELDS:
+        setattr(day, f, values[f])
+    for period in ('week', 'month'):
+        row = _rollup_row(device_id, period, period_start(night, period))
+        for f in ROLLUP_FIELDS:
+            setattr(row, f, (getattr(row, f) or 0) + delta[f])
+
+
+def bucket_count(first, last, period):
+    """Rollup rows a [first, last] query can return."""
+    if period == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    step = 7 if period == 'week' else 1
+    return (period_start(last, period) - period_start(first, period)).days // step + 1
+
+
+def device_trends(device_id, period, first, last):
+    """(etag, JSON body) of a device's `period` rollups from the one holding `first` up to `last`."""
+    key = (device_id, period, first, last, _trend_generation.get(device_id, 0))
+    cached = trends_cache.get(key)
+    if cached is not None:
+        return cached
+
+    rows = (TrendRollup.query
+            .filter(TrendRollup.device_id == device_id,
+                    TrendRollup.period == period,
+                    TrendRollup.start >= period_start(first, period),
+                    TrendRollup.start <= last)
+            .order_by(TrendRollup.start)
+            .all())
+    total = TrendRollup(start=first, **{f: sum(getattr(row, f) for row in rows) for f in ROLLUP_FIELDS})
+    total = total.format()
+    del total['start']
+    body = json.dumps({
+        'success': True,
+        'deviceId': device_id,
+        'period': period,
+        'from': first.isoformat(),
+        'to': last.isoformat(),
+        'trends': [row.format() for row in rows],
+        'total': total,
+    }, separators=(',', ':'))
+    etag = hashlib.sha1(body.encode()).hexdigest()[:20]
+    trends_cache.put(key, (etag, body))
+    return etag, body
+
+
+def monthly_scores(device_id, month_start, next_month):
+    """(etag, JSON body) of a device's month, from the cache or one range query."""
+    month = month_start.strftime('%Y-%m')
+    key = (device_id, month)
+    cached = monthly_cache.get(key)
+    if cached is not None:
+        return cached
+
+    rows = (NightScore.query
+            .filter(NightScore.device_id == device_id,
+                    NightScore.date >= month_start.date(),
+                    NightScore.date < next_month.date())
+            .order_by(NightScore.date)
+            .all())
+    body = json.dumps({
+        'success': True,
+        'deviceId': device_id,
+        'month': month,
+        'scores': [row.format() for row in rows],
+    }, separators=(',', ':'))
+    etag = hashlib.sha1(body.encode()).hexdigest()[:20]
+    monthly_cache.put(key, (etag, body))
+    return etag, body
@@ -1,15 +1,54 @@
-from flask import Blueprint, jsonify, request
-from datetime import datetime, timedelta
-from random import randint
+from flask import Blueprint, current_app, jsonify, request
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, insert, select, update
 from models import Item, db
+from ingest import UploadError, DONE
+from nightScores import bucket_count, device_trends, monthly_scores, record_night, TREND_MAX_BUCKETS, TREND_PERIODS
 
 blueprint_api = Blueprint('api', __name__)
 
+# Items endpoints
+# Listing is keyset-paginated on id: ?limit=N&after=<nextCursor of the previous page>&fields=id,name
+# Bulk endpoints apply a whole batch in one transaction (all or nothing) with executemany statements.
+ITEM_FIELDS = ('id', 'name', 'description')
+ITEMS_PAGE_SIZE = 100
+ITEMS_MAX_PAGE = 1000
+ITEMS_MAX_BULK = 5000
+
+def _int_arg(name, default, low, high):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    if not value.isdigit() or not low <= int(value) <= high:
+        raise ValueError(f'{name} must be an integer in {low}..{high}')
+    return int(value)
+
 @blueprint_api.route('/items', methods=['GET'])
 def get_items():
-    items = Item.query.all()
-    formatted = [i.format() for i in items]
-    return jsonify({'success': True, 'items': formatted})
+    try:
+        limit = _int_arg('limit', ITEMS_PAGE_SIZE, 1, ITEMS_MAX_PAGE)
+        after = _int_arg('after', 0, 0, 2 ** 63 - 1)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    fields = ITEM_FIELDS
+    if request.args.get('fields'):
+        fields = tuple(f for f in request.args['fields'].split(',') if f)
+        if not fields:
+            return jsonify({'success': False, 'message': 'At least one field is required',
+                            'fields': list(ITEM_FIELDS)}), 400
+        unknown = sorted(set(fields) - set(ITEM_FIELDS))
+        if unknown:
+            return jsonify({'success': False, 'message': f'Unknown fields: {", ".join(unknown)}',
+                            'fields': list(ITEM_FIELDS)}), 400
+
+    # Only the selected columns (plus id for the cursor), one extra row to know whether a next page exists
+    columns = [Item.id] + [getattr(Item, f) for f in fields if f != 'id']
+    rows = db.session.execute(
+        select(*columns).where(Item.id > after).order_by(Item.id).limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    formatted = [{f: row._mapping[f] for f in fields} for row in rows]
+    return jsonify({'success': True, 'items': formatted, 'nextCursor': rows[-1].id if more else None})
 
 @blueprint_api.route('/items', methods=['POST'])
 def create_item():
@@ -26,7 +65,7 @@ def create_item():
 
 @blueprint_api.route('/items/<int:item_id>', methods=['PATCH'])
 def update_item(item_id):
-    item = Item.query.get(item_id)
+    item = db.session.get(Item, item_id)
     if not item:
         return jsonify({'success': False, 'message': 'Item not found'}), 404
     body = request.get_json()
@@ -39,19 +78,103 @@ def update_item(item_id):
 
 @blueprint_api.route('/items/<int:item_id>', methods=['DELETE'])
 def delete_item(item_id):
-    item = Item.query.get(item_id)
+    item = db.session.get(Item, item_id)
     if not item:
         return jsonify({'success': False, 'message': 'Item not found'}), 404
     db.session.delete(item)
     db.session.commit()
     return jsonify({'success': True, 'deleted_id': item_id})
 
+def _bulk_list(body, key):
+    """The list under `key` of a bulk request body, or raise ValueError."""
+    values = (body or {}).get(key)
+    if not isinstance(values, list) or not values:
+        raise ValueError(f'{key} must be a non-empty list')
+    if len(values) > ITEMS_MAX_BULK:
+        raise ValueError(f'At most {ITEMS_MAX_BULK} {key} per request')
+    return values
+
+def _is_id(value):
+    """An integer item id; JSON true/false arrive as bool, a subclass of int."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _missing_ids(ids):
+    """Those of `ids` without an item, from one IN query."""
+    found = set(db.session.execute(select(Item.id).where(Item.id.in_(ids))).scalars())
+    return [i for i in ids if i not in found]
+
+@blueprint_api.route('/items/bulk', methods=['POST'])
+def bulk_create_items():
+    """Body: { items: [{ name, description? }, ...] }; responds with the created items in request order."""
+    try:
+        entries = _bulk_list(request.get_json(silent=True), 'items')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    rows = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get('name'):
+            return jsonify({'success': False, 'message': f'items[{i}]: Name is required'}), 400
+        rows.append({'name': entry['name'], 'description': entry.get('description')})
+
+    ids = db.session.execute(insert(Item).returning(Item.id, sort_by_parameter_order=True), rows).scalars().all()
+    db.session.commit()
+    created = [dict(row, id=item_id) for item_id, row in zip(ids, rows)]
+    return jsonify({'success': True, 'items': created}), 201
+
+@blueprint_api.route('/items/bulk', methods=['PATCH'])
+def bulk_update_items():
+    """
+    Body: { items: [{ id, name?, description? }, ...] }, each with a field to change;
+    nothing is changed if any id is unknown.
+    """
+    try:
+        entries = _bulk_list(request.get_json(silent=True), 'items')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    rows = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not _is_id(entry.get('id')):
+            return jsonify({'success': False, 'message': f'items[{i}]: an integer id is required'}), 400
+        if 'name' in entry and not entry['name']:
+            return jsonify({'success': False, 'message': f'items[{i}]: Name cannot be empty'}), 400
+        row = {f: entry[f] for f in ITEM_FIELDS if f in entry}
+        if len(row) == 1:
+            return jsonify({'success': False, 'message': f'items[{i}]: nothing to update'}), 400
+        rows.append(row)
+    ids = [entry['id'] for entry in entries]
+    missing = _missing_ids(ids)
+    if missing:
+        return jsonify({'success': False, 'message': 'Items not found', 'missing': missing}), 404
+
+    # Update by primary key: one executemany per distinct set of changed fields
+    db.session.execute(update(Item), rows)
+    db.session.commit()
+    return jsonify({'success': True, 'updated': len(set(ids))})
+
+@blueprint_api.route('/items/bulk', methods=['DELETE'])
+def bulk_delete_items():
+    """Body: { ids: [...] }; nothing is deleted if any id is unknown."""
+    try:
+        ids = _bulk_list(request.get_json(silent=True), 'ids')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not all(_is_id(i) for i in ids):
+        return jsonify({'success': False, 'message': 'ids must be integers'}), 400
+    missing = _missing_ids(ids)
+    if missing:
+        return jsonify({'success': False, 'message': 'Items not found', 'missing': missing}), 404
+
+    db.session.execute(delete(Item).where(Item.id.in_(ids)))
+    db.session.commit()
+    return jsonify({'success': True, 'deleted_ids': sorted(set(ids))})
+
 # Sleep scores endpoint
 @blueprint_api.route('/devices/<string:device_id>/sleep-scores', methods=['GET'])
 def get_sleep_scores(device_id):
-    """Return mock sleep scores for a given device and month.
+    """Return the stored sleep scores for a given device and month.
     Query params: month=YYYY-MM (defaults to current month)
-    Response: { deviceId: str, month: str, scores: [{ date: YYYY-MM-DD, score: int }] }
+    Response: { deviceId: str, month: str, scores: [{ date: YYYY-MM-DD, score: int, subScores: {} }] }
+    Nights without a processed recording are absent. Supports ETag / If-None-Match.
     """
     month = request.args.get('month')
     today = datetime.now()
@@ -62,28 +185,105 @@ def get_sleep_scores(device_id):
     except ValueError:
         return jsonify({'success': False, 'message': 'Invalid month format, expected YYYY-MM'}), 400
 
-    # Determine number of days in month
     if month_start.month == 12:
         next_month = datetime(month_start.year + 1, 1, 1)
     else:
         next_month = datetime(month_start.year, month_start.month + 1, 1)
-    days_in_month = (next_month - month_start).days
 
-    scores = []
-    for day in range(days_in_month):
-        date = month_start + timedelta(days=day)
-        # Mock score 50-100, lightly vary by weekday for pseudo realism
-        base = 60 + (date.weekday() * 3)  # weekday effect
-        score = min(100, max(50, base + randint(-10, 15)))
-        scores.append({'date': date.strftime('%Y-%m-%d'), 'score': score})
+    etag, body = monthly_scores(device_id, month_start, next_month)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+# Long-term trends endpoint
+@blueprint_api.route('/devices/<string:device_id>/trends', methods=['GET'])
+def get_trends(device_id):
+    """Return a device's precomputed day / week / month rollups over a date range.
+    Query params: period=day|week|month (default month), from=YYYY-MM-DD (default: a year before `to`),
+    to=YYYY-MM-DD (default today); at most TREND_MAX_BUCKETS periods.
+    Response: { deviceId, period, from, to, trends: [{ start, nights, score, stageMinutes: {wake, nrem, rem},
+    nightmares, nightmareNights, hrv: {hr, rmssd, sdnn, lfHf} }], total: {...} }; means are per night,
+    nightmares are counts. Periods without a processed night are absent. Supports ETag / If-None-Match.
+    """
+    period = request.args.get('period', 'month')
+    if period not in TREND_PERIODS:
+        return jsonify({'success': False, 'message': f'period must be one of {", ".join(TREND_PERIODS)}'}), 400
+    try:
+        last = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if 'to' in request.args else date.today()
+        first = (datetime.strptime(request.args['from'], '%Y-%m-%d').date() if 'from' in request.args
+                 else last - timedelta(days=365))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date format, expected YYYY-MM-DD'}), 400
+    if first > last:
+        return jsonify({'success': False, 'message': 'from must not be after to'}), 400
+    if bucket_count(first, last, period) > TREND_MAX_BUCKETS:
+        return jsonify({'success': False,
+                        'message': f'At most {TREND_MAX_BUCKETS} {period}s per request, use a coarser period'}), 400
+
+    etag, body = device_trends(device_id, period, first, last)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+# Recording ingest endpoints
+# Resumable upload: POST to create, PATCH chunks (Upload-Offset header = bytes already
+# stored, HEAD/GET returns it), then POST .../complete to queue beat detection and staging.
+def _recordings():
+    return current_app.extensions['recordings']
+
+@blueprint_api.errorhandler(UploadError)
+def upload_error(e):
+    body = {'success': False, 'message': str(e)}
+    headers = {}
+    if e.offset is not None:
+        body['offset'] = e.offset
+        headers['Upload-Offset'] = str(e.offset)
+    return jsonify(body), e.status, headers
+
+@blueprint_api.route('/devices/<string:device_id>/recordings', methods=['POST'])
+def create_recording(device_id):
+    """Body: { format: 'csv' | 'binary', sampleRate?: int, startTime?: unix seconds (default: now) }"""
+    body = request.get_json(silent=True) or {}
+    recording = _recordings().create(device_id, body.get('format', 'csv'), body.get('sampleRate', 125),
+                                     body.get('startTime'))
+    location = f"{request.path}/{recording['recordingId']}"
+    return jsonify({'success': True, 'recording': recording}), 201, {'Location': location, 'Upload-Offset': '0'}
+
+@blueprint_api.route('/devices/<string:device_id>/recordings', methods=['GET'])
+def list_recordings(device_id):
+    return jsonify({'success': True, 'deviceId': device_id, 'recordings': _recordings().list(device_id)})
 
-    return jsonify({
-        'success': True,
-        'deviceId': device_id,
-        'month': month,
-        'scores': scores
-    })
+@blueprint_api.route('/devices/<string:device_id>/recordings/<string:recording_id>', methods=['GET'])
+def get_recording(device_id, recording_id):
+    recording = _recordings().status(device_id, recording_id)
+    return jsonify({'success': True, 'recording': recording}), 200, {'Upload-Offset': str(recording['offset'])}
 
+@blueprint_api.route('/devices/<string:device_id>/recordings/<string:recording_id>', methods=['PATCH'])
+def upload_chunk(device_id, recording_id):
+    """Append the raw request body (CSV text or packet bytes), streamed to disk."""
+    offset = request.headers.get('Upload-Offset')
+    if offset is not None and not offset.isdigit():
+        return jsonify({'success': False, 'message': 'Upload-Offset must be a byte count'}), 400
+    offset = _recordings().append(device_id, recording_id, request.stream,
+                                  int(offset) if offset is not None else None)
+    return jsonify({'success': True, 'offset': offset}), 200, {'Upload-Offset': str(offset)}
 
+@blueprint_api.route('/devices/<string:device_id>/recordings/<string:recording_id>/complete', methods=['POST'])
+def complete_recording(device_id, recording_id):
+    app = current_app._get_current_object()
 
+    def store_score(status):
+        # Runs on the pool's callback thread once the night is processed
+        if status['state'] == DONE:
+            with app.app_context():
+                try:
+                    record_night(status)
+                except Exception:
+                    app.logger.exception("Storing recording %s of %s failed", status['recordingId'],
+                                         status['deviceId'])
+                    raise
 
+    recording = _recordings().complete(device_id, recording_id, on_done=store_score)
+    return jsonify({'success': True, 'recording': recording}), 202
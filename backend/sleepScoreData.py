@@ -1,35 +1,115 @@
 """
-Imports , DataVisualization, Pandas, Matplotlib, Seaborn, Numpy
+Sleep staging of a night's ECG with SleepECG's wrn-gru-mesa classifier.
+Recordings are EDF ("ECG" signal), the board's CSV (CH0) or a binary
+`.session` directory from Hardware/session_format.py.
+
+sleepscore() is meant to be called many times from one process (API, batch scoring):
+  * the classifier is loaded once and kept in a process-wide cache
+  * detected heartbeats are memoized by the SHA-256 of the recording, so re-scoring
+    a night skips reading it and detect_heartbeats (optionally also on disk, shared
+    between processes, see HEARTBEAT_CACHE_DIR)
+  * matplotlib is only imported when plots are requested
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import scipy
-import scipy.signal as sig
+import hashlib
+import os
+import sys
+import threading
 import warnings
-
-warnings.filterwarnings("ignore")
-import matplotlib.pyplot as plt
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-from edfio import read_edf
-
-# import sleepecg
-from sleepecg import SleepRecord, extract_features
+import numpy as np
 
-def sleepscore(filename):
-    # loading classifier, stages: rem, nrem, and wake
-    clf = sleepecg.load_classifier("wrn-gru-mesa", "SleepECG")
-    # change lookback and forward if small dataset, shouldn't be needed for whole night data set
-    # clf2.feature_extraction_params["lookback"] = 1
-    # clf2.feature_extraction_params["lookforward"] = 1
+warnings.filterwarnings("ignore")
 
+import pandas as pd
+from edfio import read_edf
 
+import sleepecg
+from sleepecg import SleepRecord
+
+from csvToEDF import csv_sample_rate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Hardware"))
+from session_format import SessionReader, COLUMNS, META_FILE  # noqa: E402
+import metrics  # noqa: E402
+
+# --- Configuration ---
+CLASSIFIER = "wrn-gru-mesa"
+CLASSIFIER_SOURCE = "SleepECG"
+SLEEP_STAGE_DURATION = 30      # seconds per epoch
+HEARTBEAT_CACHE_SIZE = 64      # nights kept in memory
+HEARTBEAT_CACHE_DIR = os.environ.get("SLEEPSCORE_CACHE_DIR")  # None: memory only
+HASH_CHUNK = 1 << 20
+CSV_SAMPLE_RATE = 125          # for single-column CSV exports
+SESSION_SUFFIX = ".session"
+
+HEARTBEATS = metrics.timer("sleepscore_heartbeats")
+STAGING = metrics.timer("sleepscore_staging")
+
+_classifiers = {}
+_classifier_lock = threading.Lock()
+_heartbeats = OrderedDict()    # sha256 -> heartbeat times (s)
+_heartbeat_lock = threading.Lock()
+
+
+def get_classifier(name=CLASSIFIER, source=CLASSIFIER_SOURCE):
+    """Load a classifier on first use and return the same instance afterwards."""
+    key = (name, source)
+    with _classifier_lock:
+        clf = _classifiers.get(key)
+        if clf is None:
+            # change lookback and forward if small dataset, shouldn't be needed for whole night data set
+            # clf.feature_extraction_params["lookback"] = 1
+            # clf.feature_extraction_params["lookforward"] = 1
+            clf = _classifiers[key] = sleepecg.load_classifier(name, source)
+    return clf
+
+
+def file_digest(path):
+    """SHA-256 of a recording file, or of the meta and column files of a session directory."""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        files = [META_FILE] + [fname for fname, _, _ in COLUMNS.values()]
+        files = [os.path.join(path, fname) for fname in files]
+    else:
+        files = [path]
+    for fpath in files:
+        if not os.path.exists(fpath):
+            continue
+        with open(fpath, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def read_ecg(path):
+    """Return (ecg, fs) of a recording: EDF, board CSV or session directory."""
+    if os.path.isdir(path) or path.rstrip(os.sep).endswith(SESSION_SUFFIX):
+        return _read_session_ecg(path)
+    if path.lower().endswith(".csv"):
+        return _read_csv_ecg(path)
+    return _read_edf_ecg(path)
+
+
+def _read_session_ecg(path):
+    reader = SessionReader(path)
+    return reader.channels[:, 0].astype(np.float64), reader.sample_rate
+
+
+def _read_csv_ecg(path):
+    if "CH0" not in pd.read_csv(path, nrows=0).columns:
+        # Single-column ECG export, as CSVtoEDF reads it
+        df = pd.read_csv(path, header=None)
+        return df.iloc[1:, 0].values.astype(np.float64), CSV_SAMPLE_RATE
+    ecg = pd.read_csv(path, usecols=["CH0"])["CH0"].to_numpy(np.float64)
+    return ecg, csv_sample_rate(path)
+
+
+def _read_edf_ecg(filename):
     nightDataEDF = read_edf(filename)
 
-
     # crop dataset (we only want data for the sleep duration)
     # start = datetime(2025, 1, 1, 0, 0, 0)
     # stop = datetime(2025, 1, 1, 0, 3, 0)
@@ -41,28 +121,99 @@ def sleepscore(filename):
     start = rec_start + timedelta(seconds=0)
     nightDataEDF.slice_between_seconds(0, nightDataEDF.duration)
 
-    # get ECG time series and sampling frequency
-    ecg = nightDataEDF.get_signal("ECG").data
-    fs = nightDataEDF.get_signal("ECG").sampling_frequency
-
-    # detect heartbeats
-    beats = sleepecg.detect_heartbeats(ecg, fs)
-    sleepecg.plot_ecg(ecg, fs, beats=beats)
-
+    signal = nightDataEDF.get_signal("ECG")
+    return signal.data, signal.sampling_frequency
+
+
+def heartbeat_times(filename, digest=None):
+    """Heartbeat times (s) of a recording, from the memo when this content was seen before."""
+    digest = digest or file_digest(filename)
+    times = _cached_heartbeats(digest)
+    metrics.counter("heartbeat_cache", result="hit" if times is not None else "miss").inc()
+    if times is None:
+        with HEARTBEATS.time():
+            ecg, fs = read_ecg(filename)
+            times = sleepecg.detect_heartbeats(ecg, fs) / fs
+        _store_heartbeats(digest, times)
+    return times
+
+
+def _cache_path(digest):
+    return os.path.join(HEARTBEAT_CACHE_DIR, f"{digest}.npy")
+
+
+def _cached_heartbeats(digest):
+    with _heartbeat_lock:
+        times = _heartbeats.get(digest)
+        if times is not None:
+            _heartbeats.move_to_end(digest)
+            return times
+    if HEARTBEAT_CACHE_DIR and os.path.exists(_cache_path(digest)):
+        times = np.load(_cache_path(digest))
+        _store_heartbeats(digest, times, disk=False)
+        return times
+    return None
+
+
+def _store_heartbeats(digest, times, disk=True):
+    with _heartbeat_lock:
+        _heartbeats[digest] = times
+        _heartbeats.move_to_end(digest)
+        while len(_heartbeats) > HEARTBEAT_CACHE_SIZE:
+            _heartbeats.popitem(last=False)
+    if disk and HEARTBEAT_CACHE_DIR:
+        os.makedirs(HEARTBEAT_CACHE_DIR, exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial file
+        tmp = _cache_path(digest) + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, times)
+        os.replace(tmp, _cache_path(digest))
+
+
+def clear_cache():
+    """Forget loaded classifiers and in-memory heartbeats (the disk cache is kept)."""
+    with _classifier_lock:
+        _classifiers.clear()
+    with _heartbeat_lock:
+        _heartbeats.clear()
+
+
+def stage_probabilities(times, clf=None):
+    """(n_epochs, 4) stage probabilities for heartbeat times (s), and the SleepRecord used."""
+    # loading classifier, stages: rem, nrem, and wake
+    clf = clf or get_classifier()
 
     # predict sleep stages
-    record = sleepecg.SleepRecord(
-        sleep_stage_duration=30,
+    record = SleepRecord(
+        sleep_stage_duration=SLEEP_STAGE_DURATION,
         # ecording_start_time=start2,
-        heartbeat_times=beats / fs,
+        heartbeat_times=times,
     )
 
-    stages = sleepecg.stage(clf, record, return_mode="prob")
+    with STAGING.time():
+        return sleepecg.stage(clf, record, return_mode="prob"), record
+
+
+def sleepscore(filename, plot=False):
+    # detect heartbeats
+    times = heartbeat_times(filename)
+
+    stages, record = stage_probabilities(times)
 
+    if plot:
+        _plot(filename, times, record, stages, get_classifier())
+    return stages
+
+
+def _plot(filename, times, record, stages, clf):
+    import matplotlib.pyplot as plt  # noqa: F401 -- only needed here
+
+    ecg, fs = read_ecg(filename)
+    beats = np.round(times * fs).astype(int)
+    sleepecg.plot_ecg(ecg, fs, beats=beats)
     sleepecg.plot_hypnogram(
         record,
         stages,
         stages_mode=clf.stages_mode,
         merge_annotations=True,
     )
-    return stages